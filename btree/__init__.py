@@ -12,4 +12,8 @@
 
 from .btree import BTreeClassic, BTree
 from . import btreeN
-
+from . import btreeStream
+from . import btreePaged
+from . import btreeProfile
+from . import btreeConcurrent
+from . import btreeLog
@@ -11,9 +11,16 @@
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 import sys
+from itertools import izip
 from btreeBase import BTreeBasic
-from btreeMixin import BTreeDictMixin
+from btreeMixin import BTreeDictMixin, BTreeKeyFuncMixin
 import btreeNodes
+from btreeCursor import BTreeCursor
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 #~ Definitions 
@@ -26,19 +33,194 @@ class DictLeafNode(btreeNodes.BTreeDictLeafNode):
 class BranchNode(btreeNodes.BTreeBranchNode):
     __slots__ = btreeNodes.BTreeBranchNode.__slots__
 
+class IntKeyLeafNode(btreeNodes.BTreeArrayLeafNode):
+    __slots__ = btreeNodes.BTreeArrayLeafNode.__slots__
+    keyTypecode = 'l'
+class IntKeyBranchNode(btreeNodes.BTreeArrayBranchNode):
+    __slots__ = btreeNodes.BTreeArrayBranchNode.__slots__
+    keyTypecode = 'l'
+
+class IntItemLeafNode(IntKeyLeafNode):
+    __slots__ = IntKeyLeafNode.__slots__
+    valueTypecode = 'l'
+class IntItemBranchNode(IntKeyBranchNode):
+    __slots__ = IntKeyBranchNode.__slots__
+    valueTypecode = 'l'
+
+class FloatKeyLeafNode(btreeNodes.BTreeArrayLeafNode):
+    __slots__ = btreeNodes.BTreeArrayLeafNode.__slots__
+    keyTypecode = 'd'
+class FloatKeyBranchNode(btreeNodes.BTreeArrayBranchNode):
+    __slots__ = btreeNodes.BTreeArrayBranchNode.__slots__
+    keyTypecode = 'd'
+
+class FloatItemLeafNode(FloatKeyLeafNode):
+    __slots__ = FloatKeyLeafNode.__slots__
+    valueTypecode = 'd'
+class FloatItemBranchNode(FloatKeyBranchNode):
+    __slots__ = FloatKeyBranchNode.__slots__
+    valueTypecode = 'd'
+
+class PrefixLeafNode(btreeNodes.BTreePrefixLeafNode):
+    __slots__ = btreeNodes.BTreePrefixLeafNode.__slots__
+
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 class BTreeFoundation(BTreeDictMixin, BTreeBasic):
     LeafFactory = None
     BranchFactory = None
+    CursorFactory = BTreeCursor
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    @classmethod
+    def fromItems(klass, items, fill=0.9):
+        """Builds a tree bottom up from items in any order"""
+        self = klass()
+        self._loadItems(items, fill)
+        return self
+
+    @classmethod
+    def fromSortedItems(klass, items, fill=0.9):
+        """Builds a tree bottom up from items in strictly increasing key order"""
+        self = klass()
+        self._loadSortedItems(items, fill)
+        return self
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
     def iterWalk(self):
-        return self._getRootNode().iterWalk()
+        return self._getRootNode().iterWalk(self._treeCtx())
     def iterNodes(self, level=None):
         return self._getRootNode().iterAllNodes(level)
 
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Ordered access
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def cursor(self, key=None):
+        """Returns a cursor at the first item with a key >= key, or at
+        the first item if key is None"""
+        cursor = self.CursorFactory(self)
+        if key is None:
+            cursor.seekFirst()
+        else: cursor.seek(key)
+        return cursor
+
+    def irange(self, lo=None, hi=None, reverse=False):
+        """Iterates items with lo <= key < hi.  None leaves that end open."""
+        return self._iterRange(self.CursorFactory(self), lo, hi, reverse)
+
+    def deleteRange(self, lo=None, hi=None):
+        """Removes the items with lo <= key < hi, None leaving that end
+        open.  Subtrees inside the range are dropped without visiting
+        their items.  Returns the number of items removed."""
+        return self._deleteRange(lo, hi)
+
+    def splitAt(self, key):
+        """Returns (left, right) trees holding the items with keys below
+        key, and those at or above it.  Subtrees are relinked rather than
+        copied, and this tree is left unchanged."""
+        return self._splitAt(key)
+
+    @classmethod
+    def merge(klass, a, b):
+        """Returns a new tree holding the items of a and b, with b's
+        values winning for equal keys, as with dict.update.  When a and b
+        are both of klass with the same ordering and degree, only the
+        overlap of their key ranges is merged item by item, and the rest
+        of their nodes are relinked.  a and b are left unchanged."""
+        if type(a) is klass and a._canRelinkWith(b):
+            return a._mergedWith(b)
+        result = klass()
+        result.update(a)
+        result.update(b)
+        return result
+
+    def _iterRange(self, cursor, lo, hi, reverse):
+        keyCmp = self.keyCmp
+        if not reverse:
+            if lo is None:
+                cursor.seekFirst()
+            else: cursor.seek(lo)
+
+            for item in cursor.iterForward():
+                if hi is not None and keyCmp(item[0], hi) >= 0:
+                    break
+                yield item
+        else:
+            if hi is None:
+                cursor.seekLast()
+            else: cursor.seekLower(hi)
+
+            for item in cursor.iterBackward():
+                if lo is not None and keyCmp(item[0], lo) < 0:
+                    break
+                yield item
+
+    def floor(self, key, *args):
+        """Returns the greatest key <= key"""
+        cursor = self.CursorFactory(self)
+        return self._cursorKey(cursor, cursor.seekFloor(key), key, args)
+    def ceiling(self, key, *args):
+        """Returns the least key >= key"""
+        cursor = self.CursorFactory(self)
+        return self._cursorKey(cursor, cursor.seekCeiling(key), key, args)
+    def lower(self, key, *args):
+        """Returns the greatest key < key"""
+        cursor = self.CursorFactory(self)
+        return self._cursorKey(cursor, cursor.seekLower(key), key, args)
+    def higher(self, key, *args):
+        """Returns the least key > key"""
+        cursor = self.CursorFactory(self)
+        return self._cursorKey(cursor, cursor.seekHigher(key), key, args)
+
+    def _cursorKey(self, cursor, found, key, args):
+        if found:
+            return cursor.getKey()
+        if args: return args[0]
+        raise KeyError(key)
+
+    def rank(self, key):
+        """Returns the number of items with keys less than key"""
+        treeCtx = self._treeCtx()
+        result = 0
+        node = self._getRootNode()
+        while node is not None:
+            idx, itemAtKey = node._idxInfoFromKey(treeCtx, key)
+            result += idx
+            for child in node.getNodes()[:idx]:
+                result += child.getCount()
+            if itemAtKey:
+                child = node.getNodeAtIdx(idx)
+                if child is not None:
+                    result += child.getCount()
+                break
+            node = node.getNodeAtIdx(idx)
+        return result
+
+    def select(self, index):
+        """Returns the item at index in key order"""
+        node = self._getRootNode()
+        count = node.getCount()
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("BTree index out of range")
+
+        while not node.isLeaf():
+            for idx, child in enumerate(node.getNodes()):
+                childCount = child.getCount()
+                if index < childCount:
+                    node = child
+                    break
+                elif index == childCount:
+                    return node.getItemAtIdx(idx)
+                index -= childCount + 1
+        return node.getItemAtIdx(index, self._treeCtx())
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
     def printReprTree(self, out=None, sep='', indent='    '):
         if out is None:
             out = sys.stdout
@@ -47,6 +229,36 @@ class BTreeFoundation(BTreeDictMixin, BTreeBasic):
         for level, node in self.iterNodes(1):
             print >> out, '%s%s%r' % (indent*level, sep, node)
 
+    def stats(self, bins=10):
+        """Returns a dict describing the tree's structure: height, nodes
+        and items per level (root first), a histogram of node fill over
+        bins equal slices of maxDegree, and the split, combine, rotate and
+        collapse counts since the counters were last reset."""
+        levelNodes, levelItems = [], []
+        fillHistogram = [0]*bins
+        maxDegree = self.maxDegree
+        for level, node in self.iterNodes(0):
+            if level == len(levelNodes):
+                levelNodes.append(0)
+                levelItems.append(0)
+            size = len(node)
+            levelNodes[level] += 1
+            levelItems[level] += size
+            fillHistogram[min(bins-1, size*bins//maxDegree)] += 1
+
+        nodeCount = sum(levelNodes)
+        return {
+            'count': len(self),
+            'degree': self.getDegree(),
+            'height': len(levelNodes),
+            'nodes': nodeCount,
+            'levelNodes': levelNodes,
+            'levelItems': levelItems,
+            'fillHistogram': fillHistogram,
+            'meanFill': float(sum(levelItems))/(nodeCount*maxDegree),
+            'adjustments': self.getAdjustmentCounts(),
+            }
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     #~ Degree and KeyCmp methods
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -89,3 +301,206 @@ class BTree(BTreeFoundation):
 
 BTreeDictLeaves = BTree
 
+class BTreeKeyFunc(BTreeKeyFuncMixin, BTree):
+    """Ordered by keyFunc(key); set keyFunc on a subclass, or with
+    setKeyFunc on an empty tree"""
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Typed array trees
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreeArrayFoundation(BTreeFoundation):
+    # per-array overhead only pays off with wide nodes
+    minDegree = 64
+    maxDegree = 256
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Vectorized queries
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    # These take and return NumPy arrays.  The query keys are sorted once,
+    # then each node visited resolves its whole share of them with
+    # searchsorted against its key array, so a batch visits each node at
+    # most once instead of descending the tree once per key.
+
+    def searchsorted(self, keys, side='left'):
+        """Like numpy.searchsorted against the tree's keys: returns an
+        array holding, for each of keys, the number of keys in the tree
+        below it, or with side='right', at or below it"""
+        shape = numpy.shape(keys)
+        keys, order = self._sortedQuery(keys)
+        result = numpy.empty(len(keys), numpy.intp)
+        if self.keyCmp is not cmp:
+            for idx, key in izip(order.tolist(), keys.tolist()):
+                result[idx] = self.rank(key)
+                if side == 'right' and key in self:
+                    result[idx] += 1
+        elif len(keys):
+            self._searchsortedIn(self._getRootNode(), keys, order, 0, result, side)
+        return result.reshape(shape)
+
+    def getMany(self, keys, default=None):
+        """Returns the values for keys, with default for missing keys.  A
+        NumPy array of keys gives an array of the same shape, typed like
+        the tree's values when they are stored in arrays and default is
+        not None, and of Python objects otherwise"""
+        if numpy is None or not isinstance(keys, numpy.ndarray):
+            return super(BTreeArrayFoundation, self).getMany(keys, default)
+
+        shape = keys.shape
+        valueTypecode = self.LeafFactory.valueTypecode
+        if valueTypecode is not None and default is not None:
+            result = numpy.empty(keys.size, valueTypecode)
+        else: result = numpy.empty(keys.size, object)
+        result.fill(default)
+
+        if self.keyCmp is not cmp:
+            values = self._findMany(keys.ravel().tolist(), default)
+            for idx, value in enumerate(values):
+                result[idx] = value
+        elif keys.size:
+            keys, order = self._sortedQuery(keys)
+            self._getManyIn(self._getRootNode(), keys, order, result)
+        return result.reshape(shape)
+
+    def toArrays(self):
+        """Returns (keys, values) arrays of the tree's items in key order.
+        Values are typed when the tree stores them in arrays, and Python
+        objects otherwise"""
+        if numpy is None:
+            raise ImportError("toArrays requires numpy")
+        keyParts, valueParts = [], []
+        self._collectArrays(self._getRootNode(), keyParts, valueParts)
+        keys = numpy.concatenate(keyParts)
+
+        if self.LeafFactory.valueTypecode is not None:
+            return keys, numpy.concatenate(valueParts)
+
+        values = numpy.empty(len(keys), object)
+        idx = 0
+        for part in valueParts:
+            # assigned one by one, so that sequence values stay whole
+            for value in part:
+                values[idx] = value
+                idx += 1
+        return keys, values
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def _sortedQuery(self, keys):
+        if numpy is None:
+            raise ImportError("Vectorized BTree queries require numpy")
+        keys = numpy.asarray(keys).ravel()
+        order = keys.argsort(kind='mergesort')
+        return keys[order], order
+
+    def _nodeArray(self, entries):
+        # a view of an array.array, valid until the node is next changed
+        return numpy.frombuffer(entries, entries.typecode)
+
+    def _iterQueryGroups(self, node, keys):
+        # Splits the sorted keys among the children of a branch node.
+        # Yields ('child', idx, start, end) for keys[start:end] falling
+        # under the child at idx, and ('item', idx, start, end) for keys
+        # equal to the node's key at idx.
+        nodeKeys = self._nodeArray(node.getKeys())
+        lefts = keys.searchsorted(nodeKeys, 'left').tolist()
+        rights = keys.searchsorted(nodeKeys, 'right').tolist()
+        starts = [0] + rights
+        ends = lefts + [len(keys)]
+        for idx, (start, end) in enumerate(izip(starts, ends)):
+            if start < end:
+                yield 'child', idx, start, end
+            if idx < len(lefts) and lefts[idx] < rights[idx]:
+                yield 'item', idx, lefts[idx], rights[idx]
+
+    def _searchsortedIn(self, node, keys, order, offset, result, side):
+        if node.isLeaf():
+            nodeKeys = self._nodeArray(node.getKeys())
+            result[order] = offset + nodeKeys.searchsorted(keys, side)
+            return
+
+        nodes = node.getNodes()
+        before = [0]
+        for child in nodes:
+            before.append(before[-1] + child.getCount())
+
+        for kind, idx, start, end in self._iterQueryGroups(node, keys):
+            if kind == 'child':
+                self._searchsortedIn(nodes[idx], keys[start:end], order[start:end],
+                        offset + before[idx] + idx, result, side)
+            else:
+                result[order[start:end]] = (offset + before[idx+1] + idx
+                        + (side == 'right'))
+
+    def _getManyIn(self, node, keys, order, result):
+        if node.isLeaf():
+            nodeKeys = self._nodeArray(node.getKeys())
+            idx = nodeKeys.searchsorted(keys)
+            hit = idx < len(nodeKeys)
+            hit[hit] = nodeKeys[idx[hit]] == keys[hit]
+            self._putValues(node, idx[hit], order[hit], result)
+            return
+
+        nodes = node.getNodes()
+        for kind, idx, start, end in self._iterQueryGroups(node, keys):
+            if kind == 'child':
+                self._getManyIn(nodes[idx], keys[start:end], order[start:end], result)
+            else: result[order[start:end]] = node.getValues()[idx]
+
+    def _putValues(self, node, idx, order, result):
+        values = node.getValues()
+        if node.valueTypecode is not None:
+            result[order] = self._nodeArray(values)[idx]
+        else:
+            for valueIdx, resultIdx in izip(idx.tolist(), order.tolist()):
+                result[resultIdx] = values[valueIdx]
+
+    def _collectArrays(self, node, keyParts, valueParts):
+        keys, values = node.getKeys(), node.getValues()
+        if node.valueTypecode is not None:
+            values = self._nodeArray(values)
+        keys = self._nodeArray(keys)
+        if node.isLeaf():
+            keyParts.append(keys)
+            valueParts.append(values)
+            return
+
+        for idx, child in enumerate(node.getNodes()):
+            self._collectArrays(child, keyParts, valueParts)
+            if idx < len(keys):
+                keyParts.append(keys[idx:idx+1])
+                valueParts.append(values[idx:idx+1])
+
+class BTreeIntKeys(BTreeArrayFoundation):
+    """Machine int keys stored in arrays; any Python values"""
+    LeafFactory = IntKeyLeafNode
+    BranchFactory = IntKeyBranchNode
+
+class BTreeIntItems(BTreeArrayFoundation):
+    """Machine int keys and values, both stored in arrays"""
+    LeafFactory = IntItemLeafNode
+    BranchFactory = IntItemBranchNode
+
+class BTreeFloatKeys(BTreeArrayFoundation):
+    """Float keys stored in arrays; any Python values"""
+    LeafFactory = FloatKeyLeafNode
+    BranchFactory = FloatKeyBranchNode
+
+class BTreeFloatItems(BTreeArrayFoundation):
+    """Float keys and values, both stored in arrays"""
+    LeafFactory = FloatItemLeafNode
+    BranchFactory = FloatItemBranchNode
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Prefix compressed trees
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreePrefixKeys(BTreeFoundation):
+    """String keys, with each leaf storing its keys' shared prefix once.
+    Suited to path-like keys; all keys must be str, or all unicode"""
+    # wide leaves share longer runs of keys, and so more of each prefix
+    minDegree = 64
+    maxDegree = 256
+    LeafFactory = PrefixLeafNode
+    BranchFactory = BranchNode
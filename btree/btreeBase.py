@@ -10,7 +10,9 @@
 #~ Imports 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-from TG.common.iterators import iterBy2
+from itertools import islice, izip
+from operator import itemgetter
+from btreeNodes import bisectKey
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 #~ Definitions 
@@ -48,6 +50,64 @@ class BTreeBasic(BTreeBase):
     def __init__(self):
         self._newRootNode()
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_editToken', None)
+        state.pop('_adjustCounts', None)
+        profiler = state.pop('_profiler', None)
+        if profiler is not None:
+            # profiling hooks are bound to this tree, so copies, pieces
+            # and pickles get the unhooked methods instead
+            profiler.unhookState(state)
+        return state
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Snapshots
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    # Nodes are modified in place only when their _owner is this tree's
+    # _editToken.  A snapshot hands out new tokens to both trees, so every
+    # existing node becomes shared and is path-copied on the next write.
+    _editToken = None
+
+    def snapshot(self):
+        """Returns an O(1) copy sharing structure with this tree"""
+        result = self.__class__.__new__(self.__class__)
+        result.__dict__.update(self.__getstate__())
+        self._editToken = object()
+        result._editToken = object()
+        return result
+
+    def _ownNode(self, node):
+        node._owner = self._editToken
+        return node
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Adjustment counters
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    # Nodes report each structural change made for this tree.  Counters
+    # start with the tree object, and are not pickled or shared with
+    # snapshots.
+    adjustmentKinds = ('split', 'combine', 'rotate', 'collapse')
+    _adjustCounts = None
+
+    def _countAdjustment(self, kind):
+        counts = self._adjustCounts
+        if counts is None:
+            counts = self.resetAdjustmentCounts()
+        counts[kind] += 1
+
+    def getAdjustmentCounts(self):
+        counts = dict.fromkeys(self.adjustmentKinds, 0)
+        counts.update(self._adjustCounts or ())
+        return counts
+
+    def resetAdjustmentCounts(self):
+        counts = dict.fromkeys(self.adjustmentKinds, 0)
+        self._adjustCounts = counts
+        return counts
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     #~ Interface
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -65,23 +125,80 @@ class BTreeBasic(BTreeBase):
         return result
 
     def _insert(self, key, value):
-        stack = self._nodeStackFor(key, True)
-        idx = stack[0][1]
+        path, item, idx = self._editNodePathFor(key)
         treeCtx = self._treeCtx()
-        result = stack[1].insertItem(treeCtx, key, (key, value), idx)
-        self._splitFullStackNodes(stack[1:])
+        hostNode = path[-1][0]
+        size = len(hostNode)
+        result = hostNode.insertItem(treeCtx, key, (key, value), idx)
+        if len(hostNode) != size:
+            for node, nodeIdx in path[:-1]:
+                node._adjustCount(1)
+        self._splitFullPathNodes(path)
 
     def _delete(self, key):
         self._pop(key)
 
     def _pop(self, key, *args):
-        stack = self._nodeStackFor(key, True)
-        item, idx = stack[0]
+        path, item, idx = self._editNodePathFor(key)
+        if item is not None:
+            for node, nodeIdx in path:
+                node._adjustCount(-1)
         treeCtx = self._treeCtx()
-        result = stack[1].popItem(treeCtx, key, item, idx, *args)
-        self._balanceStackNodes(stack[1:])
+        hostNode = path[-1][0]
+        result = hostNode.popItem(treeCtx, key, item, idx, *args)
+        if not (self.deferBalance and hostNode.isLeaf()):
+            self._balancePathNodes(path)
+        elif not hostNode:
+            self._dropEmptyLeaf(path)
+        elif item is not None and hostNode.isUnderfilled(treeCtx):
+            self._deferredCount += 1
+            if self._deferredCount >= self.deferredCompactRatio*path[0][0].getCount():
+                self.compact()
         return result
 
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Deferred balancing
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    # With deferBalance set, a delete that leaves its leaf non-empty skips
+    # rebalancing, so leaves may run below minDegree; an emptied leaf is
+    # folded into a peer.  compact() rebuilds the tree, and runs by itself
+    # once the deferred deletes reach deferredCompactRatio times the
+    # tree's size.
+    deferBalance = False
+    deferredCompactRatio = 0.5
+    _deferredCount = 0
+
+    def getDeferBalance(self):
+        return self.deferBalance
+    def setDeferBalance(self, deferBalance=True, compactRatio=None):
+        if compactRatio is not None:
+            self.deferredCompactRatio = compactRatio
+        self.deferBalance = deferBalance
+        if not deferBalance and self._deferredCount:
+            self.compact()
+
+    def _dropEmptyLeaf(self, path):
+        # Folds an emptied leaf into a peer, instead of refilling it one
+        # rotation at a time while its peers are themselves underfilled
+        if len(path) < 2:
+            return
+        treeCtx = self._treeCtx()
+        parentNode, idx = path[-2][0], path[-1][1]
+        if idx:
+            idx -= 1
+        node = parentNode._combineIndex(treeCtx, idx)
+        self._countAdjustment('combine')
+        if not node.split(treeCtx, parentNode, idx):
+            self._balancePathNodes(path[:-1])
+
+    def compact(self, fill=0.9):
+        """Rebuilds the tree with nodes filled to about fill*maxDegree,
+        settling any deferred deletes"""
+        treeCtx = self._treeCtx()
+        self._loadSortedItems(list(self._getRootNode().iteritems(treeCtx)), fill)
+        self._deferredCount = 0
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     #~ Root Storage
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -92,12 +209,611 @@ class BTreeBasic(BTreeBase):
     def _setRootNode(self, rootNode):
         self._rootNode = rootNode
     def _newRootNode(self):
-        self._setRootNode(self.LeafFactory())
+        self._setRootNode(self._ownNode(self.LeafFactory()))
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Bulk loading
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def _loadItems(self, items, fill=0.9):
+        """Replaces the tree contents with items, in any order.  Later
+        items win over earlier items with an equal key, as with dict."""
+        self._loadSortedItems(self._sortedUniqueItems(items), fill)
+
+    def _sortedUniqueItems(self, items):
+        keyCmp = self.keyCmp
+        items = list(items)
+        if keyCmp is cmp:
+            items.sort(key=itemgetter(0))
+        else: items.sort(cmp=lambda a, b: keyCmp(a[0], b[0]))
+
+        unique = items[:1]
+        for item in items[1:]:
+            if keyCmp(unique[-1][0], item[0]) == 0:
+                unique[-1] = item
+            else: unique.append(item)
+        return unique
+
+    def _loadSortedItems(self, items, fill=0.9, count=None):
+        """Replaces the tree contents with items, which must be in strictly
+        increasing key order.  The tree is built bottom up with nodes
+        filled to about fill*maxDegree items.  When count is given, items
+        is consumed as a stream instead of being gathered into a list.
+        Raises ValueError on a key that does not follow its predecessor."""
+        if count is None:
+            if not isinstance(items, list):
+                items = list(items)
+            count = len(items)
+
+        iterItems = self._iterCheckedOrder(items)
+        sizes = list(self._iterFillSizes(count+1, fill))
+        nodes, pivots = [], []
+        for size in sizes:
+            if len(nodes) < len(sizes) - 1:
+                # all but the last leaf are followed by a pivot item
+                leafItems = list(islice(iterItems, size))
+                pivots.append(leafItems.pop() if leafItems else None)
+            else: leafItems = list(islice(iterItems, size-1))
+
+            if len(leafItems) != size-1:
+                raise ValueError("Expected %d sorted items" % (count,))
+            nodes.append(self._newLoadedNode(leafItems))
+
+        while len(nodes) > 1:
+            branches, branchPivots = [], []
+            idx = 0
+            for size in self._iterFillSizes(len(nodes), fill):
+                end = idx + size
+                branches.append(self._newLoadedNode(
+                        pivots[idx:end-1], nodes[idx:end]))
+                if end < len(nodes):
+                    branchPivots.append(pivots[end-1])
+                idx = end
+            nodes, pivots = branches, branchPivots
+
+        self._setLoadedRoot(nodes[0])
+
+    # Bulk loads make each node with _newLoadedNode, from its items and,
+    # for branches, what _newLoadedNode returned for each child, and hand
+    # what it returned for the root to _setLoadedRoot.
+    def _newLoadedNode(self, items, children=None):
+        if children is None:
+            return self._ownNode(self.LeafFactory.fromSplit((items, [])))
+        return self._ownNode(self.BranchFactory.fromSplit((items, children)))
+
+    def _setLoadedRoot(self, rootNode):
+        self._setRootNode(rootNode)
+
+    def _iterCheckedOrder(self, items):
+        keyCmp = self.keyCmp
+        iterItems = iter(items)
+        for prev in iterItems:
+            yield prev
+            break
+        else: return
+
+        for item in iterItems:
+            if keyCmp(prev[0], item[0]) >= 0:
+                raise ValueError("Items out of order: %r does not follow %r" % (item[0], prev[0]))
+            yield item
+            prev = item
+
+    def _iterFillSizes(self, total, fill):
+        # Splits total slots into node groups of (items + 1) slots each,
+        # sized near the fill target without dropping below minDegree
+        # items whenever total allows it.
+        minItems = max(2, self.minDegree)
+        target = max(minItems, min(self.maxDegree, int(fill*self.maxDegree)))
+        count = -(-total // (target+1))
+        count = min(count, max(1, total // (minItems+1)))
+        count = max(count, -(-total // (self.maxDegree+1)))
+
+        size, extra = divmod(total, count)
+        for idx in xrange(count):
+            if idx < extra:
+                yield size + 1
+            else: yield size
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Batched operations
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    # Batches are sorted, then split among the children of each node on
+    # the way down, so every touched node is visited once per batch.
+    # Batches of at least batchRebuildRatio times the tree's size are
+    # merged with the existing items and bulk loaded instead.
+    batchRebuildRatio = 0.25
+
+    def _findMany(self, keys, default=None):
+        keys = list(keys)
+        uniqueKeys, slots = self._sortedUniqueKeys(keys)
+        found = [None]*len(uniqueKeys)
+        self._findManyIn(self._treeCtx(), self._getRootNode(),
+                uniqueKeys, 0, len(uniqueKeys), found)
+
+        results = []
+        for slot in slots:
+            item = found[slot]
+            if item is None:
+                results.append(default)
+            else: results.append(item[1])
+        return results
+
+    def _insertMany(self, items):
+        items = self._sortedUniqueItems(items)
+        if not items:
+            return
+
+        treeCtx = self._treeCtx()
+        rootNode = self._getRootNode()
+        if len(items) >= self.batchRebuildRatio*rootNode.getCount():
+            items = list(self._iterMergedItems(rootNode.iteritems(treeCtx), items))
+            self._loadSortedItems(items)
+            return
+
+        keys = [item[0] for item in items]
+        rootNode = self._claimRootNode()
+        self._insertManyIn(treeCtx, rootNode, keys, items, 0, len(keys))
+        while rootNode.isFull(treeCtx):
+            # grow the tree a level at a time until the root fits
+            rootNode = self._ownNode(self.BranchFactory.fromSplit(([], [rootNode])))
+            self._splitFullNode(treeCtx, rootNode.getNodeAtIdx(0), rootNode, 0)
+            self._setRootNode(rootNode)
+
+    def _popMany(self, keys, *args):
+        keys = list(keys)
+        uniqueKeys, slots = self._sortedUniqueKeys(keys)
+        found = [None]*len(uniqueKeys)
+        treeCtx = self._treeCtx()
+        self._findManyIn(treeCtx, self._getRootNode(),
+                uniqueKeys, 0, len(uniqueKeys), found)
+
+        results = []
+        for key, slot in izip(keys, slots):
+            item = found[slot]
+            if item is not None:
+                results.append(item[1])
+            elif args:
+                results.append(args[0])
+            else: raise KeyError(key)
+
+        keys = [key for key, item in izip(uniqueKeys, found) if item is not None]
+        if keys:
+            self._removeMany(treeCtx, keys)
+        return results
+
+    def _removeMany(self, treeCtx, keys):
+        # keys are sorted, unique, and all present in the tree
+        rootNode = self._getRootNode()
+        if len(keys) >= self.batchRebuildRatio*rootNode.getCount():
+            items = list(self._iterItemsExcluding(rootNode.iteritems(treeCtx), keys))
+            self._loadSortedItems(items)
+            return
+
+        deferred = []
+        self._removeManyIn(treeCtx, self._claimRootNode(), keys, 0, len(keys), deferred)
+        for key in deferred:
+            self._pop(key)
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def _findManyIn(self, treeCtx, node, keys, lo, hi, found):
+        if node.isLeaf():
+            for idx in xrange(lo, hi):
+                item = node.findHostOfKey(treeCtx, keys[idx])[1]
+                if item is not None:
+                    found[idx] = item
+            return
+
+        for idx, start, end, item in self._iterBatchGroups(treeCtx, node, keys, lo, hi):
+            if item:
+                found[start] = item
+            else:
+                self._findManyIn(treeCtx, node.getNodeAtIdx(idx), keys, start, end, found)
+
+    def _insertManyIn(self, treeCtx, node, keys, items, lo, hi):
+        """Inserts items[lo:hi] under node, splitting each touched child
+        once all of its items are in.  Returns the number of new keys"""
+        if node.isLeaf():
+            size = len(node)
+            for idx in xrange(lo, hi):
+                node.insertItem(treeCtx, keys[idx], items[idx])
+            return len(node) - size
+
+        added = 0
+        groups = list(self._iterBatchGroups(treeCtx, node, keys, lo, hi))
+        # right to left, so splitting a child leaves the indices of the
+        # groups before it unchanged
+        for idx, start, end, item in reversed(groups):
+            if item:
+                node.insertItem(treeCtx, keys[start], items[start], idx)
+            else:
+                child = node._claimNodeAt(treeCtx, idx)
+                added += self._insertManyIn(treeCtx, child, keys, items, start, end)
+                self._splitFullNode(treeCtx, child, node, idx)
+        node._adjustCount(added)
+        return added
+
+    def _removeManyIn(self, treeCtx, node, keys, lo, hi, deferred):
+        """Removes keys[lo:hi] from leaves under node that stay at or above
+        their minimum fill.  Keys held in branches, or that would
+        underfill their leaf, are added to deferred for _pop to remove
+        with rebalancing.  Returns the number of keys removed"""
+        if node.isLeaf():
+            minSize = max(2, treeCtx.minDegree)
+            removed = 0
+            for idx in xrange(lo, hi):
+                key = keys[idx]
+                if len(node) > minSize:
+                    host, item, itemIdx = node.findHostOfKey(treeCtx, key)
+                    node.popItem(treeCtx, key, item, itemIdx)
+                    removed += 1
+                else: deferred.append(key)
+            return removed
+
+        removed = 0
+        for idx, start, end, item in self._iterBatchGroups(treeCtx, node, keys, lo, hi):
+            if item:
+                deferred.append(keys[start])
+            else:
+                child = node._claimNodeAt(treeCtx, idx)
+                removed += self._removeManyIn(treeCtx, child, keys, start, end, deferred)
+        node._adjustCount(-removed)
+        return removed
+
+    def _iterBatchGroups(self, treeCtx, node, keys, lo, hi):
+        # Splits the sorted keys[lo:hi] among the children of a branch
+        # node.  Yields (idx, start, end, item), where item is the node's
+        # item at idx when it matches keys[start], and otherwise
+        # keys[start:end] all belong under the child at idx.
+        nodeKeys = node.getKeys()
+        keyCmp = treeCtx.keyCmp
+        start = lo
+        while start < hi:
+            idx, item = node._idxInfoFromKey(treeCtx, keys[start])
+            if item:
+                yield idx, start, start+1, item
+                start += 1
+                continue
+
+            if idx < len(nodeKeys):
+                end = bisectKey(keys, nodeKeys[idx], keyCmp, start+1, hi)
+            else: end = hi
+            yield idx, start, end, None
+            start = end
+
+    def _splitFullNode(self, treeCtx, node, parentNode, idx):
+        # Splits node, at idx in parentNode, in halves until none of its
+        # pieces are full.  Pieces are split right to left, so the indices
+        # of those still pending stay valid.
+        pending = [(node, idx)]
+        while pending:
+            node, idx = pending.pop()
+            if node.isFull(treeCtx):
+                midItem, nextNode = node._splitNode(treeCtx)
+                node._resetCount()
+                parentNode._insertSplitNode(node, midItem, nextNode, idx)
+                self._countAdjustment('split')
+                pending.extend(((node, idx), (nextNode, idx+1)))
+
+    def _sortedUniqueKeys(self, keys):
+        # Returns (uniqueKeys, slots) with uniqueKeys sorted, and
+        # keys[i] equal to uniqueKeys[slots[i]]
+        keyCmp = self.keyCmp
+        order = range(len(keys))
+        if keyCmp is cmp:
+            order.sort(key=keys.__getitem__)
+        else: order.sort(cmp=lambda a, b: keyCmp(keys[a], keys[b]))
+
+        uniqueKeys, slots = [], [None]*len(keys)
+        for idx in order:
+            key = keys[idx]
+            if not uniqueKeys or keyCmp(uniqueKeys[-1], key) != 0:
+                uniqueKeys.append(key)
+            slots[idx] = len(uniqueKeys) - 1
+        return uniqueKeys, slots
+
+    def _iterMergedItems(self, items, batchItems):
+        # merges two sorted item sequences; batchItems win on equal keys
+        keyCmp = self.keyCmp
+        batchItems = iter(batchItems)
+        batchItem = next(batchItems, None)
+        for item in items:
+            while batchItem is not None and keyCmp(batchItem[0], item[0]) < 0:
+                yield batchItem
+                batchItem = next(batchItems, None)
+
+            if batchItem is not None and keyCmp(batchItem[0], item[0]) == 0:
+                yield batchItem
+                batchItem = next(batchItems, None)
+            else: yield item
+
+        if batchItem is not None:
+            yield batchItem
+            for batchItem in batchItems:
+                yield batchItem
+
+    def _iterItemsExcluding(self, items, keys):
+        # sorted items without those matching the sorted keys
+        keyCmp = self.keyCmp
+        keys = iter(keys)
+        end = object()
+        key = next(keys, end)
+        for item in items:
+            while key is not end and keyCmp(key, item[0]) < 0:
+                key = next(keys, end)
+            if key is not end and keyCmp(key, item[0]) == 0:
+                key = next(keys, end)
+            else: yield item
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Split and join
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    # Pieces are trees of this class sharing this tree's settings and edit
+    # token, so nodes move between them without being copied.  Only nodes
+    # along the split and join edges are touched; the subtrees hanging off
+    # them are reused or dropped whole.  A piece's root may be underfilled.
+
+    def _deleteRange(self, lo, hi):
+        """Removes the items with lo <= key < hi, None leaving that end
+        open.  Returns the number of items removed"""
+        treeCtx = self._treeCtx()
+        if lo is not None and hi is not None and self.keyCmp(lo, hi) >= 0:
+            return 0
+
+        count = self._getRootNode().getCount()
+        left, right = None, self._newPiece(self._getRootNode())
+        if lo is not None:
+            left, right = self._splitNodeAt(treeCtx, right._getRootNode(), lo)
+        if hi is not None:
+            right = self._splitNodeAt(treeCtx, right._getRootNode(), hi)[1]
+        else: right = None
+
+        result = self._joinPieces(treeCtx, left, None, right)
+        if result is None:
+            self._newRootNode()
+        else: self._setRootNode(result._getRootNode())
+        return count - self._getRootNode().getCount()
+
+    def _newPiece(self, rootNode):
+        piece = self.__class__.__new__(self.__class__)
+        piece.__dict__.update(self.__getstate__())
+        piece._editToken = self._editToken
+        piece._setRootNode(rootNode)
+        piece._collapseRoot()
+        return piece
+
+    def _newBranchPiece(self, items, nodes):
+        node = self.BranchFactory.fromSplit((items, nodes))
+        return self._newPiece(self._ownNode(node))
+
+    def _collapseRoot(self):
+        # an emptied branch root is replaced by its only child
+        rootNode = self._getRootNode()
+        while not rootNode and not rootNode.isLeaf():
+            rootNode = rootNode.getNodeAtIdx(0)
+        self._setRootNode(rootNode)
+
+    def _splitNodeAt(self, treeCtx, node, key):
+        """Splits the subtree under node into pieces holding the keys
+        below key, and those at or above it"""
+        idx, itemAtKey = node._idxInfoFromKey(treeCtx, key)
+        if node.isLeaf():
+            items = list(node.iteritems(treeCtx))
+            left = self.LeafFactory.fromSplit((items[:idx], []))
+            right = self.LeafFactory.fromSplit((items[idx:], []))
+            return (self._newPiece(self._ownNode(left)),
+                    self._newPiece(self._ownNode(right)))
+
+        items, nodes = node.getItems(), node.getNodes()
+        if itemAtKey:
+            left = self._newBranchPiece(items[:idx], nodes[:idx+1])
+            right = self._newBranchPiece(items[idx+1:], nodes[idx+1:])
+            return left, self._joinPieces(treeCtx, None, items[idx], right)
+
+        left, right = self._splitNodeAt(treeCtx, nodes[idx], key)
+        if idx:
+            outer = self._newBranchPiece(items[:idx-1], nodes[:idx])
+            left = self._joinPieces(treeCtx, outer, items[idx-1], left)
+        if idx < len(items):
+            outer = self._newBranchPiece(items[idx+1:], nodes[idx+1:])
+            right = self._joinPieces(treeCtx, right, items[idx], outer)
+        return left, right
+
+    def _joinPieces(self, treeCtx, left, item, right):
+        """Joins pieces whose keys are all below and all above item's key,
+        with item between them.  A missing item is taken from right.
+        Either piece may be None or empty.  Returns the joined piece, which
+        reuses one of the two"""
+        if left is None or not left._getRootNode():
+            left = None
+        if right is None or not right._getRootNode():
+            right = None
+        if left is None or right is None:
+            result = left or right
+            if item is not None:
+                if result is None:
+                    result = self._newPiece(self._ownNode(self.LeafFactory()))
+                result._insert(*item)
+            return result
+
+        if item is None:
+            item = self._popPieceItem(treeCtx, right)
+            if not right._getRootNode():
+                left._insert(*item)
+                return left
+
+        leftRoot, rightRoot = left._getRootNode(), right._getRootNode()
+        leftHeight, rightHeight = self._heightOf(leftRoot), self._heightOf(rightRoot)
+        if leftHeight == rightHeight:
+            rootNode = self.BranchFactory.fromBranch(leftRoot, item, rightRoot)
+            left._setRootNode(self._ownNode(rootNode))
+            self._refillEdgeNode(treeCtx, rootNode, 1)
+            self._refillEdgeNode(treeCtx, rootNode, 0)
+            left._collapseRoot()
+            return left
+
+        # hang the shorter piece off the taller piece's edge, at the level
+        # where its root fits
+        if leftHeight > rightHeight:
+            host = left
+            path = self._edgePath(treeCtx, left, leftHeight - rightHeight, -1)
+            parentNode = path[-1][0]
+            parentNode._appendEntry(item)
+            parentNode.getNodes().append(rightRoot)
+            idx = len(parentNode)
+        else:
+            host = right
+            path = self._edgePath(treeCtx, right, rightHeight - leftHeight, 0)
+            parentNode = path[-1][0]
+            parentNode._insertEntry(0, item)
+            parentNode.getNodes().insert(0, leftRoot)
+            idx = 0
+
+        self._refillEdgeNode(treeCtx, parentNode, idx)
+        for node, nodeIdx in path:
+            node._resetCount()
+        host._splitFullPathNodes(path)
+        return host
+
+    def _popPieceItem(self, treeCtx, piece):
+        # removes and returns the first item of a non-empty piece
+        item = piece._claimRootNode()._popMinLeafItem(treeCtx)
+        piece._collapseRoot()
+        return item
+
+    def _pieceKeyRange(self, treeCtx, piece):
+        rootNode = piece._getRootNode()
+        if not rootNode:
+            return None, None
+        maxNode = rootNode.findMaxLeafNode()
+        return (rootNode.findMinLeafNode().getItemAtIdx(0, treeCtx)[0],
+                maxNode.getItemAtIdx(len(maxNode)-1, treeCtx)[0])
+
+    def _releasePiece(self, piece):
+        # hands a piece out as a tree of its own; nodes it shares with
+        # other pieces are copied before being written
+        if piece is None:
+            piece = self._newPiece(self._ownNode(self.LeafFactory()))
+        piece._editToken = object()
+        return piece
+
+    def _splitAt(self, key):
+        """Returns (left, right) trees holding the items with keys below
+        key, and those at or above it.  Both share nodes with this tree,
+        which is left unchanged."""
+        source = self.snapshot()
+        treeCtx = source._treeCtx()
+        left, right = source._splitNodeAt(treeCtx, source._getRootNode(), key)
+        return source._releasePiece(left), source._releasePiece(right)
+
+    def _canRelinkWith(self, other):
+        return (type(self) is type(other)
+            and (self.minDegree, self.maxDegree) == (other.minDegree, other.maxDegree)
+            and self.keyCmp == other.keyCmp
+            and getattr(self, 'keyFunc', None) == getattr(other, 'keyFunc', None))
+
+    def _mergedWith(self, other):
+        """Returns a tree holding the items of this tree and other, whose
+        values win for equal keys.  Both trees are left unchanged.  Only
+        the overlap of their key ranges is merged item by item; the nodes
+        outside it are relinked."""
+        source = self.snapshot()
+        other._editToken = object()
+        treeCtx = source._treeCtx()
+        keyCmp = source.keyCmp
+        left = source._newPiece(source._getRootNode())
+        right = source._newPiece(other._getRootNode())
+
+        leftMin, leftMax = source._pieceKeyRange(treeCtx, left)
+        rightMin, rightMax = source._pieceKeyRange(treeCtx, right)
+        if leftMin is None or rightMin is None:
+            return source._releasePiece(source._joinPieces(treeCtx, left, None, right))
+        if keyCmp(leftMax, rightMin) < 0:
+            return source._releasePiece(source._joinPieces(treeCtx, left, None, right))
+        if keyCmp(rightMax, leftMin) < 0:
+            return source._releasePiece(source._joinPieces(treeCtx, right, None, left))
+
+        # the pieces below lo and above hi come whole from one tree each
+        lo = leftMin if keyCmp(leftMin, rightMin) > 0 else rightMin
+        hi = leftMax if keyCmp(leftMax, rightMax) < 0 else rightMax
+        leftBelow, left = source._splitNodeAt(treeCtx, left._getRootNode(), lo)
+        rightBelow, right = source._splitNodeAt(treeCtx, right._getRootNode(), lo)
+        left, leftAbove = source._splitNodeAt(treeCtx, left._getRootNode(), hi)
+        right, rightAbove = source._splitNodeAt(treeCtx, right._getRootNode(), hi)
+
+        items = list(source._iterMergedItems(
+                left._getRootNode().iteritems(treeCtx),
+                right._getRootNode().iteritems(treeCtx)))
+        hiItem = None
+        for piece in (leftAbove, rightAbove):
+            if piece._getRootNode() and keyCmp(source._pieceKeyRange(treeCtx, piece)[0], hi) == 0:
+                hiItem = source._popPieceItem(treeCtx, piece)
+        items.append(hiItem)
+
+        middle = source._newPiece(source._ownNode(source.LeafFactory()))
+        middle._loadSortedItems(items)
+        # at most one of each pair is left non-empty
+        below = source._joinPieces(treeCtx, leftBelow, None, rightBelow)
+        above = source._joinPieces(treeCtx, leftAbove, None, rightAbove)
+        result = source._joinPieces(treeCtx, below, None, middle)
+        result = source._joinPieces(treeCtx, result, None, above)
+        return source._releasePiece(result)
+
+    def _edgePath(self, treeCtx, piece, depth, childIdx):
+        # claimed path of depth nodes down the first (childIdx 0) or last
+        # (childIdx -1) edge of piece
+        node = piece._claimRootNode()
+        path = [[node, None]]
+        for level in xrange(depth-1):
+            nodeIdx = len(node.getNodes())-1 if childIdx else 0
+            node = node._claimNodeAt(treeCtx, nodeIdx)
+            path.append([node, nodeIdx])
+        return path
+
+    def _heightOf(self, node):
+        height = 0
+        while node is not None:
+            height += 1
+            node = node.getNodeAtIdx(0)
+        return height
+
+    def _refillEdgeNode(self, treeCtx, parentNode, idx):
+        # Refills the underfilled first (idx 0) or last child of
+        # parentNode from its one peer, by combining them when they fit
+        # in one node, and otherwise evening them out.
+        nodes = parentNode.getNodes()
+        node = nodes[idx]
+        if len(nodes) < 2 or not node.isUnderfilled(treeCtx):
+            return
+
+        peerIdx = idx-1 if idx else 1
+        peerNode = nodes[peerIdx]
+        total = len(node) + len(peerNode)
+        if total < treeCtx.maxDegree:
+            parentNode._combineIndex(treeCtx, min(idx, peerIdx))
+            self._countAdjustment('combine')
+            return
+
+        while len(parentNode.getNodeAtIdx(idx)) < total//2:
+            if idx:
+                parentNode._rotateItemUp(treeCtx, peerIdx, peerNode, node)
+            else: parentNode._rotateItemDown(treeCtx, idx, node, peerNode)
+            self._countAdjustment('rotate')
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     #~ Tools
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+    def _claimRootNode(self):
+        rootNode = self._getRootNode()
+        token = self._editToken
+        if token is not None and rootNode._owner is not token:
+            rootNode = rootNode.copy(token)
+            self._setRootNode(rootNode)
+        return rootNode
+
     def _findHostOfKey(self, key):
         treeCtx = self._treeCtx()
         node = self._getRootNode()
@@ -108,43 +824,60 @@ class BTreeBasic(BTreeBase):
         else:
             return (node, None, None)
 
-    def _iterNodeTrace(self, key, incItem=False):
+    def _nodePathFor(self, key):
+        """Returns (path, item, idx) for the descent to key.  path lists a
+        [node, nodeIdx] pair from the root down to the node hosting key,
+        nodeIdx being the node's index in the node above it (None for the
+        root).  item is key's item, or None when absent, and idx is its
+        position hint within the last node."""
         treeCtx = self._treeCtx()
-        node, item, idx = self._getRootNode(), None, None
+        path = []
+        node, nodeIdx, idx = self._getRootNode(), None, None
         while node is not None:
-            yield node
+            path.append([node, nodeIdx])
             node, item, idx = node.findHostOfKey(treeCtx, key)
             if item is not None:
-                break
-        if incItem:
-            yield item, idx
+                return path, item, idx
+            nodeIdx = idx
+        return path, None, idx
 
-    def _nodeStackFor(self, key, incItem=False):
-        result = list(self._iterNodeTrace(key, incItem))
-        result.reverse()
-        return result
+    def _editNodePathFor(self, key):
+        # like _nodePathFor, with every node on the path owned by this tree
+        path, item, idx = self._nodePathFor(key)
+        if self._editToken is None:
+            return path, item, idx
 
-    def _insertSplitNode(self, leftNode, midItem, rightNode):
+        treeCtx = self._treeCtx()
+        path[0][0] = node = self._claimRootNode()
+        for entry in path[1:]:
+            entry[0] = node = node._claimNodeAt(treeCtx, entry[1])
+        return path, item, idx
+
+    def _insertSplitNode(self, leftNode, midItem, rightNode, idx=None):
         rootNode = self.BranchFactory.fromBranch(leftNode, midItem, rightNode)
-        self._setRootNode(rootNode)
+        self._setRootNode(self._ownNode(rootNode))
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     #~ Adjustment tools
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def _splitFullStackNodes(self, stack):
+    def _splitFullPathNodes(self, path):
         treeCtx = self._treeCtx()
-        for node, parentNode in iterBy2(stack, end=self):
-            if not node.split(treeCtx, parentNode):
+        for pos in xrange(len(path)-1, -1, -1):
+            node, nodeIdx = path[pos]
+            parentNode = path[pos-1][0] if pos else self
+            if not node.split(treeCtx, parentNode, nodeIdx):
                 break
 
-    def _balanceStackNodes(self, stack):
+    def _balancePathNodes(self, path):
         treeCtx = self._treeCtx()
-        for node, parentNode in iterBy2(stack, end=self):
-            if not node.balance(treeCtx, parentNode):
+        for pos in xrange(len(path)-1, -1, -1):
+            node, nodeIdx = path[pos]
+            parentNode = path[pos-1][0] if pos else self
+            if not node.balance(treeCtx, parentNode, nodeIdx):
                 break
 
-    def _getPeerNodesOf(self, node):
+    def _getPeerNodesOf(self, node, nodeIdx=None):
         return 0, None, None
 
     def _collapseChild(self, child):
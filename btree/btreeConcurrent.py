@@ -0,0 +1,114 @@
+##~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~##
+##~ Copyright (C) 2002-2009  TechGame Networks, LLC.              ##
+##~                                                               ##
+##~ This library is free software; you can redistribute it        ##
+##~ and/or modify it under the terms of the BSD style License as  ##
+##~ found in the LICENSE file included with this distribution.    ##
+##~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~##
+
+"""Thread safe BTrees.
+
+Readers take no lock.  Writers are serialized by a lock, and never modify
+a node that a reader can reach: each write runs on a work tree with a
+fresh edit token, so the copy on write machinery copies just the nodes
+along the path it changes, and the new root is published with a single
+assignment once the write is complete.  A read walks the root it started
+from, so cursors and iterators see the tree as it was when they started,
+however many writes are published meanwhile.
+
+transaction() groups several writes, publishing them together, or not at
+all if the block raises."""
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import threading
+from contextlib import contextmanager
+
+import btree
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+def writeMethod(name):
+    """Method running the inherited name in a transaction, unless called
+    on a work tree already"""
+    def method(self, *args, **kw):
+        if self._working:
+            return getattr(super(BTreeConcurrentMixin, self), name)(*args, **kw)
+        with self._getWriteLock():
+            work = self._newWorkTree()
+            result = getattr(work, name)(*args, **kw)
+            self._publish(work)
+            return result
+    method.__name__ = name
+    return method
+
+class BTreeConcurrentMixin(object):
+    _working = False
+    _writeLock = None
+    _writeLockGuard = threading.Lock()
+
+    def __getstate__(self):
+        state = super(BTreeConcurrentMixin, self).__getstate__()
+        state.pop('_writeLock', None)
+        return state
+
+    def _getWriteLock(self):
+        lock = self._writeLock
+        if lock is None:
+            # snapshots and unpickled trees start without a lock
+            with self._writeLockGuard:
+                lock = self.__dict__.get('_writeLock')
+                if lock is None:
+                    lock = self._writeLock = threading.Lock()
+        return lock
+
+    @contextmanager
+    def transaction(self):
+        """Holds the write lock, yielding a work tree to change.  Changes
+        are published to this tree together when the block exits, and
+        dropped if it raises.  Other threads see none of them until then."""
+        if self._working:
+            yield self
+            return
+
+        with self._getWriteLock():
+            work = self._newWorkTree()
+            yield work
+            self._publish(work)
+
+    def _newWorkTree(self):
+        work = self.__class__.__new__(self.__class__)
+        work.__dict__.update(self.__getstate__())
+        work._editToken = object()
+        work._working = True
+        return work
+
+    def _publish(self, work):
+        state = vars(work).copy()
+        del state['_editToken'], state['_working']
+        vars(self).update(state)
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Writes
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    _insert = writeMethod('_insert')
+    _pop = writeMethod('_pop')
+    _insertMany = writeMethod('_insertMany')
+    _popMany = writeMethod('_popMany')
+    _deleteRange = writeMethod('_deleteRange')
+    _loadSortedItems = writeMethod('_loadSortedItems')
+    _newRootNode = writeMethod('_newRootNode')
+    compact = writeMethod('compact')
+
+    # read then write, so both steps need the same version of the tree
+    popitem = writeMethod('popitem')
+    setdefault = writeMethod('setdefault')
+
+class BTreeConcurrent(BTreeConcurrentMixin, btree.BTree):
+    pass
+
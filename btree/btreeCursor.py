@@ -0,0 +1,206 @@
+##~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~##
+##~ Copyright (C) 2002-2009  TechGame Networks, LLC.              ##
+##~                                                               ##
+##~ This library is free software; you can redistribute it        ##
+##~ and/or modify it under the terms of the BSD style License as  ##
+##~ found in the LICENSE file included with this distribution.    ##
+##~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~##
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreeCursor(object):
+    """Ordered position within a BTree.
+
+    The cursor keeps the root-to-node trace as [node, idx] frames.  The top
+    frame indexes the current item of its node; lower frames index the
+    child node that was descended into.  Any mutation of the tree
+    invalidates the cursor until it is re-seeked."""
+
+    def __init__(self, tree):
+        self.tree = tree
+        self._stack = []
+
+    def __repr__(self):
+        if self._stack:
+            return '<%s at %r>' % (self.__class__.__name__, self.getKey())
+        else: return '<%s exhausted>' % (self.__class__.__name__,)
+
+    def __nonzero__(self):
+        return self.isValid()
+    def isValid(self):
+        return bool(self._stack)
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def getItem(self):
+        if not self._stack:
+            raise LookupError("Cursor is exhausted")
+        node, idx = self._stack[-1]
+        return node.getItemAtIdx(idx, self.tree._treeCtx())
+    def getKey(self):
+        return self.getItem()[0]
+    def getValue(self):
+        return self.getItem()[1]
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Seeking
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def seekFirst(self):
+        self._stack = []
+        self._pushMinTrace(self.tree._getRootNode())
+        return self._settleForward()
+
+    def seekLast(self):
+        self._stack = []
+        self._pushMaxTrace(self.tree._getRootNode())
+        return self._settleBackward()
+
+    def seek(self, key):
+        """Positions at the first item with a key >= key.  Returns True if
+        the item's key is equal to key"""
+        treeCtx = self.tree._treeCtx()
+        stack = []
+        node = self.tree._getRootNode()
+        while node is not None:
+            idx, itemAtKey = node._idxInfoFromKey(treeCtx, key)
+            stack.append([node, idx])
+            if itemAtKey:
+                self._stack = stack
+                return True
+            node = node.getNodeAtIdx(idx)
+
+        self._stack = stack
+        self._settleForward()
+        return False
+
+    def seekCeiling(self, key):
+        self.seek(key)
+        return self.isValid()
+    def seekHigher(self, key):
+        if self.seek(key):
+            return self.moveNext()
+        return self.isValid()
+    def seekFloor(self, key):
+        if self.seek(key):
+            return True
+        return self._retreatFromSeek()
+    def seekLower(self, key):
+        self.seek(key)
+        return self._retreatFromSeek()
+
+    def _retreatFromSeek(self):
+        if self._stack:
+            return self.movePrev()
+        return self.seekLast()
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Stepping
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def moveNext(self):
+        stack = self._stack
+        if not stack:
+            return False
+
+        frame = stack[-1]
+        node = frame[0]
+        if node.isLeaf():
+            frame[1] += 1
+            return self._settleForward()
+
+        # step into the subtree right of the current item
+        frame[1] += 1
+        self._pushMinTrace(node.getNodeAtIdx(frame[1]))
+        return self._settleForward()
+
+    def movePrev(self):
+        stack = self._stack
+        if not stack:
+            return False
+
+        frame = stack[-1]
+        node = frame[0]
+        if node.isLeaf():
+            frame[1] -= 1
+            return self._settleBackward()
+
+        # step into the subtree left of the current item
+        self._pushMaxTrace(node.getNodeAtIdx(frame[1]))
+        return self._settleBackward()
+
+    def iterForward(self):
+        while self._stack:
+            yield self.getItem()
+            self.moveNext()
+
+    def iterBackward(self):
+        while self._stack:
+            yield self.getItem()
+            self.movePrev()
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Trace tools
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def _pushMinTrace(self, node):
+        stack = self._stack
+        while node is not None:
+            stack.append([node, 0])
+            node = node.getNodeAtIdx(0)
+
+    def _pushMaxTrace(self, node):
+        stack = self._stack
+        while node is not None:
+            if node.isLeaf():
+                stack.append([node, len(node)-1])
+                break
+            stack.append([node, len(node)])
+            node = node.getNodeAtIdx(len(node))
+
+    def _settleForward(self):
+        # climb until the top frame indexes an item
+        stack = self._stack
+        while stack:
+            node, idx = stack[-1]
+            if idx < len(node):
+                return True
+            stack.pop()
+        return False
+
+    def _settleBackward(self):
+        # climb until the top frame indexes an item; branch frames hold
+        # the child index, so the preceding item is one less
+        stack = self._stack
+        if stack:
+            node, idx = stack[-1]
+            if 0 <= idx:
+                return True
+            stack.pop()
+
+        while stack:
+            frame = stack[-1]
+            if frame[1] > 0:
+                frame[1] -= 1
+                return True
+            stack.pop()
+        return False
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreeKeyFuncCursor(BTreeCursor):
+    """Cursor over a tree storing (keyFunc(key), (key, value)) items, as
+    used by BTreeKeyFuncMixin.  Seeks by key, and yields (key, value)."""
+
+    def getItem(self):
+        return BTreeCursor.getItem(self)[1]
+
+    def seek(self, key):
+        return BTreeCursor.seek(self, self.tree.keyFunc(key))
+
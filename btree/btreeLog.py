@@ -0,0 +1,394 @@
+##~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~##
+##~ Copyright (C) 2002-2009  TechGame Networks, LLC.              ##
+##~                                                               ##
+##~ This library is free software; you can redistribute it        ##
+##~ and/or modify it under the terms of the BSD style License as  ##
+##~ found in the LICENSE file included with this distribution.    ##
+##~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~##
+
+"""Write-ahead logged BTrees.
+
+A logged tree is stored as a checkpoint plus an append-only log of the
+changes made since.  Every insert, delete, batch and range delete appends
+one record to the log before returning, so the cost of a change is the
+size of the change.  checkpoint() writes the tree and empties the log;
+open() loads the last checkpoint and replays the log over it, batching
+runs of inserts and deletes.
+
+Replaying a record sets or removes keys to a given state, so replaying a
+log over a checkpoint that already holds some of its records gives the
+same tree.  A crash between writing a checkpoint and emptying the log is
+therefore harmless, and a torn record at the end of the log is dropped.
+
+BTreeLogged checkpoints through btreeStream, rewriting the whole tree, so
+it checkpoints by itself once the log holds checkpointRatio times as many
+records as the tree holds items, keeping the cost per change constant.
+BTreePagedLogged checkpoints with a commit of its page file, which writes
+only the nodes changed since the last one.  The page file keeps the pages
+those commits replace until vacuum() rewrites it."""
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import os
+import zlib
+import struct
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import btree
+import btreePaged
+import btreeStream
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreeWriteLog(object):
+    """Append-only file of pickled records.
+
+    The file starts with a magic string.  Every record is a 4 byte length
+    and a 4 byte crc32, followed by a pickle.  Records are flushed as they
+    are appended, and also fsynced when syncWrites is set."""
+
+    magic = 'TGBTLOG1'
+    recordFormat = '<Ii'
+
+    def __init__(self, filename, syncWrites=False):
+        self.filename = filename
+        self.syncWrites = syncWrites
+        if os.path.exists(filename):
+            self.file = open(filename, 'r+b')
+        else: self.file = open(filename, 'w+b')
+
+        magic = self.file.read(len(self.magic))
+        if not magic:
+            self.reset()
+        elif magic != self.magic:
+            self.close()
+            raise ValueError("Not a BTree log file: %r" % (filename,))
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def reset(self):
+        """Empties the log, once the records in it are checkpointed"""
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.write(self.magic)
+        self.sync()
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def append(self, record):
+        self.appendData(self.dumpRecord(record))
+
+    def dumpRecord(self, record):
+        return pickle.dumps(record, 2)
+
+    def appendData(self, data):
+        """Appends a record already pickled by dumpRecord"""
+        out = self.file
+        out.write(struct.pack(self.recordFormat, len(data), zlib.crc32(data)))
+        out.write(data)
+        if self.syncWrites:
+            self.sync()
+        else: out.flush()
+
+    def iterRecords(self):
+        """Iterates the complete records in the log, then truncates any
+        torn record at its end so that new records follow the last good one"""
+        headerSize = struct.calcsize(self.recordFormat)
+        f = self.file
+        f.seek(len(self.magic))
+        end = f.tell()
+        while 1:
+            header = f.read(headerSize)
+            if len(header) < headerSize:
+                break
+            size, crc = struct.unpack(self.recordFormat, header)
+            data = f.read(size)
+            if len(data) < size or zlib.crc32(data) != crc:
+                break
+            yield pickle.loads(data)
+            end = f.tell()
+
+        f.seek(end)
+        f.truncate()
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Logged trees
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreeLogMixin(object):
+    LogFactory = BTreeWriteLog
+    logSuffix = '.log'
+
+    # the log is checkpointed once it holds this many records, times the
+    # number of items in the tree, or minCheckpointRecords if larger.
+    # None checkpoints only when asked.
+    checkpointRatio = 1.0
+    minCheckpointRecords = 1024
+
+    _log = None
+    _logCount = 0
+    _logDepth = 0
+
+    @classmethod
+    def open(klass, filename, syncWrites=False, **kw):
+        """Opens the tree checkpointed to filename, replaying the changes
+        logged since.  When syncWrites is set, each change is fsynced to
+        the log before it returns"""
+        self = klass._openCheckpoint(filename, **kw)
+        self._filename = filename
+        log = self.LogFactory(filename + self.logSuffix, syncWrites)
+        self._logCount = self._replay(log.iterRecords())
+        self._log = log
+        return self
+
+    def __getstate__(self):
+        state = super(BTreeLogMixin, self).__getstate__()
+        for name in ('_log', '_logCount', '_logDepth', '_filename'):
+            state.pop(name, None)
+        return state
+
+    def getLog(self):
+        return self._log
+
+    def close(self):
+        """Closes the log.  Logged changes are kept, and replayed on open"""
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def checkpoint(self):
+        """Writes the tree as the new checkpoint, and empties the log"""
+        self._writeCheckpoint()
+        self._log.reset()
+        self._logCount = 0
+
+    @classmethod
+    def _openCheckpoint(klass, filename):
+        raise NotImplementedError('Subclass Responsibility: %r' % (klass,))
+    def _writeCheckpoint(self):
+        raise NotImplementedError('Subclass Responsibility: %r' % (self,))
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Logging
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    # Records are pickled before a change is made, so a record that cannot
+    # be pickled leaves the tree unchanged, and appended once the change
+    # succeeds, so failed changes are never logged.  Changes made by
+    # another logged change, as when a batch falls back to single deletes,
+    # are covered by its record.
+
+    def _isLogging(self):
+        return self._log is not None and not self._logDepth
+
+    def _callUnlogged(self, name, *args):
+        self._logDepth += 1
+        try:
+            return getattr(super(BTreeLogMixin, self), name)(*args)
+        finally:
+            self._logDepth -= 1
+
+    def _dumpLog(self, record):
+        return self._log.dumpRecord(record)
+
+    def _appendLog(self, data):
+        self._log.appendData(data)
+        self._logCount += 1
+        ratio = self.checkpointRatio
+        if ratio is not None and self._logCount >= self.minCheckpointRecords:
+            if self._logCount >= ratio*len(self):
+                self.checkpoint()
+
+    def _insert(self, key, value):
+        if not self._isLogging():
+            return super(BTreeLogMixin, self)._insert(key, value)
+        data = self._dumpLog(('set', key, value))
+        self._callUnlogged('_insert', key, value)
+        self._appendLog(data)
+
+    def _pop(self, key, *args):
+        if not self._isLogging():
+            return super(BTreeLogMixin, self)._pop(key, *args)
+        data = self._dumpLog(('pop', key))
+        result = self._callUnlogged('_pop', key, self._sentinal)
+        if result is self._sentinal:
+            if args: return args[0]
+            raise KeyError(key)
+        self._appendLog(data)
+        return result
+
+    def _insertMany(self, items):
+        if not self._isLogging():
+            return super(BTreeLogMixin, self)._insertMany(items)
+        items = list(items)
+        data = self._dumpLog(('setMany', items))
+        self._callUnlogged('_insertMany', items)
+        if items:
+            self._appendLog(data)
+
+    def _popMany(self, keys, *args):
+        if not self._isLogging():
+            return super(BTreeLogMixin, self)._popMany(keys, *args)
+        keys = list(keys)
+        data = self._dumpLog(('popMany', keys))
+        result = self._callUnlogged('_popMany', keys, *args)
+        if keys:
+            self._appendLog(data)
+        return result
+
+    def _deleteRange(self, lo, hi):
+        if not self._isLogging():
+            return super(BTreeLogMixin, self)._deleteRange(lo, hi)
+        data = self._dumpLog(('deleteRange', lo, hi))
+        result = self._callUnlogged('_deleteRange', lo, hi)
+        if result:
+            self._appendLog(data)
+        return result
+
+    def _newRootNode(self):
+        if not self._isLogging():
+            return super(BTreeLogMixin, self)._newRootNode()
+        data = self._dumpLog(('clear',))
+        self._callUnlogged('_newRootNode')
+        self._appendLog(data)
+
+    def _loadSortedItems(self, items, fill=0.9, count=None):
+        if not self._isLogging():
+            return super(BTreeLogMixin, self)._loadSortedItems(items, fill, count)
+        # replacing the contents would log the whole tree; checkpoint instead
+        self._callUnlogged('_loadSortedItems', items, fill, count)
+        self.checkpoint()
+
+    def compact(self, fill=0.9):
+        # same items, so nothing to log
+        if not self._isLogging():
+            return super(BTreeLogMixin, self).compact(fill)
+        self._callUnlogged('compact', fill)
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Replay
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def _replay(self, records):
+        """Applies logged records, merging runs of inserts and of deletes
+        into batches, and returns the number of records applied"""
+        count = 0
+        pending, pendingOp = [], None
+        for record in records:
+            count += 1
+            op = record[0]
+            if op in ('set', 'setMany'):
+                op = 'setMany'
+            elif op in ('pop', 'popMany'):
+                op = 'popMany'
+            if op != pendingOp:
+                self._replayBatch(pendingOp, pending)
+                pending, pendingOp = [], op
+
+            if record[0] == 'set':
+                pending.append(record[1:])
+            elif record[0] == 'pop':
+                pending.append(record[1])
+            elif op in ('setMany', 'popMany'):
+                pending.extend(record[1])
+            elif op == 'deleteRange':
+                self._deleteRange(*record[1:])
+            elif op == 'clear':
+                self._newRootNode()
+            else:
+                raise ValueError("Unknown BTree log record: %r" % (op,))
+
+        self._replayBatch(pendingOp, pending)
+        return count
+
+    def _replayBatch(self, op, pending):
+        if not pending:
+            return
+        if op == 'setMany':
+            # later items win over earlier items with an equal key
+            self._insertMany(pending)
+        elif op == 'popMany':
+            self._popMany(pending, None)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreeStreamLogMixin(BTreeLogMixin):
+    """Checkpoints to a btreeStream file, replaced atomically by rename"""
+
+    @classmethod
+    def _openCheckpoint(klass, filename):
+        if not os.path.exists(filename):
+            return klass()
+        f = open(filename, 'rb')
+        try:
+            return btreeStream.load(f, klass)
+        finally:
+            f.close()
+
+    def _writeCheckpoint(self):
+        filename = self._filename
+        tmpFilename = filename + '.tmp'
+        f = open(tmpFilename, 'wb')
+        try:
+            btreeStream.dump(self, f)
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+        os.rename(tmpFilename, filename)
+
+class BTreePagedLogMixin(BTreeLogMixin):
+    """Checkpoints by committing the page file, writing only the nodes
+    changed since the last checkpoint.  Any commit is a checkpoint."""
+
+    # checkpoints cost about as much as the changes since the last one,
+    # so they need not wait for the log to outgrow the tree
+    checkpointRatio = 0.0
+
+    @classmethod
+    def _openCheckpoint(klass, filename, cacheSize=1024):
+        return super(BTreeLogMixin, klass).open(filename, cacheSize)
+
+    def _writeCheckpoint(self):
+        super(BTreeLogMixin, self).commit()
+
+    def commit(self):
+        if self._log is None:
+            return super(BTreePagedLogMixin, self).commit()
+        self.checkpoint()
+
+    def close(self):
+        super(BTreePagedLogMixin, self).close()
+        self.getStore().close()
+
+    def vacuum(self):
+        """Commits the tree to a new, vacuumed page file as a checkpoint"""
+        super(BTreePagedLogMixin, self).vacuum()
+        if self._log is not None:
+            self._log.reset()
+            self._logCount = 0
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreeLogged(BTreeStreamLogMixin, btree.BTree):
+    minDegree = 64
+    maxDegree = 256
+
+class BTreePagedLogged(BTreePagedLogMixin, btreePaged.BTreePaged):
+    pass
@@ -10,6 +10,8 @@
 #~ Imports 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+from btreeCursor import BTreeCursor, BTreeKeyFuncCursor
+
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 #~ Definitions 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -28,12 +30,14 @@ class BTreeDictMixin(object):
         raise NotImplementedError("TODO")
 
     def copy(self):
-        raise NotImplementedError("TODO")
+        return self.snapshot()
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
     def __nonzero__(self):
         return bool(self._getRootNode())
+    def __len__(self):
+        return self._getRootNode().getCount()
 
     def __iter__(self):
         return self.iterkeys()
@@ -41,7 +45,7 @@ class BTreeDictMixin(object):
     def items(self):
         return list(self.iteritems())
     def iteritems(self):
-        return self._getRootNode().iteritems()
+        return self._getRootNode().iteritems(self._treeCtx())
 
     def keys(self):
         return list(self.iterkeys())
@@ -75,13 +79,16 @@ class BTreeDictMixin(object):
         self._newRootNode()
 
     def get(self, key, default=None):
-        return self._find(key, default)
+        item = self._find(key, self._sentinal)
+        if item is self._sentinal:
+            return default
+        return item[1]
     def pop(self, key, *args):
         return self._pop(key, *args)
     def popitem(self):
         node = self._getRootNode()
         if node:
-            key = node.getItems()[0][0]
+            key = node.getItemAtIdx(0, self._treeCtx())[0]
             return (key, self._pop(key))
         else:
             raise KeyError("BTree is empty")
@@ -95,20 +102,153 @@ class BTreeDictMixin(object):
             return result
 
     def update(self, other=None, **kwargs):
+        self._insertMany(self._iterUpdateItems(other, kwargs))
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def getMany(self, keys, default=None):
+        """Returns a list of the values for keys, with default for
+        missing keys"""
+        return self._findMany(keys, default)
+    def setMany(self, items):
+        """Sets every (key, value) of items, or of a mapping, as one batch"""
+        self._insertMany(self._iterUpdateItems(items, None))
+    def popMany(self, keys, *args):
+        """Removes keys, returning a list of their values.  Missing keys
+        raise KeyError before anything is removed, unless a default is
+        given"""
+        return self._popMany(keys, *args)
+
+    def _iterUpdateItems(self, other, kwargs):
         # Make progressively weaker assumptions about "other"
         if other is None:
             pass
         elif hasattr(other, 'iteritems'):  # iteritems saves memory and lookups
             for k, v in other.iteritems():
-                self[k] = v
+                yield k, v
         elif hasattr(other, 'keys'):
             for k in other.keys():
-                self[k] = other[k]
+                yield k, other[k]
         else:
             for k, v in other:
-                self[k] = v
+                yield k, v
 
         if kwargs:
             for k, v in kwargs.iteritems():
-                self[k] = v
+                yield k, v
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Key function ordering
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreeKeyFuncMixin(object):
+    """Orders a tree by keyFunc(key) instead of by a keyCmp function.
+
+    Keys are transformed once as they enter the tree, and the nodes store
+    (keyFunc(key), (key, value)) items, so node searches compare the
+    transformed keys natively.  Keys with equal keyFunc values are the
+    same key.  Put this mixin before the tree class, whose nodes must
+    accept any Python value."""
+
+    keyFunc = None
+    CursorFactory = BTreeKeyFuncCursor
+
+    def getKeyFunc(self):
+        return self.keyFunc
+    def setKeyFunc(self, keyFunc):
+        if self:
+            raise Exception("Cannot change the keyFunc on a filled Tree")
+        self.keyFunc = keyFunc
+
+    @classmethod
+    def fromSortedItems(klass, items, fill=0.9):
+        self = klass()
+        keyFunc = self.keyFunc
+        self._loadSortedItems(((keyFunc(k), (k, v)) for k, v in items), fill)
+        return self
+
+    def _loadItems(self, items, fill=0.9):
+        keyFunc = self.keyFunc
+        items = [(keyFunc(k), (k, v)) for k, v in items]
+        return super(BTreeKeyFuncMixin, self)._loadItems(items, fill)
+
+    def _iterUpdateItems(self, other, kwargs):
+        keyFunc = self.keyFunc
+        for k, v in super(BTreeKeyFuncMixin, self)._iterUpdateItems(other, kwargs):
+            yield keyFunc(k), (k, v)
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def iteritems(self):
+        for sortKey, item in super(BTreeKeyFuncMixin, self).iteritems():
+            yield item
+
+    def has_key(self, key):
+        return super(BTreeKeyFuncMixin, self).has_key(self.keyFunc(key))
+
+    def __getitem__(self, key):
+        return super(BTreeKeyFuncMixin, self).__getitem__(self.keyFunc(key))[1]
+    def __setitem__(self, key, value):
+        super(BTreeKeyFuncMixin, self).__setitem__(self.keyFunc(key), (key, value))
+    def __delitem__(self, key):
+        super(BTreeKeyFuncMixin, self).__delitem__(self.keyFunc(key))
+
+    def get(self, key, default=None):
+        item = super(BTreeKeyFuncMixin, self).get(self.keyFunc(key), self._sentinal)
+        if item is self._sentinal:
+            return default
+        return item[1]
+    def pop(self, key, *args):
+        item = super(BTreeKeyFuncMixin, self).pop(self.keyFunc(key), self._sentinal)
+        if item is not self._sentinal:
+            return item[1]
+        if args: return args[0]
+        raise KeyError(key)
+    def popitem(self):
+        sortKey, item = super(BTreeKeyFuncMixin, self).popitem()
+        return item
+
+    def getMany(self, keys, default=None):
+        keyFunc = self.keyFunc
+        items = self._findMany([keyFunc(k) for k in keys], self._sentinal)
+        return [default if item is self._sentinal else item[1] for item in items]
+    def popMany(self, keys, *args):
+        keys = list(keys)
+        keyFunc = self.keyFunc
+        sortKeys = [keyFunc(k) for k in keys]
+        if not args:
+            # check first, so a missing key raises before anything is removed
+            for key, item in zip(keys, self._findMany(sortKeys, self._sentinal)):
+                if item is self._sentinal:
+                    raise KeyError(key)
+
+        items = self._popMany(sortKeys, self._sentinal)
+        default = args[0] if args else None
+        return [default if item is self._sentinal else item[1] for item in items]
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+    def irange(self, lo=None, hi=None, reverse=False):
+        keyFunc = self.keyFunc
+        if lo is not None:
+            lo = keyFunc(lo)
+        if hi is not None:
+            hi = keyFunc(hi)
+        items = self._iterRange(BTreeCursor(self), lo, hi, reverse)
+        return (item for sortKey, item in items)
+
+    def deleteRange(self, lo=None, hi=None):
+        keyFunc = self.keyFunc
+        if lo is not None:
+            lo = keyFunc(lo)
+        if hi is not None:
+            hi = keyFunc(hi)
+        return self._deleteRange(lo, hi)
+
+    def splitAt(self, key):
+        return self._splitAt(self.keyFunc(key))
+
+    def rank(self, key):
+        return super(BTreeKeyFuncMixin, self).rank(self.keyFunc(key))
+    def select(self, index):
+        return super(BTreeKeyFuncMixin, self).select(index)[1]
@@ -10,14 +10,33 @@
 #~ Imports 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+from array import array
+from bisect import bisect_left
 from itertools import izip
+from os.path import commonprefix
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 #~ Definitions 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+def bisectKey(keys, key, keyCmp=cmp, lo=0, hi=None):
+    """Like bisect.bisect_left, honoring a custom keyCmp"""
+    if hi is None:
+        hi = len(keys)
+    if keyCmp is cmp:
+        return bisect_left(keys, key, lo, hi)
+
+    while lo < hi:
+        mid = (lo + hi)//2
+        if keyCmp(keys[mid], key) < 0:
+            lo = mid + 1
+        else: hi = mid
+    return lo
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
 class BTreeNodeBase(object):
-    __slots__ = ['_items']
+    __slots__ = ['_items', '_keys', '_owner']
 
     def __init__(self):
         self._initNode()
@@ -25,7 +44,8 @@ class BTreeNodeBase(object):
     def __getstate__(self):
         return self._items
     def __setstate__(self, state):
-        self._items = state
+        self.setItems(state)
+        self._owner = None
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     #~ Storage
@@ -33,6 +53,35 @@ class BTreeNodeBase(object):
 
     def _initNode(self):
         self.setItems()
+        self._owner = None
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Copy on write
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    # _owner is the edit token of the tree allowed to modify this node in
+    # place.  Nodes owned by any other token may be shared with a snapshot,
+    # and are copied before modification.
+
+    def copy(self, owner=None):
+        node = type(self)()
+        node._copyFrom(self)
+        node._owner = owner
+        return node
+    def _copyFrom(self, node):
+        self._items = list(node._items)
+        self._keys = list(node._keys)
+
+    def _claimNodeAt(self, treeCtx, idx):
+        """Returns the child at idx, first replacing it with a private copy
+        if it is not owned by treeCtx"""
+        node = self.getNodeAtIdx(idx)
+        if node is not None:
+            token = treeCtx._editToken
+            if node._owner is not token:
+                node = node.copy(token)
+                self.getNodes()[idx] = node
+        return node
 
     def __repr__(self):
         return '<%s.%s %s>' % (
@@ -46,20 +95,54 @@ class BTreeNodeBase(object):
     def __len__(self):
         return len(self.getItems())
 
+    def getCount(self):
+        """Number of items in this node's subtree"""
+        return len(self)
+    def _adjustCount(self, delta):
+        pass
+    def _resetCount(self):
+        pass
+
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     #~ Item and iteration methods
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
     _items = None
+    _keys = None
     def getItems(self):
         return self._items
     def setItems(self, items=None):
         if items is None:
             items = []
         self._items = items
+        self._keys = [item[0] for item in items]
     def iterItems(self):
         return iter(self.getItems())
 
+    def getKeys(self):
+        return self._keys
+
+    def _insertEntry(self, idx, item):
+        self._items.insert(idx, item)
+        self._keys.insert(idx, item[0])
+    def _appendEntry(self, item):
+        self._items.append(item)
+        self._keys.append(item[0])
+    def _extendEntries(self, items):
+        self._items.extend(items)
+        self._keys.extend(item[0] for item in items)
+    def _popEntry(self, idx=-1):
+        del self._keys[idx]
+        return self._items.pop(idx)
+    def _setEntry(self, idx, item):
+        self._items[idx] = item
+        if item is not None:
+            self._keys[idx] = item[0]
+        else: self._keys[idx] = None
+    def _truncateEntries(self, idx):
+        del self._items[idx:]
+        del self._keys[idx:]
+
     def getNodes(self):
         return ()
     def iterNodes(self):
@@ -84,6 +167,9 @@ class BTreeNodeBase(object):
             return None
         else: return self.getNodes()[idx]
 
+    def getItemAtIdx(self, idx, treeCtx=None):
+        return self.getItems()[idx]
+
     def isLeaf(self): 
         raise NotImplementedError('Subclass Responsibility: %r' % (self,))
 
@@ -91,9 +177,9 @@ class BTreeNodeBase(object):
     #~ Interface
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def iterWalk(self):
+    def iterWalk(self, treeCtx=None):
         raise NotImplementedError('Subclass Responsibility: %r' % (self,))
-    def iteritems(self):
+    def iteritems(self, treeCtx=None):
         raise NotImplementedError('Subclass Responsibility: %r' % (self,))
 
     def findItem(self, treeCtx, key, hintItem, idx=None, *args):
@@ -138,30 +224,31 @@ class BTreeNodeBase(object):
         if idx is None:
             idx, itemAtKey = self._idxInfoFromKey(treeCtx, key)
         else:
-            items = self.getItems()
-            if idx < len(items):
-                itemAtKey = items[idx]
-                if 0 != treeCtx.keyCmp(itemAtKey[0], key):
+            keys = self.getKeys()
+            if idx < len(keys):
+                itemAtKey = self.getItemAtIdx(idx)
+                if 0 != treeCtx.keyCmp(keys[idx], key):
                     itemAtKey = None
             else: 
                 itemAtKey = None
         return idx, itemAtKey
 
     def _idxInfoFromKey(self, treeCtx, key, default=(), end=()):
-        idx = -1
+        keys = self.getKeys()
         keyCmp = treeCtx.keyCmp
-        for idx, (iKey, iValue) in enumerate(self.getItems()):
-            cv = keyCmp(key, iKey)
-            if cv < 0:
+        idx = bisectKey(keys, key, keyCmp)
+        if idx == len(keys):
+            return idx, end
+        elif keyCmp is cmp:
+            if key < keys[idx]:
                 return idx, default
-            elif cv == 0:
-                return idx, (iKey, iValue)
-        else:
-            return idx+1, end
+        elif keyCmp(key, keys[idx]) != 0:
+            return idx, default
+        return idx, self.getItemAtIdx(idx)
 
     def _swapIndex(self, idx, item):
-        items = self.getItems()
-        result, items[idx] = items[idx], item
+        result = self.getItemAtIdx(idx)
+        self._setEntry(idx, item)
         return result
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -175,12 +262,16 @@ class BTreeNodeBase(object):
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def split(self, treeCtx, parentNode):
+    def split(self, treeCtx, parentNode, idx=None):
+        """Splits a full node, inserting the new node into parentNode.  idx
+        is this node's index in parentNode, when known."""
         if not self.isFull(treeCtx):
             return False
 
         midItem, nextNode = self._splitNode(treeCtx)
-        parentNode._insertSplitNode(self, midItem, nextNode)
+        self._resetCount()
+        parentNode._insertSplitNode(self, midItem, nextNode, idx)
+        treeCtx._countAdjustment('split')
         return True
 
     def _splitNode(self, treeCtx):
@@ -194,13 +285,15 @@ class BTreeNodeBase(object):
         pivotItem = items[idx]
         splitItems = (items[idx+1:], nodes[idx+1:])
 
-        del items[idx:]
+        self._truncateEntries(idx)
         if nodes:
             del nodes[idx+1:]
         return pivotItem, splitItems
 
     def _newFromSplitItems(self, treeCtx, items):
-        return self.fromSplit(items)
+        node = self.fromSplit(items)
+        node._owner = treeCtx._editToken
+        return node
 
     @classmethod
     def fromSplit(klass, (items, nodes)):
@@ -214,38 +307,45 @@ class BTreeNodeBase(object):
     #~ Balancing Tools
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def balance(self, treeCtx, parentNode):
+    def balance(self, treeCtx, parentNode, idx=None):
+        """Refills an underfilled node from its peers in parentNode.  idx
+        is this node's index in parentNode, when known."""
         if not self.isUnderfilled(treeCtx):
             return False
-        return self._balanceNode(treeCtx, parentNode)
+        return self._balanceNode(treeCtx, parentNode, idx)
 
-    def _balanceNode(self, treeCtx, parentNode):
-        idx, prevNode, nextNode = parentNode._getPeerNodesOf(self)
+    def _balanceNode(self, treeCtx, parentNode, idx=None):
+        idx, prevNode, nextNode = parentNode._getPeerNodesOf(self, idx)
 
         if prevNode is None:
             if nextNode is None:
-                parentNode._collapseChild(self)
+                if parentNode._collapseChild(self):
+                    treeCtx._countAdjustment('collapse')
 
             elif nextNode.isUnderfilled(treeCtx):
                 # combine self with next node
                 parentNode._combineIndex(treeCtx, idx)
+                treeCtx._countAdjustment('combine')
             else:
                 # shift min item from nextNode to parent, and from parent to self
                 parentNode._rotateItemDown(treeCtx, idx, self, nextNode)
+                treeCtx._countAdjustment('rotate')
         elif prevNode.isUnderfilled(treeCtx):
             # combine prev node with self
             parentNode._combineIndex(treeCtx, idx-1)
+            treeCtx._countAdjustment('combine')
         else:
             # shift max item from prevNode to parent, and from parent to self
             parentNode._rotateItemUp(treeCtx, idx-1, prevNode, self)
+            treeCtx._countAdjustment('rotate')
 
         return True
 
     def combineWith(self, item, next):
-        items = self.getItems()
+        self._adjustCount(int(item is not None) + next.getCount())
         if item is not None:
-            items.append(item)
-        items.extend(next.getItems())
+            self._appendEntry(item)
+        self._extendEntries(next.getItems())
 
         nodes = next.getNodes()
         if nodes:
@@ -272,17 +372,41 @@ class BTreeNodeBase(object):
             node, next = next, node.maxNode()
         return node
 
+    def _iterMinNodeTrace(self, treeCtx):
+        node = self
+        while node is not None:
+            yield node
+            node = node._claimNodeAt(treeCtx, 0)
+    def _iterMaxNodeTrace(self, treeCtx):
+        node = self
+        while node is not None:
+            yield node
+            node = node._claimNodeAt(treeCtx, -1)
+
     def _popMinLeafItem(self, treeCtx):
-        node = self.findMinLeafNode()
-        node, item = node._popMinEntry(treeCtx)
+        trace = list(self._iterMinNodeTrace(treeCtx))
+        for node in trace:
+            node._adjustCount(-1)
+        node, item = trace[-1]._popMinEntry(treeCtx)
         assert node is None
+        self._balanceTrace(treeCtx, trace, 0)
         return item
     def _popMaxLeafItem(self, treeCtx):
-        node = self.findMaxLeafNode()
-        node, item = node._popMaxEntry(treeCtx)
+        trace = list(self._iterMaxNodeTrace(treeCtx))
+        for node in trace:
+            node._adjustCount(-1)
+        node, item = trace[-1]._popMaxEntry(treeCtx)
         assert node is None
+        self._balanceTrace(treeCtx, trace, -1)
         return item
 
+    def _balanceTrace(self, treeCtx, trace, childIdx):
+        # rebalance from the leaf back up to, but not including, trace[0];
+        # each traced node is at childIdx in the node before it
+        for idx in xrange(len(trace)-1, 0, -1):
+            if not trace[idx].balance(treeCtx, trace[idx-1], childIdx):
+                break
+
     def _pushMinEntry(self, node, item):
         raise NotImplementedError('Subclass Responsibility: %r' % (self,))
     def _popMinEntry(self, treeCtx):
@@ -297,16 +421,41 @@ class BTreeNodeBase(object):
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 class BTreeBranchNodeBase(BTreeNodeBase):
-    __slots__ = BTreeNodeBase.__slots__ + ['_nodes']
+    __slots__ = BTreeNodeBase.__slots__ + ['_nodes', '_count']
 
     def __getstate__(self):
         return self._items, self._nodes
     def __setstate__(self, state):
-        self._items, self._nodes = state
+        items, nodes = state
+        self.setItems(items)
+        self.setNodes(nodes)
+        self._resetCount()
+        self._owner = None
 
     def _initNode(self):
         BTreeNodeBase._initNode(self)
         self.setNodes()
+        self._resetCount()
+
+    # Subtree item count, or None when it must be recomputed from the
+    # children on the next getCount()
+    _count = None
+    def getCount(self):
+        count = self._count
+        if count is None:
+            count = len(self) + sum(n.getCount() for n in self.getNodes())
+            self._count = count
+        return count
+    def _adjustCount(self, delta):
+        if self._count is not None:
+            self._count += delta
+    def _resetCount(self):
+        self._count = None
+
+    def _copyFrom(self, node):
+        BTreeNodeBase._copyFrom(self, node)
+        self._nodes = node._nodes[:]
+        self._count = node._count
 
     _nodes = None
     def getNodes(self):
@@ -331,36 +480,35 @@ class BTreeBranchNodeBase(BTreeNodeBase):
     def _collapseChild(self, node):
         assert type(self) is type(node)
         assert not self and len(self.getNodes()) == 1
-        self.setItems(node.getItems())
-        self.setNodes(node.getNodes())
+        self.setItems(list(node.getItems()))
+        self.setNodes(node.getNodes()[:])
+        self._resetCount()
         return True
 
     def _pushMinEntry(self, node, item):
-        items, nodes = self.getItems(), self.getNodes()
-        items.insert(0, item)
+        self._insertEntry(0, item)
         if node is not None:
-            nodes.insert(0, node)
+            self.getNodes().insert(0, node)
     def _popMinEntry(self, treeCtx):
-        items, nodes = self.getItems(), self.getNodes()
+        nodes = self.getNodes()
         if nodes:
-            return nodes.pop(0), items.pop(0)
-        else: return None, items.pop(0)
+            return nodes.pop(0), self._popEntry(0)
+        else: return None, self._popEntry(0)
     def _pushMaxEntry(self, node, item):
-        items, nodes = self.getItems(), self.getNodes()
-        items.append(item)
+        self._appendEntry(item)
         if node is not None:
-            nodes.append(node)
+            self.getNodes().append(node)
     def _popMaxEntry(self, treeCtx):
-        items, nodes = self.getItems(), self.getNodes()
+        nodes = self.getNodes()
         if nodes:
-            return nodes.pop(), items.pop()
-        else: return None, items.pop()
+            return nodes.pop(), self._popEntry()
+        else: return None, self._popEntry()
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def _getPeerNodesOf(self, node):
+    def _getPeerNodesOf(self, node, nodeIdx=None):
         raise NotImplementedError('Subclass Responsibility: %r' % (self,))
-    def _insertSplitNode(self, leftNode, midItem, rightNode):
+    def _insertSplitNode(self, leftNode, midItem, rightNode, idx=None):
         raise NotImplementedError('Subclass Responsibility: %r' % (self,))
     def _combineIndex(self, treeCtx, idx):
         raise NotImplementedError('Subclass Responsibility: %r' % (self,))
@@ -374,7 +522,7 @@ class BTreeBranchNodeBase(BTreeNodeBase):
 class BTreeBranchNode(BTreeBranchNodeBase):
     __slots__ = BTreeBranchNodeBase.__slots__
 
-    def iterWalk(self):
+    def iterWalk(self, treeCtx=None):
         inodes = self.iterNodes()
         for node, i in izip(inodes, self.getItems()):
             yield False, node
@@ -383,49 +531,52 @@ class BTreeBranchNode(BTreeBranchNodeBase):
         for node in inodes:
             yield False, node
 
-    def iteritems(self):
+    def iteritems(self, treeCtx=None):
         inodes = self.iterNodes()
         for i, node in izip(self.getItems(), inodes):
-            for ni in node.iteritems():
+            for ni in node.iteritems(treeCtx):
                 yield ni
             yield i
         for node in inodes:
-            for ni in node.iteritems():
+            for ni in node.iteritems(treeCtx):
                 yield ni
 
     def insertItem(self, treeCtx, key, item, idx=None):
-        items = self.getItems()
         idx, itemAtKey = self._idxInfoFromIdxOrKey(treeCtx, idx, key)
         if not itemAtKey:
             raise RuntimeError("Insert item should not be called on an interior node that does not hold the key")
 
-        items[idx] = item
+        self._setEntry(idx, item)
 
     def _removeIndex(self, treeCtx, idx):
-        items, nodes = self.getItems(), self.getNodes()
+        nodes = self.getNodes()
         if not nodes:
             # this happens at the root node
-            items.pop(idx)
+            self._popEntry(idx)
 
         else:
             prevNode, nextNode = nodes[idx:idx+2]
 
-            if not prevNode.isUnderfilled(treeCtx):
-                # steal from lower node
-                items[idx] = prevNode._popMaxLeafItem(treeCtx)
-            elif not nextNode.isUnderfilled(treeCtx):
+            if prevNode.isUnderfilled(treeCtx) and not nextNode.isUnderfilled(treeCtx):
                 # steal from greater node
-                items[idx] = nextNode._popMinLeafItem(treeCtx)
+                nextNode = self._claimNodeAt(treeCtx, idx+1)
+                self._setEntry(idx, nextNode._popMinLeafItem(treeCtx))
+                nextNode.balance(treeCtx, self, idx+1)
             else:
-                # both nodes can be combined
-                items[idx] = None
-                self._combineIndex(treeCtx, idx)
+                # steal from lower node
+                prevNode = self._claimNodeAt(treeCtx, idx)
+                self._setEntry(idx, prevNode._popMaxLeafItem(treeCtx))
+                prevNode.balance(treeCtx, self, idx)
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def _getPeerNodesOf(self, node):
+    def _getPeerNodesOf(self, node, nodeIdx=None):
         nodes = self.getNodes()
-        nodeIdx = nodes.index(node)
+        if nodeIdx is None:
+            nodeIdx = nodes.index(node)
+        elif nodeIdx < 0:
+            nodeIdx += len(nodes)
+
         if nodeIdx: 
             prev = nodes[nodeIdx-1]
         else: prev = None
@@ -435,32 +586,45 @@ class BTreeBranchNode(BTreeBranchNodeBase):
         else: next = None
         return nodeIdx, prev, next
 
-    def _insertSplitNode(self, leftNode, midItem, rightNode):
-        items, nodes = self.getItems(), self.getNodes()
-        idx = nodes.index(leftNode)
-        items.insert(idx, midItem)
+    def _insertSplitNode(self, leftNode, midItem, rightNode, idx=None):
+        nodes = self.getNodes()
+        if idx is None:
+            idx = nodes.index(leftNode)
+        self._insertEntry(idx, midItem)
         nodes.insert(idx+1, rightNode)
 
     def _combineIndex(self, treeCtx, idx):
-        items, nodes = self.getItems(), self.getNodes()
-        node = nodes[idx]
-        item = items.pop(idx)
+        nodes = self.getNodes()
+        node = self._claimNodeAt(treeCtx, idx)
+        item = self._popEntry(idx)
         nextNode = nodes.pop(idx+1)
         node.combineWith(item, nextNode)
         return node
 
     def _rotateItemUp(self, treeCtx, idx, node, nextNode):
         # shift max item from prevNode to parent, and from parent to self
+        node = self._claimNodeAt(treeCtx, idx)
+        nextNode = self._claimNodeAt(treeCtx, idx+1)
         maxNode, maxItem = node._popMaxEntry(treeCtx)
         itemAtIdx = self._swapIndex(idx, maxItem)
         nextNode._pushMinEntry(maxNode, itemAtIdx)
 
+        moved = 1 + (maxNode.getCount() if maxNode is not None else 0)
+        node._adjustCount(-moved)
+        nextNode._adjustCount(moved)
+
     def _rotateItemDown(self, treeCtx, idx, node, nextNode):
         # shift min item from nextNode to parent, and from parent to self
+        node = self._claimNodeAt(treeCtx, idx)
+        nextNode = self._claimNodeAt(treeCtx, idx+1)
         minNode, minItem = nextNode._popMinEntry(treeCtx)
         itemAtIdx = self._swapIndex(idx, minItem)
         node._pushMaxEntry(minNode, itemAtIdx)
 
+        moved = 1 + (minNode.getCount() if minNode is not None else 0)
+        nextNode._adjustCount(-moved)
+        node._adjustCount(moved)
+
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 #~ Leaf Node Base
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -476,9 +640,9 @@ class BTreeLeafNodeBase(BTreeNodeBase):
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-    def iterWalk(self):
-        return ((True, e) for e in self.iterItems())
-    def iteritems(self):
+    def iterWalk(self, treeCtx=None):
+        return ((True, e) for e in self.iteritems(treeCtx))
+    def iteritems(self, treeCtx=None):
         return self.iterItems()
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -494,57 +658,103 @@ class BTreeLeafNode(BTreeLeafNodeBase):
     __slots__ = BTreeLeafNodeBase.__slots__
 
     def insertItem(self, treeCtx, key, item, idx=None):
-        items = self.getItems()
         idx, itemAtKey = self._idxInfoFromIdxOrKey(treeCtx, idx, key)
 
         if itemAtKey:
-            items[idx] = item
+            self._setEntry(idx, item)
         else:
-            items.insert(idx, item)
+            self._insertEntry(idx, item)
 
     def _removeIndex(self, treeCtx, idx):
-        items = self.getItems()
-        items.pop(idx)
+        self._popEntry(idx)
 
     def _pushMinEntry(self, node, item):
         assert node is None
-        self.getItems().insert(0, item)
+        self._insertEntry(0, item)
     def _popMinEntry(self, treeCtx):
-        return (None, self.getItems().pop(0))
+        return (None, self._popEntry(0))
 
     def _pushMaxEntry(self, node, item):
         assert node is None
-        self.getItems().append(item)
+        self._appendEntry(item)
     def _popMaxEntry(self, treeCtx):
-        return (None, self.getItems().pop(-1))
+        return (None, self._popEntry(-1))
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 class BTreeDictLeafNode(BTreeLeafNodeBase):
+    """Leaf storing items in a dict for O(1) lookups, with a sorted key list
+    for ordered access.  The key list is None when stale (e.g. after
+    unpickling), and is rebuilt on the next ordered access."""
     __slots__ = BTreeLeafNodeBase.__slots__
 
     def getItems(self):
-        return self.getItemsDict().iteritems()
+        return list(self.iteritems())
     def setItems(self, items=None):
         if items is None:
-            return self.setItemsDict(dict())
+            return self.setItemsDict(dict(), [])
         itemsDict = self.getItemsDict()
         itemsDict.clear()
-        itemsDict.update(items)
+        if isinstance(items, dict):
+            itemsDict.update(items)
+            self._keys = None
+        else:
+            # item sequences are in key order, as with the other node types
+            items = list(items)
+            itemsDict.update(items)
+            self._keys = [k for k,v in items]
     def iterItems(self):
-        return self.getItemsDict().iteritems()
+        return self.iteritems()
+
+    def __setstate__(self, state):
+        self.setItemsDict(state)
+        self._owner = None
+
+    def _copyFrom(self, node):
+        keys = node._keys
+        if keys is not None:
+            keys = list(keys)
+        self.setItemsDict(dict(node._items), keys)
 
     def __len__(self):
         return len(self.getItemsDict())
     def getItemsDict(self):
         return self._items
-    def setItemsDict(self, items=None):
+    def setItemsDict(self, items=None, keys=None):
         self._items = items
+        self._keys = keys
+
+    def getKeys(self, treeCtx=None):
+        keys = self._keys
+        if keys is None:
+            keys = self.getItemsDict().keys()
+            if treeCtx is None or treeCtx.keyCmp is cmp:
+                keys.sort()
+            else: keys.sort(cmp=treeCtx.keyCmp)
+
+            if treeCtx is not None:
+                self._keys = keys
+        return keys
+
+    def iteritems(self, treeCtx=None):
+        itemsDict = self.getItemsDict()
+        return ((k, itemsDict[k]) for k in self.getKeys(treeCtx))
 
     #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+    def getItemAtIdx(self, idx, treeCtx=None):
+        key = self.getKeys(treeCtx)[idx]
+        return key, self.getItemsDict()[key]
+
     def _idxInfoFromKey(self, treeCtx, key, default=(), end=()):
-        raise NotImplementedError("Invalid method for this subclass")
+        # ordered position lookup; point lookups use findHostOfKey instead
+        keys = self.getKeys(treeCtx)
+        idx = bisectKey(keys, key, treeCtx.keyCmp)
+        if idx == len(keys):
+            return idx, end
+        elif key in self.getItemsDict():
+            return idx, self.getItemAtIdx(idx, treeCtx)
+        else: return idx, default
     def _idxInfoFromIdxOrKey(self, treeCtx, idx, key, default=(), end=()):
         raise NotImplementedError("Invalid method for this subclass")
 
@@ -557,16 +767,35 @@ class BTreeDictLeafNode(BTreeLeafNodeBase):
 
     def combineWith(self, item, next):
         itemsDict = self.getItemsDict()
+        keys, nextKeys = self._keys, next._keys
         if item is not None:
             itemsDict[item[0]] = item[1]
-        itemsDict.update(next.getItems())
+            if keys is not None:
+                keys.append(item[0])
+        itemsDict.update(next.getItemsDict())
+
+        if keys is not None and nextKeys is not None:
+            keys.extend(nextKeys)
+        else: self._keys = None
 
     def insertItem(self, treeCtx, key, item, idx=None):
-        self.getItemsDict()[item[0]] = item[1]
+        itemsDict = self.getItemsDict()
+        key = item[0]
+        if key not in itemsDict:
+            keys = self._keys
+            if keys is not None:
+                keys.insert(bisectKey(keys, key, treeCtx.keyCmp), key)
+        itemsDict[key] = item[1]
 
     def popItem(self, treeCtx, key, hintItem, idx=None, *args):
-        value = self.getItemsDict().pop(key, *args)
-        return value
+        itemsDict = self.getItemsDict()
+        if key not in itemsDict:
+            return itemsDict.pop(key, *args)
+
+        keys = self._keys
+        if keys is not None:
+            del keys[bisectKey(keys, key, treeCtx.keyCmp)]
+        return itemsDict.pop(key)
 
     def _removeIndex(self, treeCtx, idx):
         raise NotImplementedError("Invalid method for this subclass")
@@ -575,15 +804,15 @@ class BTreeDictLeafNode(BTreeLeafNodeBase):
 
     def _splitChildren(self, treeCtx):
         itemsDict = self.getItemsDict()
-        splitKeys = itemsDict.keys()
-        splitKeys.sort(cmp=treeCtx.keyCmp)
-        idx = len(splitKeys)//2
-        pivotKey = splitKeys[idx]
-        splitKeys = splitKeys[idx+1:]
+        keys = self.getKeys(treeCtx)
+        idx = len(keys)//2
+        pivotKey = keys[idx]
+        splitKeys = keys[idx+1:]
+        del keys[idx:]
 
         pivotItem = (pivotKey, itemsDict.pop(pivotKey))
-        splitItemsDict = dict((k, itemsDict.pop(k)) for k in splitKeys)
-        return pivotItem, (splitItemsDict, [])
+        splitItems = [(k, itemsDict.pop(k)) for k in splitKeys]
+        return pivotItem, (splitItems, [])
 
     def getItemsSorted(self, splitItems=None, keyCmp=cmp):
         if splitItems is None:
@@ -599,32 +828,355 @@ class BTreeDictLeafNode(BTreeLeafNodeBase):
     def _pushMinEntry(self, node, item):
         assert node is None
         self.getItemsDict()[item[0]] = item[1]
+        if self._keys is not None:
+            self._keys.insert(0, item[0])
     def _popMinEntry(self, treeCtx):
-        itemsDict = self.getItemsDict()
-
-        iItems = itemsDict.iteritems()
-        popKey = iItems.next()[0]
-        keyCmp = treeCtx.keyCmp
-        for k,v in iItems:
-            if keyCmp(popKey, k) > 0:
-                popKey = k
-
-        result = itemsDict.pop(popKey)
+        popKey = self.getKeys(treeCtx).pop(0)
+        result = self.getItemsDict().pop(popKey)
         return (None, (popKey, result))
 
     def _pushMaxEntry(self, node, item):
         assert node is None
         self.getItemsDict()[item[0]] = item[1]
+        if self._keys is not None:
+            self._keys.append(item[0])
     def _popMaxEntry(self, treeCtx):
-        itemsDict = self.getItemsDict()
+        popKey = self.getKeys(treeCtx).pop()
+        result = self.getItemsDict().pop(popKey)
+        return (None, (popKey, result))
 
-        iItems = itemsDict.iteritems()
-        popKey = iItems.next()[0]
-        keyCmp = treeCtx.keyCmp
-        for k,v in iItems:
-            if keyCmp(popKey, k) < 0:
-                popKey = k
 
-        result = itemsDict.pop(popKey)
-        return (None, (popKey, result))
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Typed Array Nodes
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreeArrayNodeMixin(object):
+    """Stores keys, and optionally values, in array.array storage instead
+    of (key, value) tuples.  keyTypecode and valueTypecode are array
+    typecodes; a valueTypecode of None keeps values in a plain list.
+    
+    Pickled state holds the raw array bytes, in native machine layout."""
+    __slots__ = ()
+
+    keyTypecode = 'l'
+    valueTypecode = None
+
+    def _newKeys(self, keys=()):
+        return array(self.keyTypecode, keys)
+    def _newValues(self, values=()):
+        if self.valueTypecode is None:
+            return list(values)
+        return array(self.valueTypecode, values)
+
+    def _getEntriesState(self):
+        values = self._values
+        if self.valueTypecode is not None:
+            values = values.tostring()
+        return self._keys.tostring(), values
+    def _setEntriesState(self, (keys, values)):
+        keysArray = self._newKeys()
+        keysArray.fromstring(keys)
+        if self.valueTypecode is not None:
+            valuesArray = self._newValues()
+            valuesArray.fromstring(values)
+            values = valuesArray
+        self._setEntries(keysArray, values)
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def __len__(self):
+        return len(self._keys)
+
+    def getItems(self):
+        return zip(self._keys, self._values)
+    def getValues(self):
+        return self._values
+    def setItems(self, items=None):
+        if items is None:
+            items = ()
+        self._setEntries(
+            self._newKeys(k for k,v in items), 
+            self._newValues(v for k,v in items))
+    def _setEntries(self, keys, values):
+        self._items = None
+        self._keys = keys
+        self._values = values
+    def iterItems(self):
+        return izip(self._keys, self._values)
+
+    def getItemAtIdx(self, idx, treeCtx=None):
+        return self._keys[idx], self._values[idx]
+
+    def _copyFrom(self, node):
+        self._setEntries(node._keys[:], node._values[:])
+
+    # Values are stored before keys, and taken back out if the key is
+    # refused, so an item of the wrong type leaves the node unchanged
+    def _insertEntry(self, idx, item):
+        self._values.insert(idx, item[1])
+        try:
+            self._keys.insert(idx, item[0])
+        except Exception:
+            del self._values[idx]
+            raise
+    def _appendEntry(self, item):
+        self._values.append(item[1])
+        try:
+            self._keys.append(item[0])
+        except Exception:
+            del self._values[-1]
+            raise
+    def _extendEntries(self, items):
+        items = list(items)
+        keys = self._newKeys(k for k,v in items)
+        values = self._newValues(v for k,v in items)
+        self._keys.extend(keys)
+        self._values.extend(values)
+    def _popEntry(self, idx=-1):
+        return self._keys.pop(idx), self._values.pop(idx)
+    def _setEntry(self, idx, item):
+        key, value = item
+        prevValue = self._values[idx]
+        self._values[idx] = value
+        try:
+            self._keys[idx] = key
+        except Exception:
+            self._values[idx] = prevValue
+            raise
+    def _truncateEntries(self, idx):
+        del self._keys[idx:]
+        del self._values[idx:]
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def combineWith(self, item, next):
+        self._adjustCount(int(item is not None) + next.getCount())
+        if item is not None:
+            self._appendEntry(item)
+        self._keys.extend(next._keys)
+        self._values.extend(next._values)
+
+        nodes = next.getNodes()
+        if nodes:
+            self.getNodes().extend(nodes)
+
+    def _splitChildren(self, treeCtx):
+        keys, values, nodes = self._keys, self._values, self.getNodes()
+        idx = len(keys)//2
+        pivotItem = (keys[idx], values[idx])
+        splitItems = ((keys[idx+1:], values[idx+1:]), nodes[idx+1:])
+
+        self._truncateEntries(idx)
+        if nodes:
+            del nodes[idx+1:]
+        return pivotItem, splitItems
+
+    def _newFromSplitItems(self, treeCtx, ((keys, values), nodes)):
+        node = type(self)()
+        node._setEntries(keys, values)
+        if nodes:
+            node.setNodes(nodes)
+        node._owner = treeCtx._editToken
+        return node
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreeArrayLeafNode(BTreeArrayNodeMixin, BTreeLeafNode):
+    __slots__ = BTreeLeafNode.__slots__ + ['_values']
+
+    def __getstate__(self):
+        return self._getEntriesState()
+    def __setstate__(self, state):
+        self._setEntriesState(state)
+        self._owner = None
+
+class BTreeArrayBranchNode(BTreeArrayNodeMixin, BTreeBranchNode):
+    __slots__ = BTreeBranchNode.__slots__ + ['_values']
+
+    def __getstate__(self):
+        return self._getEntriesState(), self._nodes
+    def __setstate__(self, (entries, nodes)):
+        self._setEntriesState(entries)
+        self.setNodes(nodes)
+        self._resetCount()
+        self._owner = None
+
+    def _copyFrom(self, node):
+        BTreeArrayNodeMixin._copyFrom(self, node)
+        self._nodes = node._nodes[:]
+        self._count = node._count
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Prefix Compressed Leaves
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+class BTreePrefixLeafNode(BTreeLeafNode):
+    """Leaf for string keys, storing the prefix shared by all of its keys
+    once, with the remaining suffixes and the values in parallel lists.
+    str prefixes are interned, so that leaves split from one another, and
+    copies made for snapshots, share their prefix.  Suffixes are not; for
+    unique keys the interned table would cost more than it saves.
+
+    Searches check the prefix, then bisect the suffixes, so they compare
+    only the part of the key after the prefix.  Keys are rebuilt from the
+    prefix when items are read out of the node.  The prefix may be shorter
+    than the longest shared one after deletes; splits tighten it again."""
+    __slots__ = BTreeLeafNode.__slots__ + ['_prefix', '_values']
+
+    def __getstate__(self):
+        return self._prefix, self._keys, self._values
+    def __setstate__(self, (prefix, suffixes, values)):
+        self._setEntries(prefix, suffixes, values)
+        self._owner = None
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def __len__(self):
+        return len(self._values)
+
+    def getItems(self):
+        return list(self.iterItems())
+    def setItems(self, items=None):
+        if not items:
+            return self._setEntries('', [], [])
+
+        keys = [k for k,v in items]
+        # keys are sorted, so the first and last share the common prefix
+        prefix = commonprefix([keys[0], keys[-1]])
+        self._setEntries(prefix, self._suffixesOf(prefix, keys), [v for k,v in items])
+    def _setEntries(self, prefix, suffixes, values):
+        self._items = None
+        self._prefix = self._intern(prefix)
+        self._keys = suffixes
+        self._values = values
+    def iterItems(self):
+        prefix = self._prefix
+        return ((prefix + s, v) for s, v in izip(self._keys, self._values))
+
+    def getKeys(self):
+        prefix = self._prefix
+        return [prefix + s for s in self._keys]
+    def getPrefix(self):
+        return self._prefix
+
+    def getItemAtIdx(self, idx, treeCtx=None):
+        return self._prefix + self._keys[idx], self._values[idx]
+
+    def _copyFrom(self, node):
+        self._setEntries(node._prefix, node._keys[:], node._values[:])
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    @staticmethod
+    def _intern(text):
+        if type(text) is str:
+            return intern(text)
+        return text
+
+    def _suffixesOf(self, prefix, keys):
+        n = len(prefix)
+        return [k[n:] for k in keys]
+
+    def _suffixFor(self, key):
+        prefix = self._prefix
+        if not self._values:
+            # an empty node takes the whole key as its prefix
+            self._prefix = self._intern(key)
+            return ''
+        elif not key.startswith(prefix):
+            self._setPrefix(commonprefix([prefix, key]))
+            prefix = self._prefix
+        return key[len(prefix):]
+
+    def _setPrefix(self, prefix):
+        oldPrefix = self._prefix
+        if len(prefix) < len(oldPrefix):
+            extra = oldPrefix[len(prefix):]
+            self._keys = [extra + s for s in self._keys]
+        elif len(prefix) > len(oldPrefix):
+            self._keys = self._suffixesOf(prefix[len(oldPrefix):], self._keys)
+        self._prefix = self._intern(prefix)
+
+    def _tightenPrefix(self):
+        suffixes = self._keys
+        if suffixes:
+            extra = commonprefix([suffixes[0], suffixes[-1]])
+            if extra:
+                self._setPrefix(self._prefix + extra)
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def _insertEntry(self, idx, item):
+        suffix = self._suffixFor(item[0])
+        self._keys.insert(idx, suffix)
+        self._values.insert(idx, item[1])
+    def _appendEntry(self, item):
+        suffix = self._suffixFor(item[0])
+        self._keys.append(suffix)
+        self._values.append(item[1])
+    def _extendEntries(self, items):
+        for item in items:
+            self._appendEntry(item)
+    def _popEntry(self, idx=-1):
+        return self._prefix + self._keys.pop(idx), self._values.pop(idx)
+    def _setEntry(self, idx, item):
+        # the slot keeps its key; only a key equal to it is stored here
+        self._values[idx] = item[1]
+    def _truncateEntries(self, idx):
+        del self._keys[idx:]
+        del self._values[idx:]
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def _idxInfoFromKey(self, treeCtx, key, default=(), end=()):
+        if treeCtx.keyCmp is not cmp:
+            return BTreeLeafNode._idxInfoFromKey(self, treeCtx, key, default, end)
+
+        suffixes = self._keys
+        prefix = self._prefix
+        if key.startswith(prefix):
+            suffix = key[len(prefix):]
+            idx = bisect_left(suffixes, suffix)
+            if idx == len(suffixes):
+                return idx, end
+            elif suffix != suffixes[idx]:
+                return idx, default
+            return idx, (key, self._values[idx])
+
+        # a key off the prefix sorts before or after every key here
+        elif suffixes and key < prefix:
+            return 0, default
+        return len(suffixes), end
+
+    def _idxInfoFromIdxOrKey(self, treeCtx, idx, key, default=(), end=()):
+        if idx is None:
+            return self._idxInfoFromKey(treeCtx, key, default, end)
+        elif idx < len(self):
+            itemAtKey = self.getItemAtIdx(idx)
+            if 0 == treeCtx.keyCmp(itemAtKey[0], key):
+                return idx, itemAtKey
+        return idx, None
+
+    def combineWith(self, item, next):
+        items = self.getItems()
+        if item is not None:
+            items.append(item)
+        items.extend(next.iterItems())
+        self.setItems(items)
+
+    def _splitChildren(self, treeCtx):
+        suffixes, values = self._keys, self._values
+        idx = len(suffixes)//2
+        pivotItem = self.getItemAtIdx(idx)
+        splitEntries = (self._prefix, suffixes[idx+1:], values[idx+1:])
+
+        self._truncateEntries(idx)
+        self._tightenPrefix()
+        return pivotItem, (splitEntries, [])
+
+    def _newFromSplitItems(self, treeCtx, (entries, nodes)):
+        node = type(self)()
+        node._setEntries(*entries)
+        node._tightenPrefix()
+        node._owner = treeCtx._editToken
+        return node
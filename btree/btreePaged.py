@@ -0,0 +1,552 @@
+##~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~##
+##~ Copyright (C) 2002-2009  TechGame Networks, LLC.              ##
+##~                                                               ##
+##~ This library is free software; you can redistribute it        ##
+##~ and/or modify it under the terms of the BSD style License as  ##
+##~ found in the LICENSE file included with this distribution.    ##
+##~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~##
+
+"""Disk resident BTrees.
+
+Nodes are stored as pages in an append-only file, read back through mmap
+and addressed by page id (the page's file offset).  Branch nodes hold
+their children in a BTreePageRefList, where each entry is either a live
+node or the page id of a stored one; page ids are decoded on access
+through a bounded LRU of nodes, so only the recently used part of the
+tree stays in memory.
+
+Stored pages are never modified.  A paged tree always has an edit token,
+so the copy on write machinery copies a decoded node before changing it.
+Those dirty copies are appended by flush(), which the tree calls once
+its changes could have dirtied about cacheSize nodes, and by commit(),
+which then appends a meta record and points the file header at it.
+Flushed pages are unreachable from the header until that commit, so a
+tree that is closed without commit reopens at the last committed state.
+
+Bulk loads write each node as it is built, and large batches are applied
+in chunks with a flush between them, so memory stays near cacheSize nodes
+plus the batch itself and the pivots of a bulk load.
+
+Since pages are only ever appended, the file grows with every change,
+keeping the pages of earlier commits and flushes that later ones replaced.
+vacuum() commits the tree to a new file holding only its live pages, and
+renames it over the old one; call it once the file has outgrown the tree."""
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import os
+import mmap
+import atexit
+import struct
+import weakref
+import tempfile
+from collections import OrderedDict
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import btree
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+def isPageId(entry):
+    return isinstance(entry, (int, long))
+
+def iterEntries(nodes):
+    """Iterates the raw entries of a child list without decoding pages"""
+    if isinstance(nodes, list):
+        return list.__iter__(nodes)
+    return iter(nodes)
+
+class BTreePageRefList(list):
+    """Child node list whose entries are live nodes or page ids.  Indexing
+    and iteration decode page ids through the store; slices, copies and
+    extend keep them as page ids."""
+    __slots__ = ['store']
+
+    def __init__(self, store, entries=()):
+        list.__init__(self, iterEntries(entries))
+        self.store = store
+
+    def __reduce__(self):
+        return (list, (list(iter(self)),))
+
+    def _resolve(self, entry):
+        if isPageId(entry):
+            return self.store.loadNode(entry)
+        return entry
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return self.__class__(self.store, list.__getitem__(self, idx))
+        return self._resolve(list.__getitem__(self, idx))
+    def __getslice__(self, i, j):
+        return self.__class__(self.store, list.__getslice__(self, i, j))
+
+    def __iter__(self):
+        resolve = self._resolve
+        for entry in list.__iter__(self):
+            yield resolve(entry)
+    def __reversed__(self):
+        resolve = self._resolve
+        for entry in list.__reversed__(self):
+            yield resolve(entry)
+
+    def pop(self, idx=-1):
+        return self._resolve(list.pop(self, idx))
+    def extend(self, nodes):
+        list.extend(self, list(iterEntries(nodes)))
+
+    def index(self, node):
+        for idx, entry in enumerate(list.__iter__(self)):
+            if entry is node:
+                return idx
+
+        pageId = self.store.pageIdOf(node)
+        if pageId is None:
+            raise ValueError("Node is not in list")
+        return list.index(self, pageId)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Page store
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreePageFile(object):
+    """The open file and mmap of a page store.  They are kept apart from
+    the store, so that a temporary store dropped without close() can still
+    be unmapped and removed by its finalizer."""
+
+    def __init__(self, filename, temporary=False):
+        self.filename = filename
+        self.temporary = temporary
+        if os.path.exists(filename):
+            self.file = open(filename, 'r+b')
+        else: self.file = open(filename, 'w+b')
+        self.map = None
+
+    def remap(self):
+        if self.map is not None:
+            self.map.close()
+        self.file.flush()
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self.file is None:
+            return
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+        self.file = self.map = None
+        if self.temporary and os.path.exists(self.filename):
+            os.remove(self.filename)
+
+# page files of live temporary stores, by a weakref to their store
+_temporaryPageFiles = {}
+
+def _closeTemporaryPageFile(storeRef):
+    pageFile = _temporaryPageFiles.pop(storeRef, None)
+    if pageFile is not None:
+        pageFile.close()
+
+@atexit.register
+def _closeTemporaryPageFiles():
+    for storeRef in _temporaryPageFiles.keys():
+        _closeTemporaryPageFile(storeRef)
+
+class BTreePageStore(object):
+    """Append-only file of pickled node pages, read through mmap.
+
+    The file starts with a header holding the page id of the last
+    committed meta record.  Every other record is a 4 byte length followed
+    by a pickle, and is addressed by its file offset."""
+
+    magic = 'TGBTREE1'
+    headerFormat = '<8sQ'
+    recordFormat = '<I'
+    minCacheSize = 16
+
+    leafFactory = None
+    branchFactory = None
+
+    def __init__(self, filename=None, cacheSize=1024):
+        temporary = filename is None
+        if temporary:
+            fd, filename = tempfile.mkstemp('.btree')
+            os.close(fd)
+            os.remove(filename)
+        self.filename = filename
+
+        self._pageFile = BTreePageFile(filename, temporary)
+        if temporary:
+            # removed by close(), or once the store is dropped
+            self._storeRef = weakref.ref(self, _closeTemporaryPageFile)
+            _temporaryPageFiles[self._storeRef] = self._pageFile
+        else: self._storeRef = None
+
+        self.file.seek(0, 2)
+        if not self.file.tell():
+            self._writeHeader(0)
+        self._remap()
+
+        magic, metaId = struct.unpack_from(self.headerFormat, self._map, 0)
+        if magic != self.magic:
+            self.close()
+            raise ValueError("Not a BTree page file: %r" % (filename,))
+        self._metaId = metaId
+
+        self.cacheSize = max(self.minCacheSize, cacheSize)
+        self._cache = OrderedDict()
+        self._pageIds = {}
+
+    @property
+    def file(self):
+        return self._pageFile.file
+    @property
+    def _map(self):
+        return self._pageFile.map
+
+    def close(self):
+        if self.file is None:
+            return
+        if self._storeRef is not None:
+            _temporaryPageFiles.pop(self._storeRef, None)
+        self._pageFile.close()
+        self._cache.clear()
+        self._pageIds.clear()
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def getMeta(self):
+        if not self._metaId:
+            return None
+        return self._readRecord(self._metaId)
+
+    def commit(self, meta):
+        """Appends meta, then points the header at it once every page
+        written before it is on disk"""
+        metaId = self._appendRecord(meta)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self._writeHeader(metaId)
+        os.fsync(self.file.fileno())
+        self._metaId = metaId
+        self._remap()
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Node pages
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def loadNode(self, pageId):
+        cache = self._cache
+        node = cache.pop(pageId, None)
+        if node is None:
+            node = self._decodeNode(self._readRecord(pageId))
+            self._cacheNode(pageId, node)
+        else: cache[pageId] = node
+        return node
+
+    def writeNode(self, node, childIds=None):
+        """Appends node as a new page.  Branches are written with childIds,
+        the page ids of their already written children"""
+        if childIds is None:
+            record = (node.__getstate__(), None, None)
+        else: record = (node.__getstate__()[0], childIds, node.getCount())
+
+        pageId = self._appendRecord(record)
+        self._cacheNode(pageId, node)
+        return pageId
+
+    def pageIdOf(self, node):
+        """Page id node was loaded from or written to, while it is cached"""
+        return self._pageIds.get(id(node))
+
+    def _cacheNode(self, pageId, node):
+        cache = self._cache
+        while len(cache) >= self.cacheSize:
+            oldId, oldNode = cache.popitem(False)
+            if self._pageIds.get(id(oldNode)) == oldId:
+                del self._pageIds[id(oldNode)]
+        cache[pageId] = node
+        self._pageIds[id(node)] = pageId
+
+    def _decodeNode(self, (entries, childIds, count)):
+        if childIds is None:
+            klass = self.leafFactory
+            node = klass.__new__(klass)
+            node.__setstate__(entries)
+        else:
+            klass = self.branchFactory
+            node = klass.__new__(klass)
+            node.__setstate__((entries, BTreePageRefList(self, childIds)))
+            node._count = count
+        return node
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Records
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def _readRecord(self, pageId):
+        recordSize = struct.calcsize(self.recordFormat)
+        if pageId + recordSize > len(self._map):
+            self._remap()
+        size, = struct.unpack_from(self.recordFormat, self._map, pageId)
+        start = pageId + recordSize
+        return pickle.loads(self._map[start:start+size])
+
+    def _appendRecord(self, obj):
+        data = pickle.dumps(obj, 2)
+        self.file.seek(0, 2)
+        pageId = self.file.tell()
+        self.file.write(struct.pack(self.recordFormat, len(data)))
+        self.file.write(data)
+        return pageId
+
+    def _writeHeader(self, metaId):
+        self.file.seek(0)
+        self.file.write(struct.pack(self.headerFormat, self.magic, metaId))
+        self.file.flush()
+
+    def _remap(self):
+        self._pageFile.remap()
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Vacuum
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def copyPages(self, other, pageId):
+        """Appends the pages reachable from pageId to other, children
+        first, and returns the page id of pageId's copy"""
+        entries, childIds, count = self._readRecord(pageId)
+        if childIds is not None:
+            childIds = [self.copyPages(other, childId) for childId in childIds]
+        return other._appendRecord((entries, childIds, count))
+
+    def replaceWith(self, other):
+        """Renames other's committed file over this one, and reads from it
+        from here on.  Page ids of this file are no longer valid"""
+        other.close()
+        pageFile = self._pageFile
+        temporary = pageFile.temporary
+        # the name now belongs to other's file, which must outlive this one
+        pageFile.temporary = False
+        pageFile.close()
+        os.rename(other.filename, self.filename)
+
+        self._pageFile = BTreePageFile(self.filename, temporary)
+        if self._storeRef is not None:
+            _temporaryPageFiles[self._storeRef] = self._pageFile
+        self._cache.clear()
+        self._pageIds.clear()
+        self._remap()
+        self._metaId = other._metaId
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Paged trees
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreePagedMixin(object):
+    StoreFactory = BTreePageStore
+
+    def __init__(self, dict=None, **kw):
+        # an unnamed tree pages to a temporary file
+        self._initStore(self.StoreFactory())
+        super(BTreePagedMixin, self).__init__(dict, **kw)
+
+    @classmethod
+    def open(klass, filename, cacheSize=1024):
+        """Opens the tree last committed to filename, creating the file if
+        needed.  About cacheSize decoded nodes are kept in memory, plus
+        up to about as many modified nodes before they are flushed."""
+        self = klass.__new__(klass)
+        store = klass.StoreFactory(filename, cacheSize)
+        self._initStore(store)
+
+        meta = store.getMeta()
+        if meta is None:
+            super(BTreePagedMixin, self).__init__()
+        else:
+            if self.getDegree() != meta['degree']:
+                self.setDegree(meta['degree'])
+            self._setRootNode(store.loadNode(meta['root']))
+        return self
+
+    def _initStore(self, store):
+        store.leafFactory = self.LeafFactory
+        store.branchFactory = self.BranchFactory
+        self._store = store
+        self._editToken = object()
+
+    def getStore(self):
+        return self._store
+
+    def close(self):
+        """Closes the page file.  Changes since the last commit are lost"""
+        self._store.close()
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def commit(self):
+        """Writes the nodes modified since the last commit to the store,
+        and records the result as the tree stored in the file"""
+        rootId = self.flush()
+        self._store.commit({'root': rootId, 'degree': self.getDegree()})
+
+    def flush(self):
+        """Writes the nodes modified since the last flush to the store, so
+        they can leave memory.  The file still holds the last committed
+        tree until commit().  Returns the root's page id"""
+        rootId = self._writeNode(self._store, self._getRootNode())
+        self._retireWritten()
+        return rootId
+
+    def vacuum(self):
+        """Commits the tree to a new page file holding only the pages it
+        uses, which then replaces the file.  Snapshots and pieces of this
+        tree still reading the old pages must not be used afterwards"""
+        store = self._store
+        rootId = self.flush()
+
+        filename = store.filename + '.vacuum'
+        if os.path.exists(filename):
+            os.remove(filename)
+        newStore = self.StoreFactory(filename, store.cacheSize)
+        rootId = store.copyPages(newStore, rootId)
+        newStore.commit({'root': rootId, 'degree': self.getDegree()})
+        store.replaceWith(newStore)
+
+        self._setRootNode(store.loadNode(rootId))
+        self._retireWritten()
+
+    def _retireWritten(self):
+        # written nodes are now shared with the store, and are copied
+        # before the next change like any other stored node
+        self._editToken = object()
+        self._dirtyOps = 0
+        self._flushOps = None
+
+    def _writeNode(self, store, node):
+        if node._owner is not self._editToken:
+            pageId = store.pageIdOf(node)
+            if pageId is not None:
+                return pageId
+
+        if node.isLeaf():
+            return store.writeNode(node)
+
+        childIds = []
+        for entry in iterEntries(node.getNodes()):
+            if not isPageId(entry):
+                entry = self._writeNode(store, entry)
+            childIds.append(entry)
+
+        # children are only referenced by page id from here on, so they
+        # can leave memory with the node cache
+        node.setNodes(BTreePageRefList(store, childIds))
+        return store.writeNode(node, childIds)
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Write back
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    # Each change dirties at most about one node per level, so the tree
+    # flushes after cacheSize/(height+1) changes.  Changes made by another
+    # change, as when a batch falls back to single deletes, or by the
+    # pieces of a split or join, are covered by the outer change.
+    _dirtyOps = 0
+    _flushOps = None
+    _pagedDepth = 0
+
+    def _getFlushOps(self):
+        flushOps = self._flushOps
+        if flushOps is None:
+            height = self._heightOf(self._getRootNode())
+            flushOps = max(1, self._store.cacheSize // (height+1))
+            self._flushOps = flushOps
+        return flushOps
+
+    def _callPaged(self, name, ops, *args):
+        method = getattr(super(BTreePagedMixin, self), name)
+        if self._pagedDepth:
+            return method(*args)
+
+        self._pagedDepth += 1
+        try:
+            result = method(*args)
+        finally:
+            self._pagedDepth -= 1
+
+        self._dirtyOps += ops
+        if self._dirtyOps >= self._getFlushOps():
+            self.flush()
+        return result
+
+    def _insert(self, key, value):
+        return self._callPaged('_insert', 1, key, value)
+
+    def _pop(self, key, *args):
+        return self._callPaged('_pop', 1, key, *args)
+
+    def _deleteRange(self, lo, hi):
+        # dirties the paths along both ends of the range
+        return self._callPaged('_deleteRange', 2, lo, hi)
+
+    def _insertMany(self, items):
+        items = self._sortedUniqueItems(items)
+        if not self._getRootNode().getCount():
+            return self._loadSortedItems(items)
+
+        step = self._getFlushOps()
+        for idx in xrange(0, len(items), step):
+            chunk = items[idx:idx+step]
+            self._callPaged('_insertMany', len(chunk), chunk)
+
+    def _removeMany(self, treeCtx, keys):
+        step = self._getFlushOps()
+        for idx in xrange(0, len(keys), step):
+            chunk = keys[idx:idx+step]
+            self._callPaged('_removeMany', len(chunk), treeCtx, chunk)
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Bulk loading
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def compact(self, fill=0.9):
+        treeCtx = self._treeCtx()
+        rootNode = self._getRootNode()
+        self._loadSortedItems(rootNode.iteritems(treeCtx), fill,
+                rootNode.getCount())
+        self._deferredCount = 0
+
+    # each node is written to the store as it is made, so only the page
+    # ids, item counts and pivots of the level being built are held
+    def _newLoadedNode(self, items, children=None):
+        store = self._store
+        if children is None:
+            node = self.LeafFactory.fromSplit((items, []))
+            return store.writeNode(node), len(items)
+
+        childIds = [pageId for pageId, count in children]
+        node = self.BranchFactory.fromSplit((items,
+                BTreePageRefList(store, childIds)))
+        node._count = len(items) + sum(count for pageId, count in children)
+        return store.writeNode(node, childIds), node._count
+
+    def _setLoadedRoot(self, (pageId, count)):
+        self._setRootNode(self._store.loadNode(pageId))
+        self._retireWritten()
+
+class BTreePaged(BTreePagedMixin, btree.BTreeFoundation):
+    minDegree = 64
+    maxDegree = 256
+    LeafFactory = btree.DictLeafNode
+    BranchFactory = btree.BranchNode
+
+class BTreePagedIntItems(BTreePagedMixin, btree.BTreeArrayFoundation):
+    LeafFactory = btree.IntItemLeafNode
+    BranchFactory = btree.IntItemBranchNode
@@ -0,0 +1,115 @@
+##~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~##
+##~ Copyright (C) 2002-2009  TechGame Networks, LLC.              ##
+##~                                                               ##
+##~ This library is free software; you can redistribute it        ##
+##~ and/or modify it under the terms of the BSD style License as  ##
+##~ found in the LICENSE file included with this distribution.    ##
+##~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~##
+
+"""Profiling hooks for BTrees.
+
+A BTreeProfiler attaches to one live tree, timing the split and balance
+passes that follow each insert and delete, and counting keyCmp calls.
+The hooks are instance attributes of that tree, so other trees of the same
+class run unhooked, and detach() restores the tree as it was.  Copies,
+snapshots and the pieces of splits and merges are made without the hooks,
+as they are bound to the profiled tree.
+
+While attached, keyCmp is never the builtin cmp, so the bisect and sort
+fast paths for cmp are bypassed: the counts are real comparisons, but the
+tree runs slower.  Detach before pickling or streaming the tree."""
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import time
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreeProfiler(object):
+    timedMethods = ('_splitFullPathNodes', '_balancePathNodes')
+    timer = staticmethod(time.time)
+
+    def __init__(self, tree, countKeyCmp=True):
+        self.tree = tree
+        self.countKeyCmp = countKeyCmp
+        self._saved = None
+        self.reset()
+
+    def __enter__(self):
+        self.attach()
+        return self
+    def __exit__(self, excType, exc, tb):
+        self.detach()
+
+    def reset(self):
+        self.keyCmpCalls = 0
+        # [calls, total seconds, max seconds] for each timed method
+        self.timings = dict((name, [0, 0.0, 0.0]) for name in self.timedMethods)
+
+    def report(self):
+        result = {'keyCmpCalls': self.keyCmpCalls}
+        for name, (calls, total, peak) in self.timings.iteritems():
+            result[name] = {'calls': calls, 'seconds': total, 'maxSeconds': peak}
+        return result
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def isAttached(self):
+        return self._saved is not None
+
+    def attach(self):
+        if self._saved is not None:
+            return
+        tree = self.tree
+        state = vars(tree)
+        self._saved = dict((name, state[name])
+                for name in self.timedMethods + ('keyCmp',) if name in state)
+
+        for name in self.timedMethods:
+            setattr(tree, name, self._timedHook(name, getattr(tree, name)))
+        if self.countKeyCmp:
+            tree.keyCmp = self._countingKeyCmp(tree.keyCmp)
+        tree._profiler = self
+
+    def detach(self):
+        if self._saved is None:
+            return
+        state = vars(self.tree)
+        state.pop('_profiler', None)
+        self.unhookState(state)
+        self._saved = None
+
+    def unhookState(self, state):
+        """Replaces the hooks in state, a copy of the tree's __dict__, with
+        what they replaced"""
+        for name in self.timedMethods + ('keyCmp',):
+            state.pop(name, None)
+        state.update(self._saved)
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def _timedHook(self, name, method):
+        timer = self.timer
+        def timedHook(*args):
+            start = timer()
+            try:
+                return method(*args)
+            finally:
+                elapsed = timer() - start
+                timing = self.timings[name]
+                timing[0] += 1
+                timing[1] += elapsed
+                if elapsed > timing[2]:
+                    timing[2] = elapsed
+        return timedHook
+
+    def _countingKeyCmp(self, keyCmp):
+        def countingKeyCmp(a, b):
+            self.keyCmpCalls += 1
+            return keyCmp(a, b)
+        return countingKeyCmp
+
@@ -0,0 +1,113 @@
+##~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~##
+##~ Copyright (C) 2002-2009  TechGame Networks, LLC.              ##
+##~                                                               ##
+##~ This library is free software; you can redistribute it        ##
+##~ and/or modify it under the terms of the BSD style License as  ##
+##~ found in the LICENSE file included with this distribution.    ##
+##~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~##
+
+"""Flat stream format for BTrees.
+
+A stream is a small pickled header followed by the tree's items in sorted
+order, pickled in fixed size chunks of key and value columns.  Unlike
+pickling the tree itself, no node structure is written; load rebuilds the
+tree bottom-up while reading, so neither side holds more than a chunk of
+items beyond the tree itself.
+Several trees may be written to the same file one after another."""
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+from itertools import islice, izip
+from cStringIO import StringIO
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+streamVersion = 1
+chunkSize = 4096
+
+# unbound builtin methods such as str.lower do not pickle, so they are
+# recorded by class and name instead
+_methodDescriptorType = type(str.lower)
+
+def _dumpFunc(fn):
+    if isinstance(fn, _methodDescriptorType):
+        return (fn.__objclass__, fn.__name__)
+    return fn
+
+def _loadFunc(fn):
+    if isinstance(fn, tuple):
+        klass, name = fn
+        return getattr(klass, name)
+    return fn
+
+def dump(tree, fileobj, protocol=2):
+    header = {
+        'version': streamVersion,
+        'factory': type(tree),
+        'degree': tree.getDegree(),
+        'count': len(tree),
+        }
+    if 'keyCmp' in vars(tree):
+        header['keyCmp'] = _dumpFunc(tree.keyCmp)
+    if 'keyFunc' in vars(tree):
+        header['keyFunc'] = _dumpFunc(tree.keyFunc)
+
+    pickler = pickle.Pickler(fileobj, protocol)
+    pickler.dump(header)
+
+    # stored items, which differ from the public items for keyFunc trees
+    itemIter = tree._getRootNode().iteritems(tree._treeCtx())
+    while 1:
+        chunk = list(islice(itemIter, chunkSize))
+        if not chunk:
+            break
+        # columns avoid an item tuple per entry in the stream
+        pickler.dump(zip(*chunk))
+        # entries are never shared between chunks; don't let the memo grow
+        pickler.clear_memo()
+
+def dumps(tree, protocol=2):
+    fileobj = StringIO()
+    dump(tree, fileobj, protocol)
+    return fileobj.getvalue()
+
+def load(fileobj, BTreeFactory=None, fill=0.9):
+    """Reads one tree from fileobj, leaving the file positioned after it.
+    BTreeFactory overrides the tree class recorded in the stream"""
+    unpickler = pickle.Unpickler(fileobj)
+    header = unpickler.load()
+    if header.get('version') != streamVersion:
+        raise ValueError("Unsupported BTree stream version: %r" % (header.get('version'),))
+
+    if BTreeFactory is None:
+        BTreeFactory = header['factory']
+    tree = BTreeFactory()
+    if tree.getDegree() != header['degree']:
+        tree.setDegree(header['degree'])
+    if 'keyCmp' in header:
+        tree.setKeyCmp(_loadFunc(header['keyCmp']))
+    if 'keyFunc' in header:
+        tree.setKeyFunc(_loadFunc(header['keyFunc']))
+
+    count = header['count']
+    tree._loadSortedItems(_iterChunkItems(unpickler, count), fill, count)
+    return tree
+
+def loads(data, BTreeFactory=None, fill=0.9):
+    return load(StringIO(data), BTreeFactory, fill)
+
+def _iterChunkItems(unpickler, count):
+    while count > 0:
+        keys, values = unpickler.load()
+        count -= len(keys)
+        for item in izip(keys, values):
+            yield item
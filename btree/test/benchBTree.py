@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+##~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~##
+##~ Copyright (C) 2002-2009  TechGame Networks, LLC.              ##
+##~                                                               ##
+##~ This library is free software; you can redistribute it        ##
+##~ and/or modify it under the terms of the BSD style License as  ##
+##~ found in the LICENSE file included with this distribution.    ##
+##~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~##
+
+"""BTree benchmarks.
+
+Runs tree classes through a set of workloads, and writes one JSON record
+per class with ops/sec for each workload, node counts, height and peak
+RSS, so that runs can be saved and compared:
+
+    python benchBTree.py [-n COUNT] [-w WORKLOAD,...] [-o FILE] [TREE ...]
+
+Trees are named by class, from btreeN, btree, or this module.  Each class
+runs in a child process unless --inline is given, so that peakRSS (in KB,
+as reported by getrusage) covers that class alone."""
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import gc
+import sys
+import time
+import json
+import random
+import cPickle
+import subprocess
+from optparse import OptionParser
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from TG.collections.btree import btree
+from TG.collections.btree import btreeN
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+def pyKeyCmp(a, b):
+    return cmp(a, b)
+def pyKeyFunc(key):
+    return key
+
+class KeyCmpBTree64x256(btreeN.BTree64x256):
+    """Natural order through a Python level keyCmp"""
+    keyCmp = staticmethod(pyKeyCmp)
+
+class KeyFuncBTree64x256(btree.BTreeKeyFuncMixin, btreeN.BTree64x256):
+    """Natural order through a Python level keyFunc"""
+    keyFunc = staticmethod(pyKeyFunc)
+
+defaultTrees = [
+    'BTree2', 'BTree4', 'BTree8', 'BTree16', 'BTree32',
+    'BTree64', 'BTree128', 'BTree256', 'BTree512',
+    'BTreeClassic', 'BTree', 'BTree64x256',
+    'KeyCmpBTree64x256', 'KeyFuncBTree64x256',
+    ]
+
+def getTreeFactory(name):
+    for ns in (btreeN, btree):
+        factory = getattr(ns, name, None)
+        if factory is not None:
+            return factory
+    factory = globals().get(name)
+    if factory is None:
+        raise LookupError("Unknown tree class: %r" % (name,))
+    return factory
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Workloads
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+# Each workload takes (factory, keys, bt), where keys is a shuffled range
+# and bt a tree already holding keys, and returns the number of
+# operations it timed along with the elapsed seconds.
+
+def benchSeqInsert(factory, keys, bt):
+    count = len(keys)
+    start = time.time()
+    bt = factory()
+    for k in xrange(count):
+        bt[k] = k
+    return count, time.time() - start
+
+def benchRandInsert(factory, keys, bt):
+    start = time.time()
+    bt = factory()
+    for k in keys:
+        bt[k] = k
+    return len(keys), time.time() - start
+
+def benchGet(factory, keys, bt):
+    start = time.time()
+    for k in keys:
+        bt[k]
+    return len(keys), time.time() - start
+
+def benchDelChurn(factory, keys, bt):
+    # a copy would share its nodes with bt, timing the path copies of the
+    # first writes; build an unshared tree outside the timed region
+    bt = factory()
+    for k in keys:
+        bt[k] = k
+    churn = keys[:len(keys)//2]
+    start = time.time()
+    for k in churn:
+        del bt[k]
+    for k in churn:
+        bt[k] = k
+    return 2*len(churn), time.time() - start
+
+def benchIterate(factory, keys, bt):
+    start = time.time()
+    for item in bt.iteritems():
+        pass
+    return len(keys), time.time() - start
+
+def benchPickle(factory, keys, bt):
+    start = time.time()
+    cPickle.loads(cPickle.dumps(bt, 2))
+    return len(keys), time.time() - start
+
+workloads = [
+    ('seqInsert', benchSeqInsert),
+    ('randInsert', benchRandInsert),
+    ('get', benchGet),
+    ('delChurn', benchDelChurn),
+    ('iterate', benchIterate),
+    ('pickle', benchPickle),
+    ]
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Running
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+def peakRSS():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def benchTree(name, count, names=None, seed=42):
+    """Runs the named workloads, or all of them, against one tree class"""
+    factory = getTreeFactory(name)
+    keys = range(count)
+    random.Random(seed).shuffle(keys)
+
+    bt = factory()
+    for k in keys:
+        bt[k] = k
+
+    levels = {}
+    for level, node in bt.iterNodes(0):
+        levels[level] = levels.get(level, 0) + 1
+
+    results = {}
+    for wlName, wlFn in workloads:
+        if names and wlName not in names:
+            continue
+        gc.collect()
+        ops, secs = wlFn(factory, keys, bt)
+        results[wlName] = {
+            'ops': ops, 'seconds': secs,
+            'opsPerSec': ops/secs if secs else None,
+            }
+
+    return {
+        'tree': name,
+        'degree': list(bt.getDegree()),
+        'count': count,
+        'nodes': sum(levels.values()),
+        'height': len(levels),
+        'peakRSS': peakRSS(),
+        'python': sys.version.split()[0],
+        'workloads': results,
+        }
+
+def benchTreeInChild(name, count, names=None):
+    cmd = [sys.executable, __file__, '--child', '-n', str(count)]
+    if names:
+        cmd.extend(['-w', ','.join(names)])
+    cmd.append(name)
+    output = subprocess.Popen(cmd, stdout=subprocess.PIPE).communicate()[0]
+    return json.loads(output)[0]
+
+def main(argv=None):
+    parser = OptionParser(usage='%prog [options] [TREE ...]')
+    parser.add_option('-n', '--count', type='int', default=100000,
+            help='number of keys per tree (default %default)')
+    parser.add_option('-w', '--workloads', default='',
+            help='comma separated workloads: ' + ', '.join(n for n, f in workloads))
+    parser.add_option('-o', '--output', default=None,
+            help='write JSON here instead of stdout')
+    parser.add_option('--inline', action='store_true', default=False,
+            help='run every tree in this process')
+    parser.add_option('--child', action='store_true', default=False,
+            help='internal: run one tree and report it on stdout')
+    options, names = parser.parse_args(argv)
+
+    wlNames = [n for n in options.workloads.split(',') if n]
+    treeNames = names or defaultTrees
+
+    records = []
+    for name in treeNames:
+        if options.inline or options.child:
+            records.append(benchTree(name, options.count, wlNames))
+        else: records.append(benchTreeInChild(name, options.count, wlNames))
+        if not options.child:
+            print >> sys.stderr, '%-20s done' % (name,)
+
+    out = sys.stdout
+    if options.output:
+        out = open(options.output, 'w')
+    json.dump(records, out, indent=2, sort_keys=True)
+    print >> out
+    return records
+
+if __name__=='__main__':
+    main()
+
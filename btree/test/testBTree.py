@@ -3,6 +3,7 @@
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 import unittest
+import random
 from TG.collections import btree
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -46,6 +47,15 @@ class TestBTreeData(unittest.TestCase):
         for k,v in self.data:
             self.assertEqual(bt.pop(k), v)
 
+    def testItemsOrdered(self):
+        keyFunc = getattr(self.bt, 'keyFunc', None)
+        if keyFunc is not None:
+            data = sorted(self.data, key=lambda item: keyFunc(item[0]))
+        else:
+            keyCmp = self.bt.keyCmp
+            data = sorted(self.data, cmp=lambda a, b: keyCmp(a[0], b[0]))
+        self.assertEqual(self.bt.items(), data)
+
 class TestBTreeDataExtensive(TestBTreeData):
     def testPopPattern2(self):
         bt = self.bt
@@ -108,6 +118,19 @@ class TestBTreeDataExtensive(TestBTreeData):
             self.failIf(k in bt)
 
         self.failIf(bool(bt), "BTree should be empty")
+
+    def testDelChurn(self):
+        bt = self.bt
+        rand = random.Random(42)
+        expected = dict(self.data)
+        for x in xrange(4*self.count):
+            k = rand.randrange(self.count)
+            if rand.random() < 0.4:
+                bt[k] = expected[k] = x
+            else:
+                self.assertEqual(bt.pop(k, None), expected.pop(k, None))
+
+        self.assertEqual(sorted(bt.items()), sorted(expected.items()))
     
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
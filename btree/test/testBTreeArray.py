@@ -0,0 +1,93 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+import pickle
+from testBTree import TestBTreeDataExtensive
+from TG.collections.btree import btree
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreeIntItems4(btree.BTreeIntItems):
+    minDegree = 4
+    maxDegree = 7
+
+class BTreeIntKeys4x16(btree.BTreeIntKeys):
+    minDegree = 4
+    maxDegree = 16
+
+class BTreeFloatItems4(btree.BTreeFloatItems):
+    minDegree = 4
+    maxDegree = 7
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class TestBTreeArrayIntItems(TestBTreeDataExtensive):
+    count = 1024
+    BTreeFactory = BTreeIntItems4
+
+    def testStorage(self):
+        for node in self.bt.iterNodes():
+            self.assertEqual(node.getKeys().typecode, node.keyTypecode)
+
+    def testPickle(self):
+        bt = pickle.loads(pickle.dumps(self.bt, 2))
+        self.assertEqual(bt.items(), self.bt.items())
+        bt[self.count] = 0
+        self.assertEqual(len(bt), self.count+1)
+
+    def testSnapshot(self):
+        snap = self.bt.snapshot()
+        for k,v in self.data[::2]:
+            del self.bt[k]
+        self.assertEqual(snap.items(), self.data)
+
+class TestBTreeArrayIntKeys(TestBTreeArrayIntItems):
+    BTreeFactory = BTreeIntKeys4x16
+
+    def testObjectValues(self):
+        self.bt[3] = 'three'
+        self.assertEqual(self.bt[3], 'three')
+
+class TestBTreeArrayFloatItems(TestBTreeDataExtensive):
+    count = 1024
+    BTreeFactory = BTreeFloatItems4
+
+class TestBTreeArrayIntItemsWide(TestBTreeDataExtensive):
+    count = 2048
+    BTreeFactory = btree.BTreeIntItems
+
+class TestBTreeArrayTypes(unittest.TestCase):
+    def testRejectsObjectKeys(self):
+        bt = btree.BTreeIntItems()
+        self.assertRaises(TypeError, bt.__setitem__, 'key', 1)
+
+    def testRejectedValueLeavesTree(self):
+        for count in (10, 1000):
+            bt = BTreeIntItems4()
+            for k in xrange(count):
+                bt[k] = k
+            items = bt.items()
+
+            self.assertRaises(TypeError, bt.__setitem__, count, 'x')
+            self.assertRaises(TypeError, bt.__setitem__, count//2, 'x')
+            self.assertEqual(len(bt), count)
+            self.assertEqual(bt.items(), items)
+            self.failIf(count in bt)
+            bt[count] = count
+            self.assertEqual(bt[count], count)
+
+    def testRejectedValueInBulkLoad(self):
+        items = [(k, k) for k in xrange(100)] + [(100, 'x')]
+        self.assertRaises(TypeError, BTreeIntItems4.fromSortedItems, items)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()
+
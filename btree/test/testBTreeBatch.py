@@ -0,0 +1,105 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+import random
+from testBTree import TestBTreeDataExtensive
+from TG.collections.btree import btree
+from TG.collections.btree import btreeN
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class TestBTreeBatch(TestBTreeDataExtensive):
+    count = 2000
+
+    def setUp(self):
+        TestBTreeDataExtensive.setUp(self)
+        self.rnd = random.Random(42)
+
+    def testGetMany(self):
+        keys = [self.rnd.randrange(-10, self.count + 10) for x in xrange(500)]
+        expected = [k if 0 <= k < self.count else None for k in keys]
+        self.assertEqual(self.bt.getMany(keys), expected)
+        self.assertEqual(self.bt.getMany([]), [])
+        self.assertEqual(self.bt.getMany([-1, 5, -1], 'x'), ['x', 5, 'x'])
+
+    def testSetManySmall(self):
+        bt = self.bt
+        items = [(self.rnd.randrange(2*self.count), 'v%d' % x) for x in xrange(100)]
+        expected = dict(self.data)
+        expected.update(items)
+        bt.setMany(items)
+        self.assertEqual(len(bt), len(expected))
+        self.assertEqual(bt.items(), sorted(expected.items()))
+
+    def testSetManyLarge(self):
+        bt = self.bt
+        items = [(k, -k) for k in xrange(self.count//2, 3*self.count)]
+        self.rnd.shuffle(items)
+        bt.setMany(dict(items))
+        expected = dict(self.data)
+        expected.update(items)
+        self.assertEqual(bt.items(), sorted(expected.items()))
+
+    def testPopMany(self):
+        bt = self.bt
+        keys = range(0, self.count, 7)
+        self.rnd.shuffle(keys)
+        self.assertEqual(bt.popMany(keys), keys)
+        self.assertEqual(bt.keys(), [k for k in xrange(self.count) if k % 7])
+        self.assertEqual(len(bt), self.count - len(keys))
+
+    def testPopManyMissing(self):
+        bt = self.bt
+        self.assertRaises(KeyError, bt.popMany, [1, 2, -5])
+        self.assertEqual(len(bt), self.count)
+        self.assertEqual(bt.popMany([1, -5, 1], None), [1, None, 1])
+        self.failIf(1 in bt)
+
+    def testPopManyAll(self):
+        bt = self.bt
+        keys = range(self.count)
+        self.rnd.shuffle(keys)
+        for idx in xrange(0, self.count, 100):
+            bt.popMany(keys[idx:idx+100])
+        self.failIf(bool(bt), "BTree should be empty")
+
+    def testBatchSnapshot(self):
+        snap = self.bt.snapshot()
+        self.bt.setMany([(k, 0) for k in xrange(0, self.count, 3)])
+        self.bt.popMany(range(1, self.count, 3))
+        self.assertEqual(snap.items(), self.data)
+
+    def testBatchChurn(self):
+        bt = self.bt
+        expected = dict(self.data)
+        for step in xrange(50):
+            keys = [self.rnd.randrange(2*self.count) for x in xrange(self.rnd.choice([5, 50, 500]))]
+            if step % 2:
+                bt.setMany((k, step) for k in keys)
+                expected.update((k, step) for k in keys)
+            else:
+                bt.popMany(keys, None)
+                for k in keys:
+                    expected.pop(k, None)
+        self.assertEqual(bt.items(), sorted(expected.items()))
+        self.assertEqual(len(bt), len(expected))
+
+class TestBTreeBatchClassic(TestBTreeBatch):
+    BTreeFactory = btree.BTreeClassic
+
+class TestBTreeBatch16x64(TestBTreeBatch):
+    BTreeFactory = btreeN.BTree16x64
+
+class TestBTreeBatchIntKeys(TestBTreeBatch):
+    BTreeFactory = btree.BTreeIntKeys
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+import random
+from testBTree import TestBTreeDataExtensive
+from TG.collections.btree import btree
+from TG.collections.btree import btreeN
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class TestBTreeBulkSorted(TestBTreeDataExtensive):
+    count = 1024
+
+    def setUp(self):
+        self.initData()
+        self.bt = self.BTreeFactory.fromSortedItems(self.data)
+
+    def testNodeFill(self):
+        root = self.bt._getRootNode()
+        for node in self.bt.iterNodes():
+            if node is not root:
+                self.failIf(len(node) > self.bt.maxDegree)
+                self.failIf(len(node) < 1)
+
+    def testInsertAfterLoad(self):
+        bt = self.bt
+        for k in xrange(self.count, 2*self.count):
+            bt[k] = k
+        self.assertEqual(bt.keys(), range(2*self.count))
+
+    def testUnsortedRejected(self):
+        klass = self.BTreeFactory
+        self.assertRaises(ValueError, klass.fromSortedItems, [(3, 3), (1, 1), (2, 2)])
+        self.assertRaises(ValueError, klass.fromSortedItems, [(1, 1), (1, 2)])
+        data = self.data[:]
+        data[-1], data[-2] = data[-2], data[-1]
+        self.assertRaises(ValueError, klass.fromSortedItems, data)
+        self.assertRaises(ValueError, klass.fromSortedItems, iter(data))
+
+class TestBTreeBulkSortedClassic(TestBTreeBulkSorted):
+    BTreeFactory = btree.BTreeClassic
+
+class TestBTreeBulkSorted16x64(TestBTreeBulkSorted):
+    count = 4096
+    BTreeFactory = btreeN.BTree16x64
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class TestBTreeBulkItems(unittest.TestCase):
+    BTreeFactory = btree.BTree
+
+    def testEmpty(self):
+        bt = self.BTreeFactory.fromItems([])
+        self.failIf(bool(bt))
+        self.assertEqual(bt.items(), [])
+
+    def testUnsorted(self):
+        data = [(x, -x) for x in xrange(500)]
+        random.Random(7).shuffle(data)
+        bt = self.BTreeFactory.fromItems(data)
+        self.assertEqual(bt.items(), sorted(data))
+
+    def testDuplicatesLastWins(self):
+        bt = self.BTreeFactory.fromItems([(1, 'a'), (2, 'b'), (1, 'c')])
+        self.assertEqual(bt.items(), [(1, 'c'), (2, 'b')])
+
+    def testUpdateOnEmpty(self):
+        bt = self.BTreeFactory()
+        bt.update(dict.fromkeys(xrange(100), 0), x=1)
+        self.assertEqual(len(bt.keys()), 101)
+
+class TestBTreeBulkItemsClassic(TestBTreeBulkItems):
+    BTreeFactory = btree.BTreeClassic
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()
+
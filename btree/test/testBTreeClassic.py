@@ -19,6 +19,16 @@ class TestBTreeDataClassic1024(TestBTreeDataExtensive):
     count = 1024
     BTreeFactory = btree.BTreeClassic
 
+class ReverseKeyCmpBTreeClassic(btree.BTreeClassic):
+    keyCmp = staticmethod(lambda a, b: cmp(b, a))
+
+class TestBTreeDataClassicKeyCmp(TestBTreeDataExtensive):
+    count = 1024
+    BTreeFactory = ReverseKeyCmpBTreeClassic
+
+    def testOrdering(self):
+        self.assertEqual(self.bt.keys(), sorted(self.bt.keys(), reverse=True))
+
 if allowLongTest:
     class TestBTreeDataClassic2048(TestBTreeData):
         BTreeFactory = btree.BTreeClassic
@@ -0,0 +1,114 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+import pickle
+import random
+import threading
+from testBTree import TestBTreeDataExtensive
+from TG.collections.btree import btreeConcurrent
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class TestBTreeConcurrentData(TestBTreeDataExtensive):
+    BTreeFactory = btreeConcurrent.BTreeConcurrent
+
+class TestBTreeConcurrent(unittest.TestCase):
+    BTreeFactory = btreeConcurrent.BTreeConcurrent
+    count = 2000
+
+    def setUp(self):
+        self.bt = self.BTreeFactory((k, k) for k in xrange(self.count))
+
+    def tearDown(self):
+        del self.bt
+
+    def testIteratorSeesStartingVersion(self):
+        bt = self.bt
+        items = bt.iteritems()
+        first = next(items)
+        for k in xrange(0, self.count, 2):
+            del bt[k]
+        bt[-1] = -1
+        self.assertEqual([first] + list(items), [(k, k) for k in xrange(self.count)])
+        self.assertEqual(bt.keys()[:3], [-1, 1, 3])
+
+    def testTransaction(self):
+        bt = self.bt
+        with bt.transaction() as work:
+            work[-1] = -1
+            del work[0]
+            self.assertEqual(work.keys()[:2], [-1, 1])
+            self.assertEqual(bt.keys()[:2], [0, 1])
+        self.assertEqual(bt.keys()[:2], [-1, 1])
+
+    def testTransactionRollback(self):
+        bt = self.bt
+        try:
+            with bt.transaction() as work:
+                work.deleteRange(None, 100)
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual(bt.keys(), range(self.count))
+        bt[-1] = -1
+        self.assertEqual(len(bt), self.count+1)
+
+    def testPickleAndSnapshot(self):
+        bt = self.bt
+        snap = bt.snapshot()
+        other = pickle.loads(pickle.dumps(bt, 2))
+        bt[-1] = snap[-1] = other[-1] = -1
+        self.assertEqual(other.items(), bt.items())
+        self.assertEqual(snap.items(), bt.items())
+
+    def testThreads(self):
+        bt = self.bt
+        errors = []
+        done = threading.Event()
+
+        def writer(seed):
+            rnd = random.Random(seed)
+            try:
+                for step in xrange(3000):
+                    k = rnd.randrange(self.count)
+                    if rnd.random() < 0.5:
+                        bt.pop(k, None)
+                    else: bt[k] = k
+            except Exception, err:
+                errors.append(err)
+
+        def reader():
+            try:
+                while not done.isSet():
+                    items = bt.items()
+                    if items != sorted(items):
+                        errors.append('unordered items')
+                    # a version is never seen half written
+                    if len(items) != len(set(k for k, v in items)):
+                        errors.append('duplicate keys')
+            except Exception, err:
+                errors.append(err)
+
+        writers = [threading.Thread(target=writer, args=(seed,)) for seed in xrange(4)]
+        readers = [threading.Thread(target=reader) for idx in xrange(2)]
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        done.set()
+        for thread in readers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(bt), len(bt.keys()))
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()
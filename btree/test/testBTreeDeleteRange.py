@@ -0,0 +1,165 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+import random
+from TG.collections.btree import btree
+from TG.collections.btree import btreeN
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class TestBTreeDeleteRange(unittest.TestCase):
+    BTreeFactory = btree.BTree
+    count = 2000
+
+    def setUp(self):
+        self.keys = range(0, 2*self.count, 2)
+        self.bt = self.BTreeFactory()
+        for k in self.keys:
+            self.bt[k] = -k
+
+    def tearDown(self):
+        del self.bt
+
+    def assertStructure(self, bt):
+        # leaves all at one depth, and subtree counts consistent
+        depths = set()
+        stack = [(0, bt._getRootNode())]
+        while stack:
+            depth, node = stack.pop()
+            if node.isLeaf():
+                depths.add(depth)
+                continue
+            nodes = node.getNodes()
+            self.assertEqual(len(nodes), len(node)+1)
+            self.assertEqual(node.getCount(), len(node) + sum(n.getCount() for n in nodes))
+            stack.extend((depth+1, n) for n in nodes)
+        self.assertEqual(len(depths), 1)
+
+    def assertDeleteRange(self, lo, hi):
+        bt = self.bt
+        expected = [k for k in bt.keys()
+                if (lo is None or k >= lo) and (hi is None or k < hi)]
+        self.assertEqual(bt.deleteRange(lo, hi), len(expected))
+        for k in expected:
+            self.failIf(k in bt)
+        self.assertEqual(len(bt), len(bt.keys()))
+        self.assertStructure(bt)
+
+    def testMiddle(self):
+        self.assertDeleteRange(self.count//2, self.count + 101)
+        self.assertEqual(self.bt.keys(), [k for k in self.keys if not self.count//2 <= k < self.count+101])
+
+    def testOpenEnds(self):
+        self.assertDeleteRange(None, 301)
+        self.assertEqual(self.bt.keys()[0], 302)
+        self.assertDeleteRange(self.count, None)
+        self.assertEqual(self.bt.keys()[-1], self.count-2)
+
+    def testAll(self):
+        self.assertDeleteRange(None, None)
+        self.assertEqual(self.bt.items(), [])
+        self.bt[1] = 1
+        self.assertEqual(self.bt.items(), [(1, 1)])
+
+    def testEmptyRanges(self):
+        self.assertDeleteRange(11, 11)
+        self.assertDeleteRange(20, 10)
+        self.assertDeleteRange(1, 2)
+        self.assertEqual(self.bt.keys(), self.keys)
+
+    def testRandomRanges(self):
+        rnd = random.Random(42)
+        for step in xrange(20):
+            lo = rnd.randrange(-10, 2*self.count+10)
+            self.assertDeleteRange(lo, lo + rnd.randrange(self.count//4))
+            k = rnd.randrange(2*self.count)
+            self.bt[k] = -k
+            self.assertStructure(self.bt)
+
+    def testRank(self):
+        self.bt.deleteRange(100, 1000)
+        keys = self.bt.keys()
+        for idx in xrange(0, len(keys), 7):
+            self.assertEqual(self.bt.rank(keys[idx]), idx)
+            self.assertEqual(self.bt.select(idx), (keys[idx], -keys[idx]))
+
+    def testSnapshot(self):
+        snap = self.bt.snapshot()
+        self.bt.deleteRange(200, 3000)
+        self.assertEqual(snap.keys(), self.keys)
+        self.assertEqual(len(snap), self.count)
+
+class TestBTreeDeleteRangeClassic(TestBTreeDeleteRange):
+    BTreeFactory = btree.BTreeClassic
+
+class TestBTreeDeleteRange4(TestBTreeDeleteRange):
+    BTreeFactory = btreeN.BTree4
+
+class TestBTreeDeleteRange16x64(TestBTreeDeleteRange):
+    BTreeFactory = btreeN.BTree16x64
+    count = 10000
+
+class TestBTreeDeleteRangeIntItems(TestBTreeDeleteRange):
+    BTreeFactory = btree.BTreeIntItems
+    count = 10000
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class TestBTreeDeferBalance(TestBTreeDeleteRange):
+    def setUp(self):
+        TestBTreeDeleteRange.setUp(self)
+        self.bt.setDeferBalance(True)
+
+    def testDeferredDeletes(self):
+        bt = self.bt
+        rnd = random.Random(7)
+        keys = self.keys[:]
+        rnd.shuffle(keys)
+        removed = keys[:len(keys)//3]
+        eager = bt.snapshot()
+        eager.setDeferBalance(False)
+        for k in removed:
+            del bt[k]
+            del eager[k]
+        self.assertStructure(bt)
+        self.failUnless(bt._deferredCount > 0)
+        self.failUnless(bt.getAdjustmentCounts()['rotate'] < eager.getAdjustmentCounts()['rotate'])
+
+        expected = sorted(set(self.keys) - set(removed))
+        self.assertEqual(bt.keys(), expected)
+        bt.compact()
+        self.assertEqual(bt._deferredCount, 0)
+        self.assertEqual(bt.keys(), expected)
+        self.assertStructure(bt)
+
+    def testCompactThreshold(self):
+        bt = self.bt
+        bt.setDeferBalance(True, 0.1)
+        for k in self.keys[:len(self.keys)//2]:
+            del bt[k]
+        self.failUnless(bt._deferredCount < 0.1*len(bt))
+        self.assertStructure(bt)
+
+    def testDisableCompacts(self):
+        bt = self.bt
+        for k in self.keys[::3]:
+            del bt[k]
+        bt.setDeferBalance(False)
+        self.failIf(bt.getDeferBalance())
+        self.assertEqual(bt._deferredCount, 0)
+        self.assertEqual(bt.keys(), [k for k in self.keys if k not in self.keys[::3]])
+
+class TestBTreeDeferBalance16x64(TestBTreeDeferBalance):
+    BTreeFactory = btreeN.BTree16x64
+    count = 10000
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()
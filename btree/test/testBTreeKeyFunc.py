@@ -0,0 +1,122 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+import pickle
+from testBTree import TestBTreeDataExtensive
+from TG.collections.btree import btree
+from TG.collections.btree import btreeStream
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+def negate(key):
+    return -key
+
+class ReverseKeyFuncBTree(btree.BTreeKeyFunc):
+    keyFunc = staticmethod(negate)
+
+class ReverseKeyFuncBTreeClassic(btree.BTreeKeyFuncMixin, btree.BTreeClassic):
+    keyFunc = staticmethod(negate)
+
+class CaselessBTree(btree.BTreeKeyFunc):
+    keyFunc = staticmethod(str.lower)
+
+class TestBTreeDataKeyFunc(TestBTreeDataExtensive):
+    BTreeFactory = ReverseKeyFuncBTree
+    count = 1000
+
+    def testReversed(self):
+        self.assertEqual(self.bt.keys(), range(self.count-1, -1, -1))
+        self.assertEqual(self.bt.values(), range(self.count-1, -1, -1))
+
+    def testGetMany(self):
+        self.assertEqual(self.bt.getMany([3, -1, 7]), [3, None, 7])
+
+    def testPopMany(self):
+        self.assertRaises(KeyError, self.bt.popMany, [3, -1])
+        self.assertEqual(len(self.bt), self.count)
+        self.assertEqual(self.bt.popMany([3, -1], 'x'), [3, 'x'])
+        self.failIf(3 in self.bt)
+
+    def testRange(self):
+        bt = self.bt
+        self.assertEqual([k for k, v in bt.irange(10, 5)], [10, 9, 8, 7, 6])
+        self.assertEqual([k for k, v in bt.irange(10, 5, True)], [6, 7, 8, 9, 10])
+        self.assertEqual(bt.ceiling(10), 10)
+        self.assertEqual(bt.higher(10), 9)
+        self.assertEqual(bt.lower(10), 11)
+        self.assertEqual(bt.rank(self.count-1), 0)
+        self.assertEqual(bt.select(0), (self.count-1, self.count-1))
+        self.assertEqual(bt.cursor(5).getItem(), (5, 5))
+
+    def testPopitem(self):
+        key, value = self.bt.popitem()
+        self.assertEqual(key, value)
+        self.failIf(key in self.bt)
+        self.assertEqual(len(self.bt), self.count-1)
+
+    def testPickleAndStream(self):
+        bt = pickle.loads(pickle.dumps(self.bt, 2))
+        self.assertEqual(bt.items(), self.bt.items())
+        bt = btreeStream.loads(btreeStream.dumps(self.bt))
+        self.assertEqual(bt.items(), self.bt.items())
+        self.assertEqual(bt[5], 5)
+
+    def testFromSortedItems(self):
+        items = self.bt.items()
+        bt = self.BTreeFactory.fromSortedItems(items)
+        self.assertEqual(bt.items(), items)
+        self.assertEqual(bt[5], 5)
+
+class TestBTreeDataKeyFuncClassic(TestBTreeDataKeyFunc):
+    BTreeFactory = ReverseKeyFuncBTreeClassic
+
+class TestBTreeCaseless(unittest.TestCase):
+    def testCaseless(self):
+        bt = CaselessBTree()
+        bt['Beta'] = 2
+        bt['alpha'] = 1
+        bt['GAMMA'] = 3
+        self.assertEqual(bt.keys(), ['alpha', 'Beta', 'GAMMA'])
+        self.assertEqual(bt['BETA'], 2)
+        self.failUnless('gamma' in bt)
+
+        bt['ALPHA'] = 10
+        self.assertEqual(len(bt), 3)
+        self.assertEqual(bt.items()[0], ('ALPHA', 10))
+
+        del bt['beta']
+        self.assertEqual(bt.keys(), ['ALPHA', 'GAMMA'])
+        self.assertEqual(bt.setdefault('gamma', 0), 3)
+
+    def testSetKeyFunc(self):
+        bt = btree.BTreeKeyFunc()
+        bt.setKeyFunc(len)
+        bt.update({'ccc': 3, 'a': 1, 'bb': 2})
+        self.assertEqual(bt.keys(), ['a', 'bb', 'ccc'])
+        self.assertRaises(Exception, bt.setKeyFunc, str.lower)
+
+    def testStreamSetKeyFunc(self):
+        for keyFunc in (str.lower, len):
+            bt = btree.BTreeKeyFunc()
+            bt.setKeyFunc(keyFunc)
+            bt.update({'ccc': 3, 'A': 1, 'bb': 2})
+
+            loaded = btreeStream.loads(btreeStream.dumps(bt))
+            self.assertEqual(loaded.getKeyFunc(), keyFunc)
+            self.assertEqual(loaded.items(), bt.items())
+            loaded['dddd'] = 4
+            bt['dddd'] = 4
+            self.assertEqual(loaded.items(), bt.items())
+            self.assertEqual(loaded['A'], 1)
+            self.assertEqual(loaded.get('a'), bt.get('a'))
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()
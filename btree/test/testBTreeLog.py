@@ -0,0 +1,230 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import os
+import unittest
+import threading
+import tempfile
+from TG.collections.btree import btree
+from TG.collections.btree import btreeLog
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreeLogged4x16(btreeLog.BTreeLogged):
+    minDegree = 4
+    maxDegree = 16
+
+class BTreeKeyFuncLogged(btree.BTreeKeyFuncMixin, BTreeLogged4x16):
+    keyFunc = staticmethod(str.lower)
+
+class BTreePagedLogged4x16(btreeLog.BTreePagedLogged):
+    minDegree = 4
+    maxDegree = 16
+
+class TestBTreeLogFiles(unittest.TestCase):
+    BTreeFactory = BTreeLogged4x16
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp('.btree')
+        os.close(fd)
+        os.remove(self.filename)
+        self.bt = self.BTreeFactory.open(self.filename)
+
+    def tearDown(self):
+        self.bt.close()
+        del self.bt
+        for suffix in ('', '.log'):
+            if os.path.exists(self.filename + suffix):
+                os.remove(self.filename + suffix)
+
+    def reopen(self):
+        self.bt.close()
+        self.bt = self.BTreeFactory.open(self.filename)
+        return self.bt
+
+class TestBTreeLog(TestBTreeLogFiles):
+    count = 2000
+
+    def fill(self, bt):
+        for k in xrange(self.count):
+            bt[k] = k
+        expected = dict((k, k) for k in xrange(self.count))
+        return expected
+
+    def testReplay(self):
+        bt = self.bt
+        expected = self.fill(bt)
+        for k in xrange(0, self.count, 3):
+            del bt[k]
+            del expected[k]
+        self.assertEqual(bt.pop(1), 1)
+        self.assertEqual(bt.pop(1, None), None)
+        del expected[1]
+        bt.setdefault(-1, -1)
+        expected[-1] = -1
+
+        bt = self.reopen()
+        self.assertEqual(bt.items(), sorted(expected.items()))
+
+    def testReplayBatches(self):
+        bt = self.bt
+        expected = self.fill(bt)
+        bt.update((k, -k) for k in xrange(0, self.count, 2))
+        expected.update((k, -k) for k in xrange(0, self.count, 2))
+        bt.popMany(range(0, self.count, 5))
+        for k in xrange(0, self.count, 5):
+            del expected[k]
+        self.assertEqual(bt.deleteRange(100, 200), len([k for k in expected if 100 <= k < 200]))
+        for k in xrange(100, 200):
+            expected.pop(k, None)
+
+        bt = self.reopen()
+        self.assertEqual(bt.items(), sorted(expected.items()))
+
+    def testClear(self):
+        bt = self.bt
+        self.fill(bt)
+        bt.clear()
+        bt[1] = 1
+        bt = self.reopen()
+        self.assertEqual(bt.items(), [(1, 1)])
+
+    def testFailedChangesNotLogged(self):
+        bt = self.bt
+        self.fill(bt)
+        logCount = bt._logCount
+        self.assertRaises(KeyError, bt.pop, -1)
+        self.assertRaises(KeyError, bt.popMany, [0, -1])
+        self.assertEqual(bt._logCount, logCount)
+        bt.compact()
+        self.assertEqual(bt._logCount, logCount)
+
+    def testUnpicklableChangesNotApplied(self):
+        bt = self.bt
+        bt[1] = 1
+        lock = threading.Lock()
+        self.assertRaises(TypeError, bt.__setitem__, 2, lock)
+        self.assertRaises(TypeError, bt.update, [(3, 3), (4, lock)])
+        self.assertEqual(bt.keys(), [1])
+
+        bt = self.reopen()
+        self.assertEqual(bt.keys(), [1])
+
+    def testCheckpoint(self):
+        bt = self.bt
+        expected = self.fill(bt)
+        bt.checkpoint()
+        self.assertEqual(bt._logCount, 0)
+        logSize = os.path.getsize(self.filename + '.log')
+
+        bt[-1] = -1
+        expected[-1] = -1
+        self.failUnless(os.path.getsize(self.filename + '.log') > logSize)
+        bt = self.reopen()
+        self.assertEqual(bt._logCount, 1)
+        self.assertEqual(bt.items(), sorted(expected.items()))
+
+    def testReplayOverNewerCheckpoint(self):
+        bt = self.bt
+        expected = self.fill(bt)
+        for k in xrange(0, self.count, 2):
+            del bt[k]
+            del expected[k]
+        bt.clear()
+        bt.update(expected)
+
+        # as if the process died between the checkpoint and the log reset
+        bt._writeCheckpoint()
+        bt = self.reopen()
+        self.assertEqual(bt.items(), sorted(expected.items()))
+
+    def testTornRecord(self):
+        bt = self.bt
+        bt[1] = 1
+        bt[2] = 2
+        bt.close()
+        logFilename = self.filename + '.log'
+        size = os.path.getsize(logFilename)
+        f = open(logFilename, 'r+b')
+        f.truncate(size - 3)
+        f.close()
+
+        bt = self.reopen()
+        self.assertEqual(bt.items(), [(1, 1)])
+        bt[3] = 3
+        bt = self.reopen()
+        self.assertEqual(bt.items(), [(1, 1), (3, 3)])
+
+    def testAutoCheckpoint(self):
+        bt = self.bt
+        self.fill(bt)
+        self.failUnless(bt._logCount < self.count)
+        self.failUnless(os.path.exists(self.filename))
+
+    def testSnapshotUnlogged(self):
+        bt = self.bt
+        self.fill(bt)
+        snap = bt.snapshot()
+        logCount = bt._logCount
+        snap[-1] = -1
+        self.assertEqual(bt._logCount, logCount)
+        bt = self.reopen()
+        self.failIf(-1 in bt)
+
+class TestBTreeLogKeyFunc(TestBTreeLogFiles):
+    BTreeFactory = BTreeKeyFuncLogged
+
+    def testKeyFuncReplay(self):
+        bt = self.bt
+        bt['Alpha'] = 1
+        bt['beta'] = 2
+        bt['ALPHA'] = 3
+        del bt['BETA']
+        bt.setMany([('Gamma', 4), ('delta', 5)])
+        bt.deleteRange('d', 'e')
+        self.assertEqual(bt.pop('gamma'), 4)
+        bt['Gamma'] = 6
+
+        bt = self.reopen()
+        self.assertEqual(bt.items(), [('ALPHA', 3), ('Gamma', 6)])
+
+class TestBTreePagedLog(TestBTreeLog):
+    BTreeFactory = BTreePagedLogged4x16
+
+    def testCommitIsCheckpoint(self):
+        bt = self.bt
+        expected = self.fill(bt)
+        bt.commit()
+        self.assertEqual(bt._logCount, 0)
+        bt[-1] = -1
+        expected[-1] = -1
+        bt = self.reopen()
+        self.assertEqual(bt._logCount, 1)
+        self.assertEqual(bt.items(), sorted(expected.items()))
+
+    def testVacuum(self):
+        bt = self.bt
+        expected = self.fill(bt)
+        for k in xrange(0, self.count, 2):
+            del bt[k]
+            del expected[k]
+        size = os.path.getsize(self.filename)
+        bt.vacuum()
+        self.assertEqual(bt._logCount, 0)
+        self.failIf(os.path.getsize(self.filename) >= size)
+
+        bt[-1] = -1
+        expected[-1] = -1
+        bt = self.reopen()
+        self.assertEqual(bt._logCount, 1)
+        self.assertEqual(bt.items(), sorted(expected.items()))
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()
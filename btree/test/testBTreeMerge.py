@@ -0,0 +1,131 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+from TG.collections.btree import btree
+from TG.collections.btree import btreeN
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class TestBTreeMerge(unittest.TestCase):
+    BTreeFactory = btree.BTree
+    count = 2000
+
+    def newTree(self, keys, sign=1):
+        bt = self.BTreeFactory()
+        for k in keys:
+            bt[k] = sign*k
+        return bt
+
+    def assertStructure(self, bt):
+        depths = set()
+        stack = [(0, bt._getRootNode())]
+        while stack:
+            depth, node = stack.pop()
+            if node.isLeaf():
+                depths.add(depth)
+                continue
+            nodes = node.getNodes()
+            self.assertEqual(len(nodes), len(node)+1)
+            self.assertEqual(node.getCount(), len(node) + sum(n.getCount() for n in nodes))
+            stack.extend((depth+1, n) for n in nodes)
+        self.assertEqual(len(depths), 1)
+        self.assertEqual(len(bt), len(bt.keys()))
+
+    def assertMerge(self, aKeys, bKeys):
+        a, b = self.newTree(aKeys), self.newTree(bKeys, -1)
+        aItems, bItems = a.items(), b.items()
+        merged = self.BTreeFactory.merge(a, b)
+
+        expected = dict(aItems)
+        expected.update(bItems)
+        self.assertEqual(merged.items(), sorted(expected.items()))
+        self.assertStructure(merged)
+        self.assertEqual(a.items(), aItems)
+        self.assertEqual(b.items(), bItems)
+        return a, b, merged
+
+    def testDisjoint(self):
+        self.assertMerge(xrange(self.count), xrange(self.count, 2*self.count))
+        self.assertMerge(xrange(self.count, 2*self.count), xrange(10))
+
+    def testInterleaved(self):
+        self.assertMerge(xrange(0, 2*self.count, 2), xrange(1, 2*self.count, 2))
+
+    def testOverlapping(self):
+        self.assertMerge(xrange(self.count), xrange(self.count//2, 3*self.count, 3))
+        self.assertMerge(xrange(self.count//3, self.count//2), xrange(self.count))
+        self.assertMerge(xrange(self.count), xrange(self.count))
+
+    def testEmpty(self):
+        self.assertMerge([], xrange(self.count))
+        self.assertMerge(xrange(self.count), [])
+        self.assertMerge([], [])
+
+    def testIndependentAfterMerge(self):
+        a, b, merged = self.assertMerge(xrange(self.count), xrange(self.count, 2*self.count))
+        for k in xrange(0, 2*self.count, 3):
+            del merged[k]
+        a[-1] = -1
+        b[-2] = -2
+        self.assertEqual(len(a), self.count+1)
+        self.assertEqual(len(b), self.count+1)
+        self.assertEqual(len(merged), 2*self.count - len(xrange(0, 2*self.count, 3)))
+        self.assertStructure(merged)
+
+    def testMergeOtherTypes(self):
+        merged = self.BTreeFactory.merge(btree.BTreeClassic({1: 1, 3: 3}), {2: 2, 3: 4})
+        self.assertEqual(type(merged), self.BTreeFactory)
+        self.assertEqual(merged.items(), [(1, 1), (2, 2), (3, 4)])
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def testSplitAt(self):
+        bt = self.newTree(xrange(0, 2*self.count, 2))
+        items = bt.items()
+        for key in (-1, 0, 1, self.count, self.count+1, 2*self.count-2, 2*self.count):
+            left, right = bt.splitAt(key)
+            self.assertEqual(left.items(), [i for i in items if i[0] < key])
+            self.assertEqual(right.items(), [i for i in items if i[0] >= key])
+            self.assertStructure(left)
+            self.assertStructure(right)
+        self.assertEqual(bt.items(), items)
+
+    def testSplitAtIndependent(self):
+        bt = self.newTree(xrange(self.count))
+        left, right = bt.splitAt(self.count//2)
+        left[self.count] = 0
+        del right[self.count-1]
+        bt[-1] = -1
+        self.assertEqual(left.keys(), range(self.count//2) + [self.count])
+        self.assertEqual(right.keys(), range(self.count//2, self.count-1))
+        self.assertEqual(bt.keys(), range(-1, self.count))
+
+    def testSplitMergeRoundTrip(self):
+        bt = self.newTree(xrange(self.count))
+        left, right = bt.splitAt(self.count//3)
+        self.assertEqual(self.BTreeFactory.merge(left, right).items(), bt.items())
+
+class TestBTreeMergeClassic(TestBTreeMerge):
+    BTreeFactory = btree.BTreeClassic
+
+class TestBTreeMerge4(TestBTreeMerge):
+    BTreeFactory = btreeN.BTree4
+
+class TestBTreeMerge16x64(TestBTreeMerge):
+    BTreeFactory = btreeN.BTree16x64
+    count = 10000
+
+class TestBTreeMergeIntItems(TestBTreeMerge):
+    BTreeFactory = btree.BTreeIntItems
+    count = 10000
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import random
+import unittest
+from TG.collections.btree import btree
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreeIntItems4(btree.BTreeIntItems):
+    minDegree = 4
+    maxDegree = 7
+
+class BTreeIntKeys4x16(btree.BTreeIntKeys):
+    minDegree = 4
+    maxDegree = 16
+
+class BTreeFloatItems4(btree.BTreeFloatItems):
+    minDegree = 4
+    maxDegree = 7
+
+def reverseCmp(a, b):
+    return cmp(b, a)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+@unittest.skipIf(numpy is None, "requires numpy")
+class TestBTreeNumpyIntItems(unittest.TestCase):
+    BTreeFactory = BTreeIntItems4
+    count = 2000
+
+    def setUp(self):
+        rand = random.Random(42)
+        self.keys = sorted(rand.sample(xrange(10*self.count), self.count))
+        self.bt = self.BTreeFactory((k, 2*k) for k in self.keys)
+        self.query = numpy.array([rand.randrange(-10, 10*self.count + 10)
+                for x in xrange(4*self.count)] + self.keys[::7])
+
+    def testSearchsorted(self):
+        keys = numpy.array(self.keys)
+        for side in ('left', 'right'):
+            self.assertEqual(self.bt.searchsorted(self.query, side).tolist(),
+                    keys.searchsorted(self.query, side).tolist())
+
+    def testGetMany(self):
+        present = set(self.keys)
+        query = self.query.tolist()
+        result = self.bt.getMany(self.query)
+        self.assertEqual(result.tolist(), [2*k if k in present else None for k in query])
+        result = self.bt.getMany(self.query, -1)
+        self.assertEqual(result.tolist(), [2*k if k in present else -1 for k in query])
+
+    def testGetManyShape(self):
+        query = self.query[:100].reshape(10, 10)
+        self.assertEqual(self.bt.getMany(query, -1).shape, (10, 10))
+        self.assertEqual(self.bt.searchsorted(query).shape, (10, 10))
+        self.assertEqual(self.bt.getMany(self.query[:0]).shape, (0,))
+
+    def testGetManyList(self):
+        self.assertEqual(self.bt.getMany(self.keys[:3]), [2*k for k in self.keys[:3]])
+
+    def testToArrays(self):
+        keys, values = self.bt.toArrays()
+        self.assertEqual(keys.tolist(), self.keys)
+        self.assertEqual(values.tolist(), [2*k for k in self.keys])
+
+    def testEmpty(self):
+        bt = self.BTreeFactory()
+        keys, values = bt.toArrays()
+        self.assertEqual(len(keys), 0)
+        self.assertEqual(bt.searchsorted(self.query).tolist(), [0]*len(self.query))
+        self.assertEqual(bt.getMany(self.query, 0).tolist(), [0]*len(self.query))
+
+    def testKeyCmp(self):
+        bt = self.BTreeFactory()
+        bt.setKeyCmp(reverseCmp)
+        bt.update((k, 2*k) for k in self.keys)
+        present = set(self.keys)
+        query = self.query.tolist()
+        self.assertEqual(bt.getMany(self.query, -1).tolist(),
+                [2*k if k in present else -1 for k in query])
+        above = len(self.keys) - numpy.array(self.keys).searchsorted(self.query, 'right')
+        self.assertEqual(bt.searchsorted(self.query).tolist(), above.tolist())
+
+class TestBTreeNumpyIntKeys(TestBTreeNumpyIntItems):
+    BTreeFactory = BTreeIntKeys4x16
+
+    def testObjectValues(self):
+        self.bt[self.keys[0]] = (1, 2)
+        keys, values = self.bt.toArrays()
+        self.assertEqual(values[0], (1, 2))
+        self.assertEqual(self.bt.getMany(numpy.array(self.keys[:1]))[0], (1, 2))
+
+class TestBTreeNumpyFloatItems(TestBTreeNumpyIntItems):
+    BTreeFactory = BTreeFloatItems4
+
+class TestBTreeNumpyWide(TestBTreeNumpyIntItems):
+    BTreeFactory = btree.BTreeIntItems
+    count = 20000
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()
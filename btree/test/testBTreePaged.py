@@ -0,0 +1,217 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import os
+import gc
+import unittest
+import tempfile
+from testBTree import TestBTreeDataExtensive
+from TG.collections.btree import btreePaged
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreePaged4x16(btreePaged.BTreePaged):
+    minDegree = 4
+    maxDegree = 16
+
+class BTreePagedIntItems4x16(btreePaged.BTreePagedIntItems):
+    minDegree = 4
+    maxDegree = 16
+
+class TestBTreePaged(TestBTreeDataExtensive):
+    BTreeFactory = BTreePaged4x16
+    count = 2000
+    cacheSize = 16
+
+    def setUp(self):
+        self.initData()
+        fd, self.filename = tempfile.mkstemp('.btree')
+        os.close(fd)
+        os.remove(self.filename)
+
+        bt = self.BTreeFactory.open(self.filename, self.cacheSize)
+        bt.update(self.data)
+        bt.commit()
+        bt.close()
+        self.bt = self.reopen()
+
+    def tearDown(self):
+        self.bt.close()
+        del self.bt
+        os.remove(self.filename)
+
+    def reopen(self):
+        return self.BTreeFactory.open(self.filename, self.cacheSize)
+
+    def testReopen(self):
+        bt = self.bt
+        self.assertEqual(len(bt), self.count)
+        self.assertEqual(bt.items(), sorted(self.data))
+
+    def testCacheBounded(self):
+        self.assertEqual(self.bt.items(), sorted(self.data))
+        self.failIf(len(self.bt.getStore()._cache) > self.cacheSize)
+
+    def testCommitChanges(self):
+        bt = self.bt
+        for k in xrange(0, self.count, 2):
+            del bt[k]
+        for k in xrange(self.count, self.count + 100):
+            bt[k] = -k
+        expected = bt.items()
+        bt.commit()
+        bt.close()
+
+        self.bt = bt = self.reopen()
+        self.assertEqual(bt.items(), expected)
+        self.assertEqual(len(bt), len(expected))
+
+    def testUncommittedDiscarded(self):
+        bt = self.bt
+        for k in xrange(0, self.count, 3):
+            del bt[k]
+        bt[-1] = -1
+        bt.close()
+
+        self.bt = bt = self.reopen()
+        self.assertEqual(bt.items(), sorted(self.data))
+
+    def testRepeatedCommits(self):
+        bt = self.bt
+        expected = dict(self.data)
+        for step in xrange(5):
+            for k in xrange(step, self.count, 7):
+                if k in expected:
+                    del bt[k]
+                    del expected[k]
+                else:
+                    bt[k] = step
+                    expected[k] = step
+            bt.commit()
+        bt.close()
+
+        self.bt = bt = self.reopen()
+        self.assertEqual(bt.items(), sorted(expected.items()))
+
+    def testVacuum(self):
+        bt = self.bt
+        expected = dict(self.data)
+        for step in xrange(10):
+            for k in xrange(step, self.count, 3):
+                bt[k] = step
+                expected[k] = step
+            bt.commit()
+        size = os.path.getsize(self.filename)
+
+        for k in xrange(0, self.count, 2):
+            del bt[k]
+            del expected[k]
+        bt.vacuum()
+        self.failIf(os.path.getsize(self.filename) > size // 4)
+        self.failIf(os.path.exists(self.filename + '.vacuum'))
+        self.assertEqual(bt.items(), sorted(expected.items()))
+
+        bt[-1] = -1
+        expected[-1] = -1
+        bt.commit()
+        bt.close()
+        self.bt = bt = self.reopen()
+        self.assertEqual(bt.items(), sorted(expected.items()))
+
+    def liveNodeCount(self):
+        gc.collect()
+        klass = self.BTreeFactory
+        nodeTypes = (klass.LeafFactory, klass.BranchFactory)
+        return sum(1 for obj in gc.get_objects() if isinstance(obj, nodeTypes))
+
+    def testDirtyNodesBounded(self):
+        bt = self.bt
+        limit = self.liveNodeCount() + 2*self.cacheSize
+        expected = dict(self.data)
+        for k in xrange(self.count, 2*self.count):
+            bt[k] = k
+            expected[k] = k
+        self.failIf(self.liveNodeCount() > limit)
+
+        batch = [(k, -k) for k in xrange(0, 3*self.count, 2)]
+        bt.update(batch)
+        expected.update(batch)
+        self.failIf(self.liveNodeCount() > limit)
+
+        bt.popMany(range(1, 2*self.count, 3))
+        for k in xrange(1, 2*self.count, 3):
+            del expected[k]
+        self.failIf(self.liveNodeCount() > limit)
+        self.assertEqual(bt.items(), sorted(expected.items()))
+
+        bt.close()
+        self.bt = bt = self.reopen()
+        self.assertEqual(bt.items(), sorted(self.data))
+
+    def testBulkLoadBounded(self):
+        bt = self.bt
+        limit = self.liveNodeCount() + 2*self.cacheSize
+        items = [(k, k) for k in xrange(5*self.count)]
+        bt.clear()
+        bt.update(items)
+        self.failIf(self.liveNodeCount() > limit)
+        bt.compact(0.5)
+        self.failIf(self.liveNodeCount() > limit)
+        bt.commit()
+        bt.close()
+
+        self.bt = bt = self.reopen()
+        self.assertEqual(bt.items(), items)
+
+class TestBTreePagedIntItems(TestBTreePaged):
+    BTreeFactory = BTreePagedIntItems4x16
+
+class TestBTreePagedTemporary(TestBTreeDataExtensive):
+    BTreeFactory = BTreePaged4x16
+    count = 500
+
+    def tearDown(self):
+        self.bt.close()
+        del self.bt
+
+    def testCommit(self):
+        self.bt.commit()
+        self.bt[self.count] = 0
+        self.assertEqual(len(self.bt), self.count + 1)
+
+    def testDroppedTreeRemovesFile(self):
+        bt = self.BTreeFactory()
+        bt.update(self.data)
+        bt.commit()
+        filename = bt.getStore().filename
+        self.failUnless(os.path.exists(filename))
+        del bt
+        gc.collect()
+        self.failIf(os.path.exists(filename))
+
+    def testVacuum(self):
+        bt = self.bt
+        for k in xrange(0, self.count, 2):
+            del bt[k]
+        bt.commit()
+        filename = bt.getStore().filename
+        bt.vacuum()
+        self.assertEqual(bt.keys(), range(1, self.count, 2))
+        bt.close()
+        self.failIf(os.path.exists(filename))
+
+    def testCloseRemovesFile(self):
+        filename = self.bt.getStore().filename
+        self.bt.close()
+        self.failIf(os.path.exists(filename))
+        self.bt.close()
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()
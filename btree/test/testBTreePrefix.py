@@ -0,0 +1,128 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import random
+import unittest
+import pickle
+from testBTree import TestBTreeDataExtensive
+from TG.collections.btree import btree
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class BTreePrefixKeys4x16(btree.BTreePrefixKeys):
+    minDegree = 4
+    maxDegree = 16
+
+def pathKey(x):
+    return '/srv/data/projects/p%02d/src/module%03d.py' % (x % 37, x)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class TestBTreePrefixKeys(TestBTreeDataExtensive):
+    count = 1024
+    BTreeFactory = BTreePrefixKeys4x16
+
+    data = None
+    def initData(klass):
+        if klass.data is None or len(klass.data) != klass.count:
+            klass.data = sorted((pathKey(x), x) for x in xrange(klass.count))
+        return klass.data
+    initData = classmethod(initData)
+
+    def assertPrefixes(self, bt):
+        for node in bt.iterNodes():
+            if node.isLeaf():
+                prefix = node.getPrefix()
+                for k, v in node.getItems():
+                    self.failUnless(k.startswith(prefix))
+
+    def testPrefixes(self):
+        self.assertPrefixes(self.bt)
+        leaves = [node for node in self.bt.iterNodes() if node.isLeaf()]
+        self.failUnless(min(len(node.getPrefix()) for node in leaves) >= len('/srv/data/projects/p'))
+
+    def testMissingKeys(self):
+        bt = self.bt
+        for key in ('', '/', '/srv', '/srv/data/projects/p00/src/module',
+                '/srv/data/projects/p99', '~', pathKey(0) + 'x'):
+            self.failIf(key in bt)
+            self.assertEqual(bt.get(key), None)
+
+    def testWidenPrefix(self):
+        bt = self.bt
+        keys = ['/srv/data/projects/p00/src/module000.pyc', '/srv/data', '/',
+                'a', '', '/srv/data/projects/p00/src/module000.py~']
+        for key in keys:
+            bt[key] = key
+        self.assertPrefixes(bt)
+        self.assertEqual(bt.items(), sorted(self.data + [(k, k) for k in keys]))
+        for key in keys:
+            del bt[key]
+        self.assertEqual(bt.items(), self.data)
+
+    def testDelChurn(self):
+        bt = self.bt
+        rand = random.Random(42)
+        expected = dict(self.data)
+        for x in xrange(4*self.count):
+            k = pathKey(rand.randrange(self.count))
+            if rand.random() < 0.4:
+                bt[k] = expected[k] = x
+            else:
+                self.assertEqual(bt.pop(k, None), expected.pop(k, None))
+        self.assertEqual(bt.items(), sorted(expected.items()))
+
+    def testRandomChurn(self):
+        bt = self.BTreeFactory()
+        rand = random.Random(7)
+        expected = {}
+        for x in xrange(4*self.count):
+            key = pathKey(rand.randrange(self.count))[:rand.randrange(20, 45)]
+            if key in expected and rand.random() < 0.5:
+                self.assertEqual(bt.pop(key), expected.pop(key))
+            else:
+                bt[key] = expected[key] = x
+        self.assertPrefixes(bt)
+        self.assertEqual(bt.items(), sorted(expected.items()))
+
+    def testUnicodeKeys(self):
+        bt = self.BTreeFactory((unicode(k), v) for k, v in self.data)
+        self.assertEqual(bt[unicode(pathKey(3))], 3)
+        self.assertEqual(bt.items(), [(unicode(k), v) for k, v in self.data])
+
+    def testPickle(self):
+        bt = pickle.loads(pickle.dumps(self.bt, 2))
+        self.assertEqual(bt.items(), self.bt.items())
+        bt['z'] = 0
+        self.assertEqual(len(bt), self.count+1)
+
+    def testSnapshot(self):
+        snap = self.bt.snapshot()
+        for k,v in self.data[::2]:
+            del self.bt[k]
+        self.assertEqual(snap.items(), self.data)
+        self.assertEqual(self.bt.items(), self.data[1::2])
+
+    def testRangeAndRank(self):
+        bt = self.bt
+        keys = [k for k, v in self.data]
+        lo, hi = keys[100], keys[200]
+        self.assertEqual([k for k, v in bt.irange(lo, hi)], keys[100:200])
+        self.assertEqual(bt.rank(keys[300]), 300)
+        self.assertEqual(bt.select(300), self.data[300])
+        self.assertEqual(bt.deleteRange(lo, hi), 100)
+        self.assertEqual(bt.keys(), keys[:100] + keys[200:])
+
+class TestBTreePrefixKeysWide(TestBTreePrefixKeys):
+    count = 4096
+    BTreeFactory = btree.BTreePrefixKeys
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()
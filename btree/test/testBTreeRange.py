@@ -0,0 +1,90 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+from TG.collections.btree import btree
+from TG.collections.btree import btreeN
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class TestBTreeRange(unittest.TestCase):
+    BTreeFactory = btree.BTree
+    count = 1024
+
+    def setUp(self):
+        # even keys only, so odd keys fall between entries
+        self.keys = range(0, 2*self.count, 2)
+        self.bt = self.BTreeFactory()
+        for k in self.keys:
+            self.bt[k] = -k
+
+    def tearDown(self):
+        del self.bt
+
+    def testNeighbors(self):
+        bt = self.bt
+        self.assertEqual(bt.ceiling(10), 10)
+        self.assertEqual(bt.ceiling(11), 12)
+        self.assertEqual(bt.higher(10), 12)
+        self.assertEqual(bt.floor(10), 10)
+        self.assertEqual(bt.floor(11), 10)
+        self.assertEqual(bt.lower(10), 8)
+
+    def testNeighborsAtEnds(self):
+        bt = self.bt
+        last = self.keys[-1]
+        self.assertEqual(bt.ceiling(-1), 0)
+        self.assertEqual(bt.floor(last+1), last)
+        self.assertEqual(bt.higher(last, None), None)
+        self.assertEqual(bt.lower(0, None), None)
+        self.assertRaises(KeyError, bt.floor, -1)
+
+    def testRange(self):
+        for lo, hi in [(None, None), (10, 100), (11, 11), (11, 13), (-5, 50000)]:
+            expected = [(k, -k) for k in self.keys 
+                    if (lo is None or lo <= k) and (hi is None or k < hi)]
+            self.assertEqual(list(self.bt.irange(lo, hi)), expected)
+            self.assertEqual(list(self.bt.irange(lo, hi, reverse=True)), expected[::-1])
+
+    def testCursor(self):
+        cursor = self.bt.cursor(101)
+        self.assertEqual(cursor.getItem(), (102, -102))
+        self.failUnless(cursor.moveNext())
+        self.assertEqual(cursor.getKey(), 104)
+        cursor.movePrev(); cursor.movePrev()
+        self.assertEqual(cursor.getKey(), 100)
+
+        cursor.seekLast()
+        self.assertEqual(cursor.getKey(), self.keys[-1])
+        self.failIf(cursor.moveNext())
+        self.failIf(cursor.isValid())
+
+    def testCursorStreams(self):
+        cursor = self.bt.cursor()
+        self.assertEqual([k for k,v in cursor.iterForward()], self.keys)
+        cursor.seekLast()
+        self.assertEqual([k for k,v in cursor.iterBackward()], self.keys[::-1])
+
+class TestBTreeRangeClassic(TestBTreeRange):
+    BTreeFactory = btree.BTreeClassic
+
+class TestBTreeRange16x64(TestBTreeRange):
+    BTreeFactory = btreeN.BTree16x64
+
+class TestBTreeRangeEmpty(unittest.TestCase):
+    def testEmpty(self):
+        bt = btree.BTree()
+        self.assertEqual(list(bt.irange()), [])
+        self.assertEqual(bt.ceiling(0, None), None)
+        self.failIf(bt.cursor().isValid())
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()
+
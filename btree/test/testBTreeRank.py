@@ -0,0 +1,87 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+import random
+import pickle
+from TG.collections.btree import btree
+from TG.collections.btree import btreeN
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class TestBTreeRank(unittest.TestCase):
+    BTreeFactory = btree.BTree
+    count = 1024
+
+    def setUp(self):
+        self.keys = range(0, 2*self.count, 2)
+        self.bt = self.BTreeFactory()
+        for k in self.keys:
+            self.bt[k] = -k
+
+    def tearDown(self):
+        del self.bt
+
+    def testLen(self):
+        bt = self.bt
+        self.assertEqual(len(bt), self.count)
+        bt[1] = 1
+        bt[2] = 2
+        self.assertEqual(len(bt), self.count+1)
+        del bt[0]
+        bt.pop(-1, None)
+        self.assertEqual(len(bt), self.count)
+
+    def testRank(self):
+        bt = self.bt
+        for idx, k in enumerate(self.keys):
+            self.assertEqual(bt.rank(k), idx)
+            self.assertEqual(bt.rank(k+1), idx+1)
+        self.assertEqual(bt.rank(-1), 0)
+
+    def testSelect(self):
+        bt = self.bt
+        for idx, k in enumerate(self.keys):
+            self.assertEqual(bt.select(idx), (k, -k))
+        self.assertEqual(bt.select(-1)[0], self.keys[-1])
+        self.assertRaises(IndexError, bt.select, self.count)
+
+    def testChurn(self):
+        bt = self.bt
+        rand = random.Random(42)
+        expected = dict((k, -k) for k in self.keys)
+        for x in xrange(4*self.count):
+            k = rand.randrange(2*self.count)
+            if rand.random() < 0.5:
+                bt[k] = expected[k] = x
+            else:
+                bt.pop(k, None)
+                expected.pop(k, None)
+
+        keys = sorted(expected)
+        self.assertEqual(len(bt), len(keys))
+        for idx in xrange(0, len(keys), 7):
+            self.assertEqual(bt.select(idx)[0], keys[idx])
+            self.assertEqual(bt.rank(keys[idx]), idx)
+
+    def testPickled(self):
+        bt = pickle.loads(pickle.dumps(self.bt, 2))
+        self.assertEqual(len(bt), self.count)
+        self.assertEqual(bt.select(10), (20, -20))
+
+class TestBTreeRankClassic(TestBTreeRank):
+    BTreeFactory = btree.BTreeClassic
+
+class TestBTreeRank16x64(TestBTreeRank):
+    BTreeFactory = btreeN.BTree16x64
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()
+
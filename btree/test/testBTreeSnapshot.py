@@ -0,0 +1,83 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+import pickle
+from TG.collections.btree import btree
+from TG.collections.btree import btreeN
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class TestBTreeSnapshot(unittest.TestCase):
+    BTreeFactory = btree.BTree
+    count = 1024
+
+    def setUp(self):
+        self.data = [(x, x) for x in xrange(self.count)]
+        self.bt = self.BTreeFactory(self.data)
+
+    def tearDown(self):
+        del self.bt
+
+    def testSharesStructure(self):
+        snap = self.bt.snapshot()
+        self.failUnless(snap._getRootNode() is self.bt._getRootNode())
+
+    def testWriterDoesNotDisturbSnapshot(self):
+        bt = self.bt
+        snap = bt.snapshot()
+        for k in xrange(0, self.count, 3):
+            del bt[k]
+        for k in xrange(self.count, 2*self.count):
+            bt[k] = -k
+
+        self.assertEqual(snap.items(), self.data)
+        self.assertEqual(len(snap), self.count)
+        self.assertEqual(len(bt), 2*self.count - len(xrange(0, self.count, 3)))
+
+    def testSnapshotWritesDoNotDisturbTree(self):
+        snap = self.bt.snapshot()
+        for k,v in self.data:
+            snap[k] = 'changed'
+        snap.clear()
+        self.assertEqual(self.bt.items(), self.data)
+
+    def testIterateWhileWriting(self):
+        bt = self.bt
+        snap = bt.snapshot()
+        seen = []
+        for k, v in snap.iteritems():
+            seen.append((k, v))
+            bt.pop(k)
+            bt[k + self.count] = v
+        self.assertEqual(seen, self.data)
+
+    def testCopy(self):
+        other = self.bt.copy()
+        other[-1] = -1
+        self.failIf(-1 in self.bt)
+        self.failUnless(-1 in other)
+
+    def testPickleAfterSnapshot(self):
+        snap = self.bt.snapshot()
+        bt = pickle.loads(pickle.dumps(snap))
+        bt[-1] = -1
+        self.assertEqual(snap.items(), self.data)
+        self.assertEqual(len(bt), self.count+1)
+
+class TestBTreeSnapshotClassic(TestBTreeSnapshot):
+    BTreeFactory = btree.BTreeClassic
+
+class TestBTreeSnapshot16x64(TestBTreeSnapshot):
+    BTreeFactory = btreeN.BTree16x64
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()
+
@@ -0,0 +1,193 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+import pickle
+from TG.collections.btree import btree
+from TG.collections.btree import btreeN
+from TG.collections.btree import btreeProfile
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class TestBTreeStats(unittest.TestCase):
+    BTreeFactory = btree.BTree
+    count = 2000
+
+    def setUp(self):
+        self.bt = self.BTreeFactory()
+        for k in xrange(self.count):
+            self.bt[k] = k
+
+    def tearDown(self):
+        del self.bt
+
+    def testStructure(self):
+        bt = self.bt
+        stats = bt.stats()
+        levels = {}
+        for level, node in bt.iterNodes(0):
+            levels.setdefault(level, []).append(len(node))
+
+        self.assertEqual(stats['count'], self.count)
+        self.assertEqual(stats['degree'], bt.getDegree())
+        self.assertEqual(stats['height'], len(levels))
+        self.assertEqual(stats['levelNodes'], [len(levels[l]) for l in sorted(levels)])
+        self.assertEqual(stats['levelItems'], [sum(levels[l]) for l in sorted(levels)])
+        self.assertEqual(stats['nodes'], sum(stats['levelNodes']))
+        self.assertEqual(sum(stats['levelItems']), self.count)
+        self.assertEqual(sum(stats['fillHistogram']), stats['nodes'])
+        self.assertEqual(stats['levelNodes'][0], 1)
+        self.failUnless(0 < stats['meanFill'] <= 1)
+
+    def testEmpty(self):
+        stats = self.BTreeFactory().stats()
+        self.assertEqual(stats['height'], 1)
+        self.assertEqual(stats['levelItems'], [0])
+        self.assertEqual(stats['fillHistogram'][0], 1)
+
+    def testSplitCounts(self):
+        # each split adds a node, and each root split adds a new root too
+        stats = self.bt.stats()
+        adjustments = stats['adjustments']
+        self.assertEqual(adjustments['split'], stats['nodes'] - stats['height'])
+        self.assertEqual(adjustments['combine'], 0)
+        self.assertEqual(adjustments['rotate'], 0)
+
+    def testBalanceCounts(self):
+        bt = self.bt
+        bt.resetAdjustmentCounts()
+        for k in xrange(self.count):
+            if k % 8:
+                del bt[k]
+        adjustments = bt.getAdjustmentCounts()
+        self.failUnless(adjustments['combine'] > 0)
+        self.failUnless(adjustments['rotate'] > 0)
+        self.assertEqual(adjustments['split'], 0)
+
+        for k in xrange(0, self.count, 8):
+            del bt[k]
+        adjustments = bt.getAdjustmentCounts()
+        self.failUnless(adjustments['collapse'] > 0)
+        self.assertEqual(bt.stats()['nodes'], 1)
+
+    def testCountsNotShared(self):
+        snap = self.bt.snapshot()
+        self.assertEqual(snap.getAdjustmentCounts()['split'], 0)
+        restored = pickle.loads(pickle.dumps(self.bt, 2))
+        self.assertEqual(restored.getAdjustmentCounts()['split'], 0)
+        self.failUnless(self.bt.getAdjustmentCounts()['split'] > 0)
+
+class TestBTreeStatsClassic(TestBTreeStats):
+    BTreeFactory = btree.BTreeClassic
+
+class TestBTreeStats16x64(TestBTreeStats):
+    BTreeFactory = btreeN.BTree16x64
+    count = 10000
+
+class TestBTreeStatsIntItems(TestBTreeStats):
+    BTreeFactory = btree.BTreeIntItems
+    count = 10000
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class TestBTreeProfiler(unittest.TestCase):
+    BTreeFactory = btree.BTree
+    count = 500
+
+    def testTimings(self):
+        bt = self.BTreeFactory()
+        profiler = btreeProfile.BTreeProfiler(bt)
+        with profiler:
+            for k in xrange(self.count):
+                bt[k] = k
+            for k in xrange(self.count):
+                del bt[k]
+
+        report = profiler.report()
+        self.assertEqual(report['_splitFullPathNodes']['calls'], self.count)
+        self.assertEqual(report['_balancePathNodes']['calls'], self.count)
+        self.failUnless(report['keyCmpCalls'] > self.count)
+        self.assertEqual(len(bt), 0)
+
+    def testDetachRestores(self):
+        bt = self.BTreeFactory()
+        profiler = btreeProfile.BTreeProfiler(bt)
+        profiler.attach()
+        self.failUnless(profiler.isAttached())
+        bt[1] = 1
+        profiler.detach()
+        self.assertEqual(vars(bt).keys(), ['_rootNode'])
+        self.failUnless(bt.keyCmp is cmp)
+
+        calls = profiler.report()['keyCmpCalls']
+        bt[2] = 2
+        self.assertEqual(profiler.report()['keyCmpCalls'], calls)
+        self.assertEqual(pickle.loads(pickle.dumps(bt)).items(), [(1, 1), (2, 2)])
+
+    def testCustomKeyCmp(self):
+        reverseCmp = lambda a, b: cmp(b, a)
+        bt = self.BTreeFactory()
+        bt.setKeyCmp(reverseCmp)
+        with btreeProfile.BTreeProfiler(bt) as profiler:
+            for k in xrange(self.count):
+                bt[k] = k
+        self.failUnless(bt.keyCmp is reverseCmp)
+        self.failUnless(profiler.report()['keyCmpCalls'] > 0)
+        self.assertEqual(bt.keys(), range(self.count-1, -1, -1))
+
+    def testCopiesUnhooked(self):
+        bt = self.BTreeFactory()
+        for k in xrange(self.count):
+            bt[k] = k
+        with btreeProfile.BTreeProfiler(bt) as profiler:
+            copy = bt.copy()
+            for k in xrange(self.count, 2*self.count):
+                copy[k] = k
+            for k in xrange(self.count//2):
+                del copy[k]
+            self.assertEqual(copy.keys(), range(self.count//2, 2*self.count))
+            self.assertEqual(bt.keys(), range(self.count))
+            self.assertEqual(vars(copy).get('keyCmp'), None)
+            self.assertEqual(profiler.report()['_splitFullPathNodes']['calls'], 0)
+
+            self.assertEqual(bt.deleteRange(100, 200), 100)
+            expected = range(100) + range(200, self.count)
+            self.assertEqual(bt.keys(), expected)
+
+            left, right = bt.splitAt(300)
+            self.assertEqual(left.keys(), [k for k in expected if k < 300])
+            self.assertEqual(right.keys(), [k for k in expected if k >= 300])
+            left[1000] = 1000
+            del right[400]
+            self.assertEqual(bt.keys(), expected)
+
+            merged = self.BTreeFactory.merge(bt, copy)
+            self.assertEqual(merged.keys(), sorted(set(expected) | set(copy.keys())))
+            self.assertEqual(bt.keys(), expected)
+
+            bt[self.count] = 0
+            self.assertEqual(len(bt), len(expected)+1)
+        self.failUnless(profiler.report()['_splitFullPathNodes']['calls'] > 0)
+
+    def testReset(self):
+        bt = self.BTreeFactory()
+        with btreeProfile.BTreeProfiler(bt, countKeyCmp=False) as profiler:
+            bt[1] = 1
+            self.failUnless(bt.keyCmp is cmp)
+            profiler.reset()
+            report = profiler.report()
+        self.assertEqual(report['keyCmpCalls'], 0)
+        self.assertEqual(report['_splitFullPathNodes']['calls'], 0)
+
+class TestBTreeProfiler2(TestBTreeProfiler):
+    BTreeFactory = btreeN.BTree2
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import unittest
+import pickle
+from cStringIO import StringIO
+from testBTree import TestBTreeDataExtensive
+from TG.collections.btree import btree
+from TG.collections.btree import btreeN
+from TG.collections.btree import btreeStream
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class TestBTreeStream(TestBTreeDataExtensive):
+    count = 3000
+
+    def testRoundTrip(self):
+        data = btreeStream.dumps(self.bt)
+        bt = btreeStream.loads(data)
+        self.assertEqual(type(bt), type(self.bt))
+        self.assertEqual(bt.getDegree(), self.bt.getDegree())
+        self.assertEqual(len(bt), len(self.bt))
+        self.assertEqual(bt.items(), self.bt.items())
+
+    def testEditAfterLoad(self):
+        bt = btreeStream.loads(btreeStream.dumps(self.bt))
+        for k in xrange(0, self.count, 3):
+            del bt[k]
+        bt[-1] = -1
+        self.assertEqual(bt.keys(), [-1] + [k for k in xrange(self.count) if k % 3])
+
+    def testEmpty(self):
+        bt = btreeStream.loads(btreeStream.dumps(self.BTreeFactory()))
+        self.assertEqual(bt.items(), [])
+        bt[1] = 2
+        self.assertEqual(bt.items(), [(1, 2)])
+
+    def testMultipleTrees(self):
+        fileobj = StringIO()
+        btreeStream.dump(self.bt, fileobj)
+        other = self.BTreeFactory.fromSortedItems((k, 2*k) for k in xrange(17))
+        btreeStream.dump(other, fileobj)
+
+        fileobj.seek(0)
+        self.assertEqual(btreeStream.load(fileobj).items(), self.bt.items())
+        self.assertEqual(btreeStream.load(fileobj).items(), other.items())
+        self.assertEqual(fileobj.read(), '')
+
+    def testTruncated(self):
+        data = btreeStream.dumps(self.bt)
+        self.assertRaises(Exception, btreeStream.loads, data[:len(data)//2])
+
+    def testUnsortedRejected(self):
+        fileobj = StringIO()
+        pickler = pickle.Pickler(fileobj, 2)
+        pickler.dump({
+            'version': btreeStream.streamVersion,
+            'factory': type(self.bt),
+            'degree': self.bt.getDegree(),
+            'count': 3,
+            })
+        pickler.dump([(3, 1, 2), (3, 1, 2)])
+        self.assertRaises(ValueError, btreeStream.loads, fileobj.getvalue())
+
+class TestBTreeStreamClassic(TestBTreeStream):
+    BTreeFactory = btree.BTreeClassic
+
+class TestBTreeStream16x64(TestBTreeStream):
+    BTreeFactory = btreeN.BTree16x64
+
+class TestBTreeStreamIntItems(TestBTreeStream):
+    BTreeFactory = btree.BTreeIntItems
+
+class TestBTreeStreamDegree(TestBTreeStream):
+    count = 2000
+
+    def setUp(self):
+        TestBTreeStream.setUp(self)
+        self.bt = self.BTreeFactory()
+        self.bt.setDegree(3, 7)
+        self.bt.update(self.data)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()
@@ -18,6 +18,16 @@
 splitThreshold = 28
 sentinal = object()
 
+if hasattr(int, 'bit_count'):
+    def popCount(i):
+        return i.bit_count()
+else:
+    # bitmaps are 32 bits, so two lookups in a 16 bit table count them
+    # without building the string bin() returns
+    _popCountTable = bytearray(bin(i).count('1') for i in range(0x10000))
+    def popCount(i, table=_popCountTable):
+        return table[i & 0xffff] + table[i >> 16]
+
 class HashArrayMappedTrie(object):
     hash = staticmethod(hash)
     null = sentinal
@@ -50,16 +60,17 @@ class HashArrayMappedTrie(object):
         if key is None:
             if self.null is sentinal:
                 return default
+            return self.null
 
         root = self.root
         if root is None:
-            return False
+            return default
         return root.find(0, hash(key), key, default)
 
     def without(self, key):
         if key is None:
-            if self.null is not sentinal:
-                del self.null
+            self.null = sentinal
+            return
 
         root = self.root
         if root is not None:
@@ -68,6 +79,7 @@ class HashArrayMappedTrie(object):
     def assoc(self, key, value):
         if key is None:
             self.null = value
+            return
 
         root = self.root
         added = []
@@ -112,6 +124,9 @@ HAMT = HashArrayMappedTrie
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 class AbstractNode(object):
+    # nodes are slotted, as a large trie holds hundreds of thousands
+    __slots__ = ()
+
     def assoc(self, shift, keyHash, key, value, added):
         raise NotImplementedError('Subclass Responsibility: %r' % (self,))
     def without(self, shift, keyHash, key):
@@ -119,10 +134,17 @@ class AbstractNode(object):
     def find(self, shift, keyHash, key, default):
         raise NotImplementedError('Subclass Responsibility: %r' % (self,))
 
+    def singleItem(self):
+        """Returns (key, value) when the node holds just one item and no
+        sub nodes, so its parent can hold the item instead"""
+        return None
+
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 class ArrayNode(AbstractNode):
     """These act as branch nodes in the tree"""
+    __slots__ = ('count', 'children')
+
     def __init__(self, count, children):
         self.count = count
         self.children = children
@@ -133,6 +155,9 @@ class ArrayNode(AbstractNode):
             self.__class__.__module__, self.__class__.__name__, 
             nodeCount, self.count)
 
+    def __len__(self):
+        return sum(len(node) for node in self.iterNodes())
+
     def iterkeys(self):
         for node in self.children:
             if node is not None:
@@ -155,10 +180,10 @@ class ArrayNode(AbstractNode):
     def assoc(self, shift, keyHash, key, value, added):
         idx = (keyHash >> shift) & 0x1f
         node = self.children[idx]
-        children = self.children[:]
         if node is None:
             node = BitmapIndexedNode(0, []).assoc(shift+5, keyHash, key, value, added)
             self.children[idx] = node
+            self.count += 1
             return self
 
         newNode = node.assoc(shift+5, keyHash, key, value, added)
@@ -174,10 +199,12 @@ class ArrayNode(AbstractNode):
         if newNode is node:
             return self
         elif newNode is None:
-            if self.coutn <= 8: # why 8?
+            if self.count <= 8:
+                # few enough children to pack into a bitmap node
                 return self._pack(idx)
 
             self.children[idx] = newNode
+            self.count -= 1
             return self
         else:
             self.children[idx] = newNode
@@ -188,28 +215,38 @@ class ArrayNode(AbstractNode):
         node = self.children[idx]
         if node is not None:
             return node.find(shift+5, keyHash, key, default)
+        return default
 
     def _pack(self, idx):
-        bitmap = 0
+        datamap = nodemap = 0
         entries = []
-        children = self.children
-        for i in range(len(children),-1,-1):
-            bitmap <<= 1
-            if i != idx:
-                node = children[i]
-                if node is not None:
-                    bitmap |= 1
-                    entries.append(node)
-        return BitmapIndexedNode(bitmap, entries)
+        nodes = []
+        for i, node in enumerate(self.children):
+            if i != idx and node is not None:
+                item = node.singleItem()
+                if item is not None:
+                    datamap |= 1 << i
+                    entries.extend(item)
+                else:
+                    nodemap |= 1 << i
+                    nodes.append(node)
+        return BitmapIndexedNode(datamap, entries, nodemap, nodes or None)
 
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 class BitmapIndexedNode(AbstractNode):
-    """These are the primary leaf nodes in the system"""
-    def __init__(self, bitmap, entries):
-        self.bitmap = bitmap
+    """These are the primary leaf nodes in the system.  Items are held in
+    entries as key, value pairs, in datamap bit order.  Sub nodes are held
+    apart in nodes, in nodemap bit order, and nodes is None until there
+    are some"""
+    __slots__ = ('datamap', 'entries', 'nodemap', 'nodes')
+
+    def __init__(self, datamap, entries, nodemap=0, nodes=None):
+        self.datamap = datamap
         self.entries = entries
+        self.nodemap = nodemap
+        self.nodes = nodes
 
     def __repr__(self):
         return "<%s.%s %s>"%(
@@ -217,38 +254,42 @@ class BitmapIndexedNode(AbstractNode):
             bin(self.bitmap)[2:].zfill(32))
 
     def __len__(self):
-        return sum(k is not sentinal for k in self.entries[::2])
+        result = len(self.entries)//2
+        if self.nodes is not None:
+            result += sum(len(node) for node in self.nodes)
+        return result
+
+    @property
+    def bitmap(self):
+        return self.datamap | self.nodemap
 
     def iterkeys(self):
-        e = self.entries
-        for i in range(0, len(e), 2):
-            if e[i] is not sentinal:
-                yield e[i]
+        for k, v in self.iteritems():
+            yield k
 
     def itervalues(self):
-        e = self.entries
-        for i in range(0, len(e), 2):
-            if e[i] is not sentinal:
-                yield e[i+1]
+        for k, v in self.iteritems():
+            yield v
 
     def iteritems(self):
         e = self.entries
         for i in range(0, len(e), 2):
-            if e[i] is not sentinal:
-                yield (e[i], e[i+1])
-            else:
-                for kv in e[i+1].iteritems():
+            yield (e[i], e[i+1])
+        if self.nodes is not None:
+            for node in self.nodes:
+                for kv in node.iteritems():
                     yield kv
 
     def iterNodes(self):
-        e = self.entries
-        for i in range(0, len(e), 2):
-            if e[i] is sentinal:
-                yield e[i+1]
+        return iter(self.nodes or ())
+
+    def singleItem(self):
+        if self.nodes is None and len(self.entries) == 2:
+            return tuple(self.entries)
 
     @classmethod
     def fromNode(klass, shift, keyHash, node):
-        return klass(klass.bitPos(keyHash, shift), [None, node])
+        return klass(0, [], klass.bitPos(keyHash, shift), [node])
 
     @staticmethod
     def bitPos(keyHash, shift):
@@ -256,105 +297,130 @@ class BitmapIndexedNode(AbstractNode):
 
     @staticmethod
     def bitCount(i):
-        return bin(i).count('1')
+        return popCount(i)
 
-    def bitIndex(self, bit):
-        i = self.bitmap & (bit-1)
-        return bin(i).count('1')
+    def _insertNode(self, bit, child):
+        nIdx = popCount(self.nodemap & (bit-1))
+        if self.nodes is None:
+            self.nodes = [child]
+        else: self.nodes.insert(nIdx, child)
+        self.nodemap |= bit
+
+    def _removeNode(self, bit, nIdx):
+        del self.nodes[nIdx]
+        if not self.nodes:
+            self.nodes = None
+        self.nodemap ^= bit
 
     def _unpack(self, shift, keyHash, key, value, added):
         entries = self.entries
-        nodes = [None]*32
-        j = 0
-        bitmap = self.bitmap
+        children = [None]*32
+        datamap = self.datamap
+        nodemap = self.nodemap
+        j = k = 0
         for i in range(32):
-            if (bitmap>>i) & 1:
+            if (datamap>>i) & 1:
                 eKey = entries[j]
-                eValue = entries[j+1]
-                if eKey is not None: 
-                    nodes[i] = BitmapIndexedNode(0, []).assoc(shift+5, hash(eKey), eKey, eValue, added)
-                else: nodes[i] = eValue
+                children[i] = BitmapIndexedNode(0, []).assoc(shift+5, hash(eKey), eKey, entries[j+1], [])
                 j += 2
+            elif (nodemap>>i) & 1:
+                children[i] = self.nodes[k]
+                k += 1
 
-        return ArrayNode(j/2, nodes)
+        node = ArrayNode(j//2 + k, children)
+        return node.assoc(shift, keyHash, key, value, added)
 
     def assoc(self, shift, keyHash, key, value, added):
-        bit = self.bitPos(keyHash, shift)
-        idx = 2*self.bitIndex(bit)
-        bitmap = self.bitmap
-        if bitmap & bit:
-            eKey = self.entries[idx]
-            eValue = self.entries[idx+1]
-            if eKey is sentinal:
-                node = eValue.assoc(shift+5, keyHash, key, value, added)
-                if node is not eValue:
-                    self.entries[idx+1] = node
-            elif key == eKey:
-                if value != eValue:
-                    self.entries[idx] = key
-                    self.entries[idx+1] = value
-            else:
-                added.append(True)
-                self.entries[idx] = sentinal
-                self.entries[idx+1] = createNode(shift+5, eKey, eValue, keyHash, key, value)
+        bit = 1 << ((keyHash>>shift)&0x1f)
+        datamap = self.datamap
+        if datamap & bit:
+            idx = 2*popCount(datamap & (bit-1))
+            e = self.entries
+            eKey = e[idx]
+            if key == eKey:
+                e[idx+1] = value
+                return self
+
+            added.append(True)
+            child = createNode(shift+5, eKey, e[idx+1], keyHash, key, value)
+            del e[idx:idx+2]
+            self.datamap = datamap ^ bit
+            self._insertNode(bit, child)
             return self
 
-        else:
-            bc = self.bitCount(bitmap)
-            if bc >= splitThreshold:
-                return self._unpack(shift, keyHash, key, value, added)
-            else:
-                added.append(True)
-                self.bitmap = bitmap|bit
-                self.entries[idx:idx] = [key, value]
-                return self
+        nodemap = self.nodemap
+        if nodemap & bit:
+            nIdx = popCount(nodemap & (bit-1))
+            child = self.nodes[nIdx]
+            newChild = child.assoc(shift+5, keyHash, key, value, added)
+            if newChild is not child:
+                self.nodes[nIdx] = newChild
+            return self
+
+        if popCount(datamap | nodemap) >= splitThreshold:
+            return self._unpack(shift, keyHash, key, value, added)
+
+        added.append(True)
+        idx = 2*popCount(datamap & (bit-1))
+        self.datamap = datamap | bit
+        self.entries[idx:idx] = [key, value]
+        return self
 
     def without(self, shift, keyHash, key):
-        bit = self.bitPos(keyHash, shift)
-        bitmap = self.bitmap
-        if not bitmap & bit:
-            return self
-        idx = 2*self.bitIndex(bit)
-        eKey = self.entries[idx]
-        eValue = self.entries[idx+1]
-        if eKey is sentinal:
-            node = eValue.without(shift+5, keyHash, key)
-            if node is eValue:
-                return self
-            if node != None:
-                self.entries[idx+1] = node
+        bit = 1 << ((keyHash>>shift)&0x1f)
+        datamap = self.datamap
+        nodemap = self.nodemap
+        if datamap & bit:
+            idx = 2*popCount(datamap & (bit-1))
+            if not (self.entries[idx] == key):
                 return self
-            if bitmap == bit:
+            if datamap == bit and not nodemap:
                 return None
-            else:
-                self.bitmap = bitmap ^ bit
-                del self.entries[idx:idx+2]
+            self.datamap = datamap ^ bit
+            del self.entries[idx:idx+2]
+            return self
+
+        elif nodemap & bit:
+            nIdx = popCount(nodemap & (bit-1))
+            child = self.nodes[nIdx]
+            newChild = child.without(shift+5, keyHash, key)
+            if newChild is None:
+                if nodemap == bit and not datamap:
+                    return None
+                self._removeNode(bit, nIdx)
                 return self
 
-        elif eKey == key:
-            self.bitmap = bitmap ^ bit
-            del self.entries[idx:idx+2]
+            item = newChild.singleItem()
+            if item is not None:
+                self._removeNode(bit, nIdx)
+                idx = 2*popCount(datamap & (bit-1))
+                self.entries[idx:idx] = item
+                self.datamap = datamap | bit
+            else: self.nodes[nIdx] = newChild
             return self
 
         return self
 
     def find(self, shift, keyHash, key, default):
-        bit = self.bitPos(keyHash, shift)
-        if not self.bitmap & bit:
-            return default
-        idx = 2*self.bitIndex(bit)
-        eKey = self.entries[idx]
-        eValue = self.entries[idx+1]
-        if eKey is sentinal:
-            return eValue.find(shift+5, keyHash, key, default)
-        elif eKey == key:
-            return eValue
-        else:
+        bit = 1 << ((keyHash>>shift)&0x1f)
+        datamap = self.datamap
+        if datamap & bit:
+            idx = 2*popCount(datamap & (bit-1))
+            if self.entries[idx] == key:
+                return self.entries[idx+1]
             return default
 
+        nodemap = self.nodemap
+        if nodemap & bit:
+            child = self.nodes[popCount(nodemap & (bit-1))]
+            return child.find(shift+5, keyHash, key, default)
+        return default
+
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 class CollisionNode(AbstractNode):
+    __slots__ = ('keyHash', 'entries')
+
     def __init__(self, keyHash, entries):
         self.keyHash = keyHash
         self.entries = entries
@@ -365,7 +431,7 @@ class CollisionNode(AbstractNode):
             len(self.entries))
 
     def __len__(self):
-        return len(self.entries)/2
+        return len(self.entries)//2
 
     def iterkeys(self):
         return iter(self.entries[0::2])
@@ -377,6 +443,10 @@ class CollisionNode(AbstractNode):
     def iterNodes(self):
         return iter([])
 
+    def singleItem(self):
+        if len(self.entries) == 2:
+            return tuple(self.entries)
+
     def assoc(self, shift, keyHash, key, value, added):
         if (keyHash == self.keyHash):
             idx = self._findIndex(key)
@@ -389,11 +459,14 @@ class CollisionNode(AbstractNode):
             return self
 
         node = BitmapIndexedNode.fromNode(shift, self.keyHash, self)
-        return node.assoc(shift, keyHash, key, value, addded)
+        return node.assoc(shift, keyHash, key, value, added)
 
     def without(self, shift, keyHash, key):
         if (keyHash != self.keyHash):
             return self
+        idx = self._findIndex(key)
+        if idx is None:
+            return self
 
         if len(self) > 1:
             del self.entries[idx:idx+2]
@@ -406,14 +479,13 @@ class CollisionNode(AbstractNode):
         idx = self._findIndex(key)
         if idx is None:
             return default
-        elif key == self.entries[idx]:
-            return self.entries[idx+1]
-        else: return default
+        return self.entries[idx+1]
     
     def _findIndex(self, key):
-        idx = self.entries.index(key)
-        if idx&1 == 0: # assure it is a key
-            return idx
+        e = self.entries
+        for idx in range(0, len(e), 2):
+            if e[idx] == key:
+                return idx
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
@@ -11,27 +11,45 @@
 #~ Imports 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+from hamt import popCount
+
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 #~ Definitions 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+splitThreshold = 28
 sentinal = object()
 emptyBitmapNode = None
 
 class PersistentHashArrayMappedTrie(object):
+    """Hash trie whose nodes are never changed once shared.
+
+    Changes through a plain trie copy each node along the changed path.
+    transient() returns a trie that owns the nodes it copies, through its
+    _editToken, and changes those in place; persistent() ends the batch,
+    returning a plain trie of the result.  Like the BTree edit tokens, a
+    node is only modified in place when its owner is the editing trie's
+    token, so tries sharing nodes never see each other's changes.
+
+    Tries returned by persistent(), with_(), without_() and update_() are
+    values: they refuse changes in place, and only they are hashable."""
+
     hash = staticmethod(hash)
     null = sentinal
     root = None
+    count = 0
+    _editToken = None
+    _frozen = False
 
-    def __init__(self, root=None, null=sentinal):
+    def __init__(self, root=None, null=sentinal, count=None):
         self.root = root
         self.null = null
+        if count is None:
+            count = sum(1 for e in self.iteritems())
+        self.count = count
 
     def __len__(self):
-        r = int(self.null is not sentinal)
-        if self.root is not None:
-            r += len(self.root)
-        return r
+        return self.count
 
     def __contains__(self, key):
         return self.get(key, sentinal) is not sentinal
@@ -50,31 +68,158 @@ class PersistentHashArrayMappedTrie(object):
         if key is None:
             if self.null is sentinal:
                 return default
+            return self.null
 
         root = self.root
         if root is None:
-            return False
+            return default
         return root.find(0, hash(key), key, default)
 
+    def _checkChangeable(self):
+        if self._frozen:
+            raise TypeError("Persistent tries cannot be changed in place; "
+                    "use with_(), without_() or transient()")
+
     def without(self, key):
+        self._checkChangeable()
         if key is None:
             if self.null is not sentinal:
-                del self.null
+                self.null = sentinal
+                self.count -= 1
+            return
 
         root = self.root
         if root is not None:
-            self.root = root.without(0, hash(key), key)
+            removed = []
+            self.root = root.without(0, hash(key), key, removed, self._editToken)
+            self.count -= len(removed)
 
     def assoc(self, key, value):
+        self._checkChangeable()
         if key is None:
+            if self.null is sentinal:
+                self.count += 1
             self.null = value
+            return
 
         root = self.root
         added = []
         if root is None:
             root = emptyBitmapNode
-        self.root = root.assoc(0, hash(key), key, value, added)
+        self.root = root.assoc(0, hash(key), key, value, added, self._editToken)
+        self.count += len(added)
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Transients
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def isTransient(self):
+        return self._editToken is not None
+
+    def transient(self):
+        """Returns a trie with the same items, changing the nodes it copies
+        in place until persistent() is called.  This trie is unaffected"""
+        result = self._copy()
+        if self._editToken is not None:
+            self._editToken = object()
+        result._editToken = object()
+        return result
+
+    def persistent(self):
+        """Returns a persistent trie with this trie's items, which refuses
+        changes in place.  Nodes changed in place so far become shared, so
+        this trie copies them again before any further change"""
+        result = self._release()
+        result._frozen = True
+        return result
+
+    def _release(self):
+        # a changeable plain trie whose nodes are shared with this one
+        result = self._copy()
+        if self._editToken is not None:
+            self._editToken = object()
+        return result
+
+    def _copy(self):
+        result = self.__class__.__new__(self.__class__)
+        result.root = self.root
+        result.null = self.null
+        result.count = self.count
+        return result
+
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    #~ Values
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def with_(self, key, value):
+        """Returns a new trie with key set to value, sharing every node off
+        the changed path with this trie"""
+        result = self._release()
+        result.assoc(key, value)
+        result._frozen = True
+        return result
+
+    def without_(self, key):
+        """Returns a new trie without key, sharing every node off the
+        changed path with this trie"""
+        result = self._release()
+        result.without(key)
+        result._frozen = True
+        return result
+
+    def update_(self, other=None, **kwargs):
+        """Returns a new trie with the items of other and kwargs set, as
+        for dict.update.  The batch is applied through a transient"""
+        result = self.transient()
+        if other is None:
+            pass
+        elif hasattr(other, 'iteritems'):
+            for k, v in other.iteritems():
+                result.assoc(k, v)
+        elif hasattr(other, 'keys'):
+            for k in other.keys():
+                result.assoc(k, other[k])
+        else:
+            for k, v in other:
+                result.assoc(k, v)
+
+        for k, v in kwargs.iteritems():
+            result.assoc(k, v)
+        return result.persistent()
+
+    def __eq__(self, other):
+        if not isinstance(other, PersistentHashArrayMappedTrie):
+            return NotImplemented
+        if self is other:
+            return True
+        if self.count != other.count:
+            return False
+        if self.null is not other.null:
+            if (self.null is sentinal) or (other.null is sentinal):
+                return False
+            if self.null != other.null:
+                return False
+        return nodesEqual(self.root, other.root)
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __hash__(self):
+        """Hash of the items, independent of the trie's shape.  Each node
+        caches its hash, so versions sharing nodes only hash what differs.
+        Tries that can still change in place are unhashable"""
+        if not self._frozen:
+            raise TypeError("Only persistent tries are hashable")
+        result = 0
+        if self.null is not sentinal:
+            result ^= hash((None, self.null))
+        if self.root is not None:
+            result ^= self.root.hashItems()
+        return result
 
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
     def iterkeys(self):
         if self.null is not sentinal:
@@ -112,20 +257,58 @@ PHAMT = PersistentHashArrayMappedTrie
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 class AbstractNode(object):
-    def assoc(self, shift, keyHash, key, value, added):
+    # owner is the edit token of the transient trie allowed to modify a
+    # node in place, or None once the node may be shared.  Nodes are
+    # slotted, as a large trie holds hundreds of thousands of them
+    __slots__ = ()
+
+    def assoc(self, shift, keyHash, key, value, added, owner=None):
         raise NotImplementedError('Subclass Responsibility: %r' % (self,))
-    def without(self, shift, keyHash, key):
+    def without(self, shift, keyHash, key, removed, owner=None):
         raise NotImplementedError('Subclass Responsibility: %r' % (self,))
     def find(self, shift, keyHash, key, default):
         raise NotImplementedError('Subclass Responsibility: %r' % (self,))
 
+    def singleItem(self):
+        """Returns (key, value) when the node holds just one item and no
+        sub nodes, so its parent can hold the item instead"""
+        return None
+
+    def hashItems(self):
+        """Returns the xor of hash((key, value)) over the node's items,
+        cached on the node"""
+        result = self._hash
+        if result is None:
+            # only reached from tries that are not transient, whose nodes
+            # never change again
+            result = self._hash = self._hashItems()
+        return result
+    def _hashItems(self):
+        result = 0
+        for item in self.iteritems():
+            result ^= hash(item)
+        return result
+
+    def _editable(self, owner):
+        """Returns self when owner may modify it in place, and otherwise
+        a copy owned by owner"""
+        if owner is not None and self.owner is owner:
+            return self
+        return self._copy(owner)
+    def _copy(self, owner):
+        raise NotImplementedError('Subclass Responsibility: %r' % (self,))
+
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 class ArrayNode(AbstractNode):
     """These act as branch nodes in the tree"""
-    def __init__(self, count, children):
+    __slots__ = ('count', 'children', 'owner', '_hash')
+
+    def __init__(self, count, children, owner=None):
         self.count = count
         self.children = children
+        self.owner = owner
+        self._hash = None
 
     def __repr__(self):
         nodeCount = sum(c is not None for c in self.children)
@@ -134,7 +317,7 @@ class ArrayNode(AbstractNode):
             nodeCount, self.count)
 
     def __len__(self):
-        return self.count
+        return sum(len(node) for node in self.iterNodes())
 
     def iterkeys(self):
         for node in self.children:
@@ -155,65 +338,87 @@ class ArrayNode(AbstractNode):
     def iterNodes(self):
         return (node for node in self.children if node is not None)
 
-    def assoc(self, shift, keyHash, key, value, added):
+    def _copy(self, owner):
+        return type(self)(self.count, self.children[:], owner)
+
+    def assoc(self, shift, keyHash, key, value, added, owner=None):
         idx = (keyHash >> shift) & 0x1f
         node = self.children[idx]
-        children = self.children[:]
         if node is None:
-            node = emptyBitmapNode.assoc(shift+5, keyHash, key, value, added)
-            return self._clone(+1, idx, node)
+            node = emptyBitmapNode.assoc(shift+5, keyHash, key, value, added, owner)
+            return self._setChild(+1, idx, node, owner)
 
-        newNode = node.assoc(shift+5, keyHash, key, value, added)
+        newNode = node.assoc(shift+5, keyHash, key, value, added, owner)
         if newNode is node:
             return self
-        return self._clone(0, idx, newNode)
+        return self._setChild(0, idx, newNode, owner)
 
-    def without(self, shift, keyHash, key):
+    def without(self, shift, keyHash, key, removed, owner=None):
         idx = (keyHash >> shift) & 0x1f
         node = self.children[idx]
         if node is None: return self
-        newNode = node.without(shift+5, keyHash, key)
+        newNode = node.without(shift+5, keyHash, key, removed, owner)
         if newNode is node:
             return self
         elif newNode is None:
-            if self.coutn <= 8: # why 8?
-                return self._pack(idx)
-            return self._clone(-1, idx, newNode)
+            if self.count <= 8:
+                # few enough children to pack into a bitmap node
+                return self._pack(idx, owner)
+            return self._setChild(-1, idx, newNode, owner)
         else:
-            return self._clone(0, idx, newNode)
+            return self._setChild(0, idx, newNode, owner)
 
     def find(self, shift, keyHash, key, default):
         idx = (keyHash >> shift) & 0x1f
         node = self.children[idx]
         if node is not None:
             return node.find(shift+5, keyHash, key, default)
-
-    def _clone(self, delta, idx, childNode):
-        children = self.children[:]
-        children[idx] = childNode
-        return type(self)(self.count+delta, children)
-
-    def _pack(self, idx):
-        bitmap = 0
+        return default
+
+    def _setChild(self, delta, idx, childNode, owner):
+        node = self._editable(owner)
+        node.children[idx] = childNode
+        node.count += delta
+        return node
+
+    def _hashItems(self):
+        result = 0
+        for node in self.iterNodes():
+            result ^= node.hashItems()
+        return result
+
+    def _pack(self, idx, owner):
+        datamap = nodemap = 0
         entries = []
-        children = self.children
-        for i in range(len(children),-1,-1):
-            bitmap <<= 1
-            if i != idx:
-                node = children[i]
-                if node is not None:
-                    bitmap |= 1
-                    entries.append(node)
-        return BitmapIndexedNode(bitmap, entries)
+        nodes = []
+        for i, node in enumerate(self.children):
+            if i != idx and node is not None:
+                item = node.singleItem()
+                if item is not None:
+                    datamap |= 1 << i
+                    entries.extend(item)
+                else:
+                    nodemap |= 1 << i
+                    nodes.append(node)
+        return BitmapIndexedNode(datamap, entries, nodemap, nodes or None, owner)
 
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 class BitmapIndexedNode(AbstractNode):
-    """These are the primary leaf nodes in the system"""
-    def __init__(self, bitmap, entries):
-        self.bitmap = bitmap
+    """These are the primary leaf nodes in the system.  Items are held in
+    entries as key, value pairs, in datamap bit order.  Sub nodes are held
+    apart in nodes, in nodemap bit order, and nodes is None until there
+    are some"""
+    __slots__ = ('datamap', 'entries', 'nodemap', 'nodes', 'owner', '_hash')
+
+    def __init__(self, datamap, entries, nodemap=0, nodes=None, owner=None):
+        self.datamap = datamap
         self.entries = entries
+        self.nodemap = nodemap
+        self.nodes = nodes
+        self.owner = owner
+        self._hash = None
 
     def __repr__(self):
         return "<%s.%s %s>"%(
@@ -221,38 +426,42 @@ class BitmapIndexedNode(AbstractNode):
             bin(self.bitmap)[2:].zfill(32))
 
     def __len__(self):
-        return sum(k is not sentinal for k in self.entries[::2])
+        result = len(self.entries)//2
+        if self.nodes is not None:
+            result += sum(len(node) for node in self.nodes)
+        return result
+
+    @property
+    def bitmap(self):
+        return self.datamap | self.nodemap
 
     def iterkeys(self):
-        e = self.entries
-        for i in range(0, len(e), 2):
-            if e[i] is not sentinal:
-                yield e[i]
+        for k, v in self.iteritems():
+            yield k
 
     def itervalues(self):
-        e = self.entries
-        for i in range(0, len(e), 2):
-            if e[i] is not sentinal:
-                yield e[i+1]
+        for k, v in self.iteritems():
+            yield v
 
     def iteritems(self):
         e = self.entries
         for i in range(0, len(e), 2):
-            if e[i] is not sentinal:
-                yield (e[i], e[i+1])
-            else:
-                for kv in e[i+1].iteritems():
+            yield (e[i], e[i+1])
+        if self.nodes is not None:
+            for node in self.nodes:
+                for kv in node.iteritems():
                     yield kv
 
     def iterNodes(self):
-        e = self.entries
-        for i in range(0, len(e), 2):
-            if e[i] is sentinal:
-                yield e[i+1]
+        return iter(self.nodes or ())
+
+    def singleItem(self):
+        if self.nodes is None and len(self.entries) == 2:
+            return tuple(self.entries)
 
     @classmethod
-    def fromNode(klass, shift, keyHash, node):
-        return klass(klass.bitPos(keyHash, shift), [None, node])
+    def fromNode(klass, shift, keyHash, node, owner=None):
+        return klass(0, [], klass.bitPos(keyHash, shift), [node], owner)
 
     @staticmethod
     def bitPos(keyHash, shift):
@@ -260,119 +469,192 @@ class BitmapIndexedNode(AbstractNode):
 
     @staticmethod
     def bitCount(i):
-        return bin(i).count('1')
+        return popCount(i)
 
-    def bitIndex(self, bit):
-        i = self.bitmap & (bit-1)
-        return bin(i).count('1')
+    def _copy(self, owner):
+        nodes = self.nodes
+        if nodes is not None:
+            nodes = nodes[:]
+        return type(self)(self.datamap, self.entries[:], self.nodemap, nodes, owner)
 
-    def _replace(self, bitmap, idx, key, value):
-        entries = self.entries[:]
-        entries[idx] = key
-        entries[idx+1] = value
-        return type(self)(bitmap, entries)
-
-    def _insert(self, bitmap, idx, key, value):
+    def _hashItems(self):
         e = self.entries
-        e = e[:idx] + [key, value] + e[idx:]
-        return type(self)(bitmap, e)
-
-    def _remove(self, bitmap, idx):
-        e = self.entries[:]
-        del e[idx:idx+2]
-        return type(self)(bitmap, e)
-
-    def _unpack(self, shift, keyHash, key, value, added):
+        result = 0
+        for i in range(0, len(e), 2):
+            result ^= hash((e[i], e[i+1]))
+        if self.nodes is not None:
+            for node in self.nodes:
+                result ^= node.hashItems()
+        return result
+
+    #~ entries and nodes ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def _setValue(self, idx, value, owner):
+        node = self._editable(owner)
+        node.entries[idx+1] = value
+        return node
+
+    def _insertItem(self, bit, idx, key, value, owner):
+        if owner is not None and self.owner is owner:
+            self.datamap |= bit
+            self.entries[idx:idx] = [key, value]
+            return self
+        e = self.entries
+        nodes = self.nodes
+        if nodes is not None:
+            nodes = nodes[:]
+        return type(self)(self.datamap|bit, e[:idx] + [key, value] + e[idx:],
+                self.nodemap, nodes, owner)
+
+    def _removeItem(self, bit, idx, owner):
+        node = self._editable(owner)
+        node.datamap ^= bit
+        del node.entries[idx:idx+2]
+        return node
+
+    def _setNode(self, nIdx, child, owner):
+        node = self._editable(owner)
+        node.nodes[nIdx] = child
+        return node
+
+    def _itemToNode(self, bit, idx, child, owner):
+        node = self._editable(owner)
+        del node.entries[idx:idx+2]
+        node.datamap ^= bit
+        nIdx = popCount(node.nodemap & (bit-1))
+        if node.nodes is None:
+            node.nodes = [child]
+        else: node.nodes.insert(nIdx, child)
+        node.nodemap |= bit
+        return node
+
+    def _nodeToItem(self, bit, nIdx, key, value, owner):
+        node = self._editable(owner)
+        node._removeNodeAt(bit, nIdx)
+        idx = 2*popCount(node.datamap & (bit-1))
+        node.entries[idx:idx] = [key, value]
+        node.datamap |= bit
+        return node
+
+    def _removeNode(self, bit, nIdx, owner):
+        node = self._editable(owner)
+        node._removeNodeAt(bit, nIdx)
+        return node
+
+    def _removeNodeAt(self, bit, nIdx):
+        del self.nodes[nIdx]
+        if not self.nodes:
+            self.nodes = None
+        self.nodemap ^= bit
+
+    def _unpack(self, shift, keyHash, key, value, added, owner):
         entries = self.entries
-        nodes = [None]*32
-        j = 0
-        bitmap = self.bitmap
+        children = [None]*32
+        datamap = self.datamap
+        nodemap = self.nodemap
+        j = k = 0
         for i in range(32):
-            if (bitmap>>i) & 1:
+            if (datamap>>i) & 1:
                 eKey = entries[j]
-                eValue = entries[j+1]
-                if eKey is not None: 
-                    nodes[i] = emptyBitmapNode.assoc(shift+5, hash(eKey), eKey, eValue, added)
-                else: nodes[i] = eValue
+                children[i] = emptyBitmapNode.assoc(shift+5, hash(eKey), eKey, entries[j+1], [], owner)
                 j += 2
+            elif (nodemap>>i) & 1:
+                children[i] = self.nodes[k]
+                k += 1
 
-        return ArrayNode(j/2, nodes)
+        node = ArrayNode(j//2 + k, children, owner)
+        return node.assoc(shift, keyHash, key, value, added, owner)
 
-    def assoc(self, shift, keyHash, key, value, added):
-        bit = self.bitPos(keyHash, shift)
-        idx = 2*self.bitIndex(bit)
-        bitmap = self.bitmap
-        if bitmap & bit:
-            eKey = self.entries[idx]
-            eValue = self.entries[idx+1]
-            if eKey is sentinal:
-                node = eValue.assoc(shift+5, keyHash, key, value, added)
-                if node is eValue:
-                    return self
-                return self._replace(bitmap, idx, sentinal, node)
+    #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+    def assoc(self, shift, keyHash, key, value, added, owner=None):
+        bit = 1 << ((keyHash>>shift)&0x1f)
+        datamap = self.datamap
+        if datamap & bit:
+            idx = 2*popCount(datamap & (bit-1))
+            eKey = self.entries[idx]
             if key == eKey:
-                if value == eValue:
+                if value is self.entries[idx+1]:
                     return self
-                return self._replace(bitmap, idx, key, value)
+                return self._setValue(idx, value, owner)
 
-            else:
-                added.append(True)
-                return self._replace(bitmap, idx, sentinal, 
-                        createNode(shift+5, eKey, eValue, keyHash, key, value))
-
-        else:
-            bc = self.bitCount(bitmap)
-            if bc < 16:
-                added.append(True)
-                return self._insert(bitmap|bit, idx, key, value)
-
-            else:
-                return self._unpack(shift, keyHash, key, value, added)
-
-    def without(self, shift, keyHash, key):
-        bit = self.bitPos(keyHash, shift)
-        bitmap = self.bitmap
-        if not bitmap & bit:
-            return self
-        idx = 2*self.bitIndex(bit)
-        eKey = self.entries[idx]
-        eValue = self.entries[idx+1]
-        if eKey is sentinal:
-            node = eValue.without(shift+5, keyHash, key)
-            if node is eValue:
+            added.append(True)
+            child = createNode(shift+5, eKey, self.entries[idx+1], keyHash, key, value, owner)
+            return self._itemToNode(bit, idx, child, owner)
+
+        nodemap = self.nodemap
+        if nodemap & bit:
+            nIdx = popCount(nodemap & (bit-1))
+            child = self.nodes[nIdx]
+            newChild = child.assoc(shift+5, keyHash, key, value, added, owner)
+            if newChild is child:
                 return self
-            if node != None:
-                return self._replace(bitmap, idx, sentinal, node)
-            if bitmap == bit:
+            return self._setNode(nIdx, newChild, owner)
+
+        if popCount(datamap | nodemap) >= splitThreshold:
+            return self._unpack(shift, keyHash, key, value, added, owner)
+
+        added.append(True)
+        idx = 2*popCount(datamap & (bit-1))
+        return self._insertItem(bit, idx, key, value, owner)
+
+    def without(self, shift, keyHash, key, removed, owner=None):
+        bit = 1 << ((keyHash>>shift)&0x1f)
+        datamap = self.datamap
+        nodemap = self.nodemap
+        if datamap & bit:
+            idx = 2*popCount(datamap & (bit-1))
+            if not (self.entries[idx] == key):
+                return self
+            removed.append(True)
+            if datamap == bit and not nodemap:
                 return None
-            return self._remove(bitmap^bit, idx)
-
-        elif eKey == key:
-            return self._remove(bitmap^bit, idx)
+            return self._removeItem(bit, idx, owner)
+
+        elif nodemap & bit:
+            nIdx = popCount(nodemap & (bit-1))
+            child = self.nodes[nIdx]
+            newChild = child.without(shift+5, keyHash, key, removed, owner)
+            if newChild is None:
+                if nodemap == bit and not datamap:
+                    return None
+                return self._removeNode(bit, nIdx, owner)
+
+            # transients shrink the child in place, so check it either way
+            item = newChild.singleItem()
+            if item is not None:
+                return self._nodeToItem(bit, nIdx, item[0], item[1], owner)
+            elif newChild is child:
+                return self
+            return self._setNode(nIdx, newChild, owner)
 
         return self
 
     def find(self, shift, keyHash, key, default):
-        bit = self.bitPos(keyHash, shift)
-        if not self.bitmap & bit:
-            return default
-        idx = 2*self.bitIndex(bit)
-        eKey = self.entries[idx]
-        eValue = self.entries[idx+1]
-        if eKey is sentinal:
-            return eValue.find(shift+5, keyHash, key, default)
-        elif eKey == key:
-            return eValue
-        else:
+        bit = 1 << ((keyHash>>shift)&0x1f)
+        datamap = self.datamap
+        if datamap & bit:
+            idx = 2*popCount(datamap & (bit-1))
+            if self.entries[idx] == key:
+                return self.entries[idx+1]
             return default
 
+        nodemap = self.nodemap
+        if nodemap & bit:
+            child = self.nodes[popCount(nodemap & (bit-1))]
+            return child.find(shift+5, keyHash, key, default)
+        return default
+
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 class CollisionNode(AbstractNode):
-    def __init__(self, keyHash, entries):
+    __slots__ = ('keyHash', 'entries', 'owner', '_hash')
+
+    def __init__(self, keyHash, entries, owner=None):
         self.keyHash = keyHash
         self.entries = entries
+        self.owner = owner
+        self._hash = None
 
     def __repr__(self):
         return "<%s.%s %s>"%(
@@ -380,7 +662,7 @@ class CollisionNode(AbstractNode):
             len(self.entries))
 
     def __len__(self):
-        return len(self.entries)/2
+        return len(self.entries)//2
 
     def iterkeys(self):
         return iter(self.entries[0::2])
@@ -392,41 +674,53 @@ class CollisionNode(AbstractNode):
     def iterNodes(self):
         return iter([])
 
-    def _replace(self, idx, item):
-        e = self.entries[:]
-        e[idx] = item
-        return type(self)(self.keyHash, e)
+    def singleItem(self):
+        if len(self.entries) == 2:
+            return tuple(self.entries)
+
+    def _copy(self, owner):
+        return type(self)(self.keyHash, self.entries[:], owner)
+
+    def _replace(self, idx, item, owner):
+        node = self._editable(owner)
+        node.entries[idx] = item
+        return node
 
-    def _remove(self, idx):
-        e = self.entries[:]
-        del e[idx:idx+2]
-        return type(self)(self.keyHash, e)
+    def _remove(self, idx, owner):
+        node = self._editable(owner)
+        del node.entries[idx:idx+2]
+        return node
 
-    def _append(self, key, value):
-        e = self.entries + [key, value]
-        return type(self)(self.keyHash, e)
+    def _append(self, key, value, owner):
+        node = self._editable(owner)
+        node.entries.extend((key, value))
+        return node
 
-    def assoc(self, shift, keyHash, key, value, added):
+    def assoc(self, shift, keyHash, key, value, added, owner=None):
         if (keyHash == self.keyHash):
             idx = self._findIndex(key)
             if idx is not None:
-                if self.entries[idx+1] == value:
+                if self.entries[idx+1] is value:
                     return self
-                return self._replace(idx+1, value)
+                return self._replace(idx+1, value, owner)
 
             added.append(True)
-            return self._append(key, value)
+            return self._append(key, value, owner)
 
-        node = BitmapIndexedNode.fromNode(shift, self.keyHash, self)
-        return node.assoc(shift, keyHash, key, value, addded)
+        node = BitmapIndexedNode.fromNode(shift, self.keyHash, self, owner)
+        return node.assoc(shift, keyHash, key, value, added, owner)
 
-    def without(self, shift, keyHash, key):
+    def without(self, shift, keyHash, key, removed, owner=None):
         if (keyHash != self.keyHash):
             return self
+        idx = self._findIndex(key)
+        if idx is None:
+            return self
 
+        removed.append(True)
         if len(self) == 1:
             return None
-        return self._remove(idx)
+        return self._remove(idx, owner)
 
     def find(self, shift, keyHash, key, default):
         if (keyHash != self.keyHash):
@@ -434,29 +728,197 @@ class CollisionNode(AbstractNode):
         idx = self._findIndex(key)
         if idx is None:
             return default
-        elif key == self.entries[idx]:
-            return self.entries[idx+1]
-        else: return default
+        return self.entries[idx+1]
     
     def _findIndex(self, key):
-        idx = self.entries.index(key)
-        if idx&1 == 0: # assure it is a key
-            return idx
+        e = self.entries
+        for idx in range(0, len(e), 2):
+            if e[idx] == key:
+                return idx
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-def createNode(shift, k1, v1, k2Hash, k2, v2):
+def createNode(shift, k1, v1, k2Hash, k2, v2, owner=None):
     k1Hash = hash(k1)
     if k1Hash == k2Hash:
-        node = CollisionNode(k1Hash, [k1,v1,k2,v2])
+        node = CollisionNode(k1Hash, [k1,v1,k2,v2], owner)
     else:
         node = emptyBitmapNode
-        node = node.assoc(shift, k1Hash, k1, v1, [])
-        node = node.assoc(shift, k2Hash, k2, v2, [])
+        node = node.assoc(shift, k1Hash, k1, v1, [], owner)
+        node = node.assoc(shift, k2Hash, k2, v2, [], owner)
     return node
 
 emptyBitmapNode = BitmapIndexedNode(0, [])
 
+def nodesEqual(nodeA, nodeB):
+    """True if the nodes hold equal items.  Shared subtrees are equal
+    without being visited, and nodes of matching shape are compared slot
+    by slot, falling back to comparing items where the shapes differ"""
+    if nodeA is nodeB:
+        return True
+    if nodeA is None or nodeB is None:
+        return False
+
+    klass = type(nodeA)
+    if klass is type(nodeB):
+        if klass is ArrayNode:
+            for a, b in zip(nodeA.children, nodeB.children):
+                if not nodesEqual(a, b):
+                    return False
+            return True
+
+        elif (klass is BitmapIndexedNode and nodeA.datamap == nodeB.datamap
+                and nodeA.nodemap == nodeB.nodemap):
+            eA = nodeA.entries; eB = nodeB.entries
+            for i in range(0, len(eA), 2):
+                vA = eA[i+1]; vB = eB[i+1]
+                if not (eA[i] == eB[i] and (vA is vB or vA == vB)):
+                    return False
+            for a, b in zip(nodeA.iterNodes(), nodeB.iterNodes()):
+                if not nodesEqual(a, b):
+                    return False
+            return True
+
+    return dict(nodeA.iteritems()) == dict(nodeB.iteritems())
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Diff and Merge
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+def diff(a, b):
+    """Yields (change, key, aValue, bValue) for each key that differs from
+    trie a to trie b, where change is 'added', 'removed' or 'changed'.
+    The missing side of an added or removed key is None.  Subtrees shared
+    by both tries are skipped without being visited"""
+    if a.null is not b.null:
+        for e in _diffItems(
+                {} if a.null is sentinal else {None: a.null},
+                {} if b.null is sentinal else {None: b.null}):
+            yield e
+    for e in _diffNodes(a.root, b.root):
+        yield e
+
+def merge(base, a, b, conflict=None):
+    """Three way merge of tries a and b, both derived from base.  Returns
+    a new trie with the changes of both.  Keys changed differently by a
+    and b call conflict(key, baseValue, aValue, bValue), with sentinal
+    for missing values, which returns the merged value, or sentinal to
+    leave the key out.  Without conflict, a ValueError is raised"""
+    if b.root is base.root and b.null is base.null:
+        return a.persistent()
+    if a.root is base.root and a.null is base.null:
+        return b.persistent()
+
+    result = a.transient()
+    for change, key, baseValue, bValue in diff(base, b):
+        if change == 'added':
+            baseValue = sentinal
+        elif change == 'removed':
+            bValue = sentinal
+
+        aValue = a.get(key, sentinal)
+        if _sameValue(aValue, bValue):
+            continue
+        elif _sameValue(aValue, baseValue):
+            value = bValue
+        elif conflict is not None:
+            value = conflict(key, baseValue, aValue, bValue)
+        else:
+            raise ValueError('Merge conflict for key: %r' % (key,))
+
+        if value is sentinal:
+            result.without(key)
+        else:
+            result.assoc(key, value)
+    return result.persistent()
+
+def _sameValue(x, y):
+    if x is y:
+        return True
+    if x is sentinal or y is sentinal:
+        return False
+    return x == y
+
+def _diffNodes(nodeA, nodeB):
+    if nodeA is nodeB:
+        return
+    slotsA = _slots(nodeA)
+    slotsB = _slots(nodeB)
+    if slotsA is None or slotsB is None:
+        for e in _diffItems(_nodeItems(nodeA), _nodeItems(nodeB)):
+            yield e
+        return
+
+    for slotA, slotB in zip(slotsA, slotsB):
+        if slotA is slotB:
+            continue
+        elif slotA is None:
+            kA = vA = None
+        else: kA, vA = slotA
+        if slotB is None:
+            kB = vB = None
+        else: kB, vB = slotB
+
+        if kA is sentinal and kB is sentinal:
+            for e in _diffNodes(vA, vB):
+                yield e
+        elif (slotA is not None and kA is not sentinal
+                and slotB is not None and kB is not sentinal
+                and kA == kB):
+            if not _sameValue(vA, vB):
+                yield ('changed', kA, vA, vB)
+        else:
+            for e in _diffItems(_slotItems(slotA), _slotItems(slotB)):
+                yield e
+
+def _slots(node):
+    # the 32 slots of a node at its shift, each None or a (key, value)
+    # entry, where key is sentinal for sub nodes
+    if node is None:
+        return [None]*32
+    klass = type(node)
+    if klass is ArrayNode:
+        return [None if c is None else (sentinal, c) for c in node.children]
+    elif klass is BitmapIndexedNode:
+        result = [None]*32
+        e = node.entries
+        datamap = node.datamap
+        nodemap = node.nodemap
+        j = k = 0
+        for i in range(32):
+            if (datamap>>i) & 1:
+                result[i] = (e[j], e[j+1])
+                j += 2
+            elif (nodemap>>i) & 1:
+                result[i] = (sentinal, node.nodes[k])
+                k += 1
+        return result
+    return None
+
+def _nodeItems(node):
+    if node is None:
+        return {}
+    return dict(node.iteritems())
+
+def _slotItems(slot):
+    if slot is None:
+        return {}
+    key, value = slot
+    if key is sentinal:
+        return dict(value.iteritems())
+    return {key: value}
+
+def _diffItems(itemsA, itemsB):
+    for key, vA in itemsA.iteritems():
+        vB = itemsB.get(key, sentinal)
+        if vB is sentinal:
+            yield ('removed', key, vA, None)
+        elif not _sameValue(vA, vB):
+            yield ('changed', key, vA, vB)
+    for key, vB in itemsB.iteritems():
+        if key not in itemsA:
+            yield ('added', key, None, vB)
+
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 #~ Main 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
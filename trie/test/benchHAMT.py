@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+##~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~##
+##~ Copyright (C) 2002-2011  TechGame Networks, LLC.              ##
+##~                                                               ##
+##~ This library is free software; you can redistribute it        ##
+##~ and/or modify it under the terms of the MIT style License as  ##
+##~ found in the LICENSE file included with this distribution.    ##
+##~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~##
+
+"""HAMT benchmarks.
+
+Times assoc and find on the hash tries with each popCount implementation,
+and writes one JSON record per trie and popCount, with ops/sec for each
+workload, and the bytes held by the trie's nodes beside those of a dict
+with the same keys:
+
+    python benchHAMT.py [-n COUNT] [-p POPCOUNT,...] [-o FILE] [TRIE ...]
+
+popCount 'bin' is the bin(i).count('1') the tries used before, 'table'
+the 16 bit table, and 'native' int.bit_count where Python has it.  Node
+bytes are summed with sys.getsizeof over the nodes, their lists and
+bitmaps, leaving out the keys and values a dict would share."""
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import gc
+import sys
+import time
+import json
+from optparse import OptionParser
+
+from TG.collections.trie import hamt
+from TG.collections.trie import hamtPersistent
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+def binPopCount(i):
+    return bin(i).count('1')
+
+def tablePopCount(i, table=bytearray(binPopCount(i) for i in range(0x10000))):
+    return table[i & 0xffff] + table[i >> 16]
+
+popCounts = [('bin', binPopCount), ('table', tablePopCount)]
+if hasattr(int, 'bit_count'):
+    popCounts.append(('native', int.bit_count))
+
+tries = {
+    'HAMT': hamt.HAMT,
+    'PHAMT': hamtPersistent.PHAMT,
+    }
+
+def usePopCount(popCount):
+    hamt.popCount = popCount
+    hamtPersistent.popCount = popCount
+
+def nodeBytes(ht):
+    getsizeof = sys.getsizeof
+    total = getsizeof(ht)
+    for node in ht.walkNodes():
+        if node is ht:
+            continue
+        total += getsizeof(node)
+        for name in ('entries', 'nodes', 'children'):
+            part = getattr(node, name, None)
+            if part is not None:
+                total += getsizeof(part)
+        for name in ('datamap', 'nodemap'):
+            bitmap = getattr(node, name, 0)
+            if bitmap > 256:
+                # small ints are shared, larger ones are objects per node
+                total += getsizeof(bitmap)
+    return total
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Workloads
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+# Each workload takes (factory, keys, ht), where ht already holds keys,
+# and returns the number of operations it timed with the elapsed seconds.
+
+def benchAssoc(factory, keys, ht):
+    start = time.time()
+    ht = factory()
+    for k in keys:
+        ht[k] = k
+    return len(keys), time.time() - start
+
+def benchFind(factory, keys, ht):
+    start = time.time()
+    for k in keys:
+        ht[k]
+    return len(keys), time.time() - start
+
+def benchFindMissing(factory, keys, ht):
+    missing = ['missing' + k for k in keys]
+    start = time.time()
+    get = ht.get
+    for k in missing:
+        get(k)
+    return len(missing), time.time() - start
+
+workloads = [
+    ('assoc', benchAssoc),
+    ('find', benchFind),
+    ('findMissing', benchFindMissing),
+    ]
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Running
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+def benchTrie(name, popCountName, count):
+    factory = tries[name]
+    usePopCount(dict(popCounts)[popCountName])
+    keys = ['key%s' % i for i in xrange(1, count+1)]
+
+    ht = factory()
+    for k in keys:
+        ht[k] = k
+
+    results = {}
+    for wlName, wlFn in workloads:
+        gc.collect()
+        ops, secs = wlFn(factory, keys, ht)
+        results[wlName] = {
+            'ops': ops, 'seconds': secs,
+            'opsPerSec': ops/secs if secs else None,
+            }
+
+    nBytes = nodeBytes(ht)
+    dictBytes = sys.getsizeof(dict.fromkeys(keys))
+    return {
+        'trie': name,
+        'popCount': popCountName,
+        'count': count,
+        'nodeBytes': nBytes,
+        'dictBytes': dictBytes,
+        'nodeBytesPerKey': float(nBytes)/count,
+        'dictBytesPerKey': float(dictBytes)/count,
+        'python': sys.version.split()[0],
+        'workloads': results,
+        }
+
+def main(argv=None):
+    parser = OptionParser(usage='%prog [options] [TRIE ...]')
+    parser.add_option('-n', '--count', type='int', default=100000,
+            help='number of keys per trie (default %default)')
+    parser.add_option('-p', '--popCounts', default='',
+            help='comma separated popCounts: ' + ', '.join(n for n, f in popCounts))
+    parser.add_option('-o', '--output', default=None,
+            help='write JSON here instead of stdout')
+    options, names = parser.parse_args(argv)
+
+    pcNames = [n for n in options.popCounts.split(',') if n]
+    pcNames = pcNames or [n for n, f in popCounts]
+    trieNames = names or sorted(tries)
+
+    savedPopCount = hamt.popCount
+    records = []
+    try:
+        for name in trieNames:
+            for pcName in pcNames:
+                records.append(benchTrie(name, pcName, options.count))
+                print >> sys.stderr, '%-8s %-8s done' % (name, pcName)
+    finally:
+        usePopCount(savedPopCount)
+
+    out = sys.stdout
+    if options.output:
+        out = open(options.output, 'w')
+    json.dump(records, out, indent=2, sort_keys=True)
+    print >> out
+    return records
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,118 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import random
+import unittest
+from TG.collections.trie import hamt
+from TG.collections.trie.hamt import HAMT
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class CollidingKey(object):
+    def __init__(self, key):
+        self.key = key
+    def __repr__(self):
+        return 'CollidingKey(%r)' % (self.key,)
+    def __hash__(self):
+        return hash(self.key) & 0x3
+    def __eq__(self, other):
+        return isinstance(other, CollidingKey) and self.key == other.key
+    def __ne__(self, other):
+        return not self == other
+
+class TestPopCount(unittest.TestCase):
+    def testPopCount(self):
+        rnd = random.Random(42)
+        values = [0, 1, 0xffff, 0x10000, 0xffffffff, 0x80000000]
+        values.extend(rnd.getrandbits(32) for i in xrange(1000))
+        for i in values:
+            self.assertEqual(hamt.popCount(i), bin(i).count('1'))
+
+    def testBitCount(self):
+        node = hamt.BitmapIndexedNode(0x80010005, [], 0x2, [None])
+        self.assertEqual(node.bitCount(node.datamap), 4)
+        self.assertEqual(node.bitCount(node.nodemap), 1)
+        self.assertEqual(node.bitCount(node.bitmap), 5)
+
+class TestHAMT(unittest.TestCase):
+    count = 5000
+
+    def newTrie(self, items):
+        ht = HAMT()
+        for k, v in items:
+            ht[k] = v
+        return ht
+
+    def assertContents(self, ht, d):
+        self.assertEqual(len(ht), len(d))
+        self.assertEqual(dict(ht.iteritems()), d)
+        self.assertEqual(sorted(ht.iterkeys()), sorted(d.keys()))
+        for k, v in d.iteritems():
+            self.assertEqual(ht[k], v)
+
+    def testEmpty(self):
+        ht = HAMT()
+        self.assertEqual(len(ht), 0)
+        self.assertEqual(ht.get('a', 42), 42)
+        self.assertFalse('a' in ht)
+        self.assertRaises(LookupError, ht.__getitem__, 'a')
+
+    def testNoneKey(self):
+        ht = HAMT()
+        ht[None] = 'null'
+        ht['a'] = 'a'
+        self.assertEqual(ht[None], 'null')
+        self.assertEqual(dict(ht.iteritems()), {None: 'null', 'a': 'a'})
+        del ht[None]
+        self.assertFalse(None in ht)
+        self.assertEqual(len(ht), 1)
+
+    def testFillAndDelete(self):
+        keys = ['key%s' % i for i in xrange(self.count)]
+        d = dict((k, i) for i, k in enumerate(keys))
+        ht = self.newTrie(d.iteritems())
+        self.assertContents(ht, d)
+
+        random.shuffle(keys)
+        for k in keys[::2]:
+            del ht[k]
+            del d[k]
+        self.assertContents(ht, d)
+
+        for k in keys:
+            del ht[k]
+        self.assertContents(ht, {})
+
+    def testNodeLayout(self):
+        keys = ['key%s' % i for i in xrange(self.count)]
+        ht = self.newTrie((k, 1) for k in keys)
+        for k in keys[:-40]:
+            del ht[k]
+        for node in ht.walkNodes():
+            self.assertFalse(hasattr(node, '__dict__'))
+            if isinstance(node, hamt.BitmapIndexedNode):
+                for child in node.iterNodes():
+                    self.assertEqual(child.singleItem(), None)
+                self.assertEqual(node.datamap & node.nodemap, 0)
+                self.assertEqual(len(node.entries), 2*bin(node.datamap).count('1'))
+
+    def testCollisions(self):
+        keys = [CollidingKey(i) for i in xrange(200)]
+        d = dict((k, i) for i, k in enumerate(keys))
+        ht = self.newTrie(d.iteritems())
+        self.assertContents(ht, d)
+        self.assertEqual(ht.get(CollidingKey(-1), 42), 42)
+        for k in keys[::3]:
+            del ht[k]
+            del d[k]
+        self.assertContents(ht, d)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()
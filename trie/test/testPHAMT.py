@@ -0,0 +1,438 @@
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Imports 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import random
+import unittest
+from TG.collections.trie import hamtPersistent
+from TG.collections.trie.hamtPersistent import PHAMT
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Definitions 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+class CollidingKey(object):
+    def __init__(self, key):
+        self.key = key
+    def __repr__(self):
+        return 'CollidingKey(%r)' % (self.key,)
+    def __hash__(self):
+        return hash(self.key) & 0x3
+    def __eq__(self, other):
+        return isinstance(other, CollidingKey) and self.key == other.key
+    def __ne__(self, other):
+        return not self == other
+
+class TestPHAMT(unittest.TestCase):
+    count = 5000
+
+    def newKeys(self):
+        return ['key%s' % i for i in xrange(self.count)]
+
+    def newTrie(self, items):
+        ht = PHAMT()
+        for k, v in items:
+            ht[k] = v
+        return ht
+
+    def assertContents(self, ht, d):
+        self.assertEqual(len(ht), len(d))
+        self.assertEqual(dict(ht.iteritems()), d)
+        self.assertEqual(sorted(ht.iterkeys()), sorted(d.keys()))
+        self.assertEqual(sorted(ht.itervalues()), sorted(d.values()))
+        for k, v in d.iteritems():
+            self.assertEqual(ht[k], v)
+
+    def testEmpty(self):
+        ht = PHAMT()
+        self.assertEqual(len(ht), 0)
+        self.assertEqual(ht.get('a'), None)
+        self.assertEqual(ht.get('a', 42), 42)
+        self.assertFalse('a' in ht)
+        self.assertRaises(LookupError, ht.__getitem__, 'a')
+        del ht['a']
+        self.assertEqual(len(ht), 0)
+
+    def testNoneKey(self):
+        ht = PHAMT()
+        self.assertEqual(ht.get(None, 42), 42)
+        ht[None] = 'null'
+        ht['a'] = 'a'
+        self.assertEqual(ht[None], 'null')
+        self.assertEqual(len(ht), 2)
+        ht[None] = 'other'
+        self.assertEqual(len(ht), 2)
+        self.assertEqual(dict(ht.iteritems()), {None: 'other', 'a': 'a'})
+        del ht[None]
+        self.assertFalse(None in ht)
+        self.assertEqual(len(ht), 1)
+
+    def testFillAndDelete(self):
+        keys = self.newKeys()
+        d = dict((k, i) for i, k in enumerate(keys))
+        ht = self.newTrie(d.iteritems())
+        self.assertContents(ht, d)
+
+        for k in keys:
+            ht[k] = -d[k]
+            d[k] = -d[k]
+        self.assertContents(ht, d)
+
+        random.shuffle(keys)
+        for k in keys[::2]:
+            del ht[k]
+            del d[k]
+        self.assertContents(ht, d)
+        for k in keys[::2]:
+            self.assertFalse(k in ht)
+
+        for k in keys:
+            del ht[k]
+        self.assertContents(ht, {})
+        self.assertEqual(ht.root, None)
+
+    def testCollisions(self):
+        keys = [CollidingKey(i) for i in xrange(200)]
+        d = dict((k, i) for i, k in enumerate(keys))
+        ht = self.newTrie(d.iteritems())
+        self.assertContents(ht, d)
+        self.assertEqual(ht.get(CollidingKey(-1), 42), 42)
+        for k in keys[::3]:
+            del ht[k]
+            del d[k]
+        self.assertContents(ht, d)
+        for k in keys:
+            del ht[k]
+        self.assertContents(ht, {})
+
+    #~ Transients ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def testTransientIsolation(self):
+        keys = self.newKeys()
+        base = self.newTrie((k, 1) for k in keys)
+
+        tr = base.transient()
+        self.assertTrue(tr.isTransient())
+        self.assertFalse(base.isTransient())
+        for k in keys[::2]:
+            tr[k] = 2
+        for k in keys[1::4]:
+            del tr[k]
+        tr['extra'] = 3
+
+        self.assertContents(base, dict((k, 1) for k in keys))
+        expected = dict((k, 2 if i%2 == 0 else 1)
+                for i, k in enumerate(keys) if i%4 != 1)
+        expected['extra'] = 3
+        self.assertContents(tr, expected)
+
+    def testPersistentFreezes(self):
+        keys = self.newKeys()
+        tr = PHAMT().transient()
+        for k in keys:
+            tr[k] = 1
+        frozen = tr.persistent()
+        self.assertFalse(frozen.isTransient())
+        self.assertTrue(frozen.root is tr.root)
+
+        # further changes to the transient must copy the shared nodes
+        for k in keys[::2]:
+            tr[k] = 2
+        for k in keys[1::4]:
+            del tr[k]
+        self.assertContents(frozen, dict((k, 1) for k in keys))
+        self.assertEqual(len(tr), len(keys) - len(keys[1::4]))
+
+    def testTransientOwnsCopies(self):
+        keys = self.newKeys()
+        tr = PHAMT().transient()
+        for k in keys:
+            tr[k] = 1
+        token = tr._editToken
+        owned = [n for n in tr.walkNodes() if n is not tr]
+        self.assertTrue(owned)
+        for node in owned:
+            self.assertTrue(node.owner is token)
+
+        root = tr.root
+        for k in keys:
+            tr[k] = 2
+        self.assertTrue(tr.root is root)
+
+        frozen = tr.persistent()
+        for node in frozen.walkNodes():
+            if node is not frozen:
+                self.assertTrue(node.owner is not tr._editToken)
+
+    def testTransientCollisions(self):
+        keys = [CollidingKey(i) for i in xrange(100)]
+        base = self.newTrie((k, 1) for k in keys)
+        tr = base.transient()
+        for k in keys[::2]:
+            tr[k] = 2
+        for k in keys[1::4]:
+            del tr[k]
+        self.assertContents(base, dict((k, 1) for k in keys))
+        self.assertEqual(len(tr), len(keys) - len(keys[1::4]))
+        self.assertEqual(tr[keys[0]], 2)
+        self.assertEqual(tr[keys[3]], 1)
+
+    def testTransientOfTransient(self):
+        tr = self.newTrie(('k%s' % i, 1) for i in xrange(500)).transient()
+        for i in xrange(500):
+            tr['k%s' % i] = 2
+        other = tr.transient()
+        for i in xrange(500):
+            tr['k%s' % i] = 3
+        self.assertEqual(set(other.itervalues()), set([2]))
+
+    #~ Values ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def testWithWithout(self):
+        keys = self.newKeys()
+        base = self.newTrie((k, 1) for k in keys)
+        changed = base.with_('key7', 2).with_('extra', 3).without_('key8')
+
+        self.assertContents(base, dict((k, 1) for k in keys))
+        expected = dict((k, 1) for k in keys)
+        expected.update(key7=2, extra=3)
+        del expected['key8']
+        self.assertContents(changed, expected)
+        self.assertFalse(changed.isTransient())
+
+        self.assertEqual(base.with_(None, 4)[None], 4)
+        self.assertFalse(None in base)
+        self.assertEqual(base.without_('missing'), base)
+
+    def testWithSharesNodes(self):
+        base = self.newTrie(('k%s' % i, i) for i in xrange(self.count))
+        changed = base.with_('k1', -1)
+        baseNodes = set(map(id, base.walkNodes()))
+        changedNodes = [n for n in changed.walkNodes() if n is not changed]
+        unshared = [n for n in changedNodes if id(n) not in baseNodes]
+        self.assertTrue(len(unshared) <= 8)
+        self.assertTrue(len(changedNodes) > 100)
+
+    def testUpdate(self):
+        base = self.newTrie([('a', 1), ('b', 2)])
+        d = {'b': 20, 'c': 30}
+        self.assertContents(base.update_(d), {'a': 1, 'b': 20, 'c': 30})
+        self.assertContents(base.update_([('d', 4)], e=5),
+                {'a': 1, 'b': 2, 'd': 4, 'e': 5})
+        self.assertContents(base.update_(base.with_('z', 26)),
+                {'a': 1, 'b': 2, 'z': 26})
+        self.assertContents(base, {'a': 1, 'b': 2})
+        self.assertFalse(base.update_().isTransient())
+
+    def testEquality(self):
+        keys = self.newKeys()
+        a = self.newTrie((k, 1) for k in keys).persistent()
+        b = self.newTrie((k, 1) for k in reversed(keys)).persistent()
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a), hash(b))
+        self.assertFalse(a != b)
+
+        c = a.with_('key1', 2)
+        self.assertNotEqual(a, c)
+        self.assertEqual(c.with_('key1', 1), a)
+        self.assertEqual(hash(c.with_('key1', 1)), hash(a))
+        self.assertNotEqual(a, a.without_('key1'))
+        self.assertNotEqual(a, a.with_(None, 1))
+        self.assertEqual(a.with_(None, 1), b.with_(None, 1))
+        self.assertNotEqual(a, dict((k, 1) for k in keys))
+
+    def testEqualityShapes(self):
+        # same items, reached through different histories of splits
+        keys = self.newKeys()
+        a = self.newTrie((k, 1) for k in keys[:20])
+        b = self.newTrie((k, 1) for k in keys)
+        for k in keys[20:]:
+            del b[k]
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a.persistent()), hash(b.persistent()))
+
+        colliding = [CollidingKey(i) for i in xrange(50)]
+        a = self.newTrie((k, 1) for k in colliding)
+        b = self.newTrie((k, 1) for k in reversed(colliding))
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a.persistent()), hash(b.persistent()))
+
+    def testHashTransient(self):
+        tr = PHAMT().transient()
+        tr['a'] = 1
+        self.assertRaises(TypeError, hash, tr)
+        self.assertEqual(hash(tr.persistent()), hash(PHAMT().with_('a', 1)))
+
+    def testPersistentRefusesChanges(self):
+        plain = self.newTrie([('a', 1), ('b', 2)])
+        self.assertRaises(TypeError, hash, plain)
+        values = [plain.persistent(), plain.with_('c', 3),
+                plain.without_('a'), plain.update_(d=4),
+                plain.transient().persistent()]
+        for value in values:
+            expected = dict(value.iteritems())
+            self.assertRaises(TypeError, value.__setitem__, 'a', 10)
+            self.assertRaises(TypeError, value.__delitem__, 'b')
+            self.assertRaises(TypeError, value.assoc, None, 0)
+            self.assertEqual(dict(value.iteritems()), expected)
+            hash(value)
+
+            changed = value.transient()
+            changed['a'] = 10
+            self.assertEqual(value.get('a'), expected.get('a'))
+            self.assertEqual(changed.persistent()['a'], 10)
+
+        plain['c'] = 3
+        self.assertEqual(values[0].get('c'), None)
+
+    def testVersionsAsKeys(self):
+        versions = [PHAMT().persistent()]
+        for i in xrange(100):
+            versions.append(versions[-1].with_('k%s' % (i%10), i))
+        byVersion = dict((v, i) for i, v in enumerate(versions))
+        self.assertEqual(byVersion[versions[50].with_('x', 0).without_('x')], 50)
+
+    #~ Diff and Merge ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def assertDiff(self, a, b):
+        dA = dict(a.iteritems())
+        dB = dict(b.iteritems())
+        expected = set()
+        for k, v in dA.iteritems():
+            if k not in dB:
+                expected.add(('removed', k, v, None))
+            elif dB[k] != v:
+                expected.add(('changed', k, v, dB[k]))
+        for k, v in dB.iteritems():
+            if k not in dA:
+                expected.add(('added', k, None, v))
+
+        changes = list(hamtPersistent.diff(a, b))
+        self.assertEqual(len(changes), len(expected))
+        self.assertEqual(set(changes), expected)
+
+    def testDiff(self):
+        keys = self.newKeys()
+        base = self.newTrie((k, 1) for k in keys)
+        self.assertEqual(list(hamtPersistent.diff(base, base)), [])
+
+        changed = base.update_((k, 2) for k in keys[::50])
+        changed = changed.update_((k, 3) for k in ['new1', 'new2', None])
+        for k in keys[1::70]:
+            changed = changed.without_(k)
+        self.assertDiff(base, changed)
+        self.assertDiff(changed, base)
+
+    def testDiffShapes(self):
+        keys = self.newKeys()
+        self.assertDiff(PHAMT(), self.newTrie((k, 1) for k in keys))
+        small = self.newTrie((k, 1) for k in keys[:30])
+        self.assertDiff(small, self.newTrie((k, 2) for k in keys[10:]))
+        self.assertDiff(self.newTrie((k, 2) for k in keys[10:]), small)
+
+        colliding = [CollidingKey(i) for i in xrange(60)]
+        a = self.newTrie((k, 1) for k in colliding)
+        b = a.update_((k, 2) for k in colliding[::7])
+        self.assertDiff(a, b.without_(colliding[3]))
+        self.assertDiff(small, a)
+
+    def testDiffSkipsShared(self):
+        base = self.newTrie(('k%s' % i, i) for i in xrange(self.count))
+        changed = base.with_('k1', -1)
+        visited = []
+        orig = hamtPersistent._nodeItems
+        def nodeItems(node):
+            visited.append(node)
+            return orig(node)
+        hamtPersistent._nodeItems = nodeItems
+        try:
+            changes = list(hamtPersistent.diff(base, changed))
+        finally:
+            hamtPersistent._nodeItems = orig
+        self.assertEqual(changes, [('changed', 'k1', 1, -1)])
+        self.assertEqual(visited, [])
+
+    def testMerge(self):
+        keys = self.newKeys()
+        base = self.newTrie((k, 0) for k in keys)
+        a = base.update_((k, 'a') for k in keys[:100]).without_(keys[200])
+        b = base.update_((k, 'b') for k in keys[300:400]).with_('new', 'b')
+
+        merged = hamtPersistent.merge(base, a, b)
+        expected = dict((k, 0) for k in keys)
+        expected.update((k, 'a') for k in keys[:100])
+        expected.update((k, 'b') for k in keys[300:400])
+        expected['new'] = 'b'
+        del expected[keys[200]]
+        self.assertContents(merged, expected)
+        self.assertFalse(merged.isTransient())
+
+        self.assertTrue(hamtPersistent.merge(base, a, base) == a)
+        self.assertTrue(hamtPersistent.merge(base, base, b) == b)
+        # the same change on both sides is not a conflict
+        self.assertEqual(hamtPersistent.merge(base, a, a), a)
+
+    def testMergeConflicts(self):
+        base = self.newTrie([('x', 0), ('y', 0), ('z', 0)])
+        a = base.update_(x='a', y='a').without_('z')
+        b = base.update_(x='b', z='b').without_('y')
+        self.assertRaises(ValueError, hamtPersistent.merge, base, a, b)
+
+        conflicts = []
+        def conflict(key, baseValue, aValue, bValue):
+            conflicts.append((key, baseValue, aValue, bValue))
+            if key == 'z':
+                return hamtPersistent.sentinal
+            return (aValue, bValue)
+
+        merged = hamtPersistent.merge(base, a, b, conflict)
+        missing = hamtPersistent.sentinal
+        self.assertEqual(sorted(conflicts), [
+            ('x', 0, 'a', 'b'), ('y', 0, 'a', missing), ('z', 0, missing, 'b')])
+        self.assertContents(merged, {'x': ('a', 'b'), 'y': ('a', missing)})
+
+    def testNodeModule(self):
+        self.assertTrue(hamtPersistent.emptyBitmapNode.owner is None)
+        self.assertEqual(len(hamtPersistent.emptyBitmapNode.entries), 0)
+        self.assertEqual(hamtPersistent.emptyBitmapNode.nodes, None)
+
+    #~ Node layout ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    def testNodeLayout(self):
+        ht = self.newTrie(('key%s' % i, i) for i in xrange(self.count))
+        for node in ht.walkNodes():
+            if node is ht:
+                continue
+            self.assertFalse(hasattr(node, '__dict__'))
+            if isinstance(node, hamtPersistent.BitmapIndexedNode):
+                self.assertEqual(len(node.entries), 2*bin(node.datamap).count('1'))
+                nodes = node.nodes or []
+                self.assertEqual(len(nodes), bin(node.nodemap).count('1'))
+                self.assertEqual(node.datamap & node.nodemap, 0)
+                if node.nodes is not None:
+                    self.assertTrue(node.nodes)
+                for k in node.entries[0::2]:
+                    self.assertTrue(k.startswith('key'))
+
+    def testSingleItemsInlined(self):
+        # removing keys leaves no bitmap node with a sub node holding a
+        # lone item
+        keys = self.newKeys()
+        ht = self.newTrie((k, 1) for k in keys)
+        tr = ht.transient()
+        for k in keys[:-40]:
+            del ht[k]
+            del tr[k]
+        for trie in (ht, tr):
+            self.assertContents(trie, dict((k, 1) for k in keys[-40:]))
+            for node in trie.walkNodes():
+                if isinstance(node, hamtPersistent.BitmapIndexedNode):
+                    for child in node.iterNodes():
+                        self.assertEqual(child.singleItem(), None)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+#~ Unittest Main 
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+if __name__=='__main__':
+    unittest.main()